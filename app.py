@@ -1,19 +1,38 @@
 import os
+import hmac
 import logging
+import mimetypes
+import unicodedata
+from urllib.parse import quote
 from logging.handlers import RotatingFileHandler
 from datetime import datetime
 import time
 import piexif
 from pathlib import Path
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, send_from_directory, session, make_response
+from flask import Flask, Request, render_template, redirect, url_for, flash, request, jsonify, send_from_directory, session, make_response
 from flask_pymongo import PyMongo
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import logging
 from PIL import Image
-from utils import save_image, get_image_metadata
+from utils import save_image, get_image_metadata, remove_image_files, build_image_document, ALLOWED_EXTENSIONS, ImageReaper, TagStats, VariantWorker, ChangeCounter, scopes_for, tag_state, count_tag_membership
+from utils.json_provider import FastJSONProvider
+from utils.assets import AssetManifest
+from utils.zip_stream import ZipStream
+from utils.file_serving import FileStatCache, if_range_matches, last_modified_header, parse_ranges, range_not_satisfiable, range_response
+from utils.layout import aspect_ratio, justify_rows, parse_carry, width_bucket
+from utils.response_cache import ResponseCache
+from utils.http_cache import EncodedBody, json_response, make_etag, not_modified
+from utils.tag_stats import visibility_key
+from utils.metrics import MetricsRegistry, MongoCommandListener, init_app as init_metrics, timed
+from utils.profiler import SlowRequestProfiler
+from utils.phash import DEFAULT_MAX_DISTANCE, from_hex, hamming, hash_bands
+from utils.search import ensure_search_indexes, build_search_match, build_search_pipeline, encode_cursor, format_facets, SORT_TIME_FIELD
 from datetime import datetime, timedelta
 from werkzeug.http import http_date
+from werkzeug.datastructures import MultiDict
 
 # 创建Flask应用
 app = Flask(__name__)
@@ -41,8 +60,31 @@ app.logger.info('Pic app startup')
 # 使用 pathlib 处理路径，确保跨平台兼容性
 BASE_DIR = Path(__file__).resolve().parent
 UPLOAD_DIR = Path('uploads')
-app.config['UPLOAD_FOLDER'] = str(BASE_DIR / UPLOAD_DIR)
+app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', str(BASE_DIR / UPLOAD_DIR))
 app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024  # 2MB
+# 批量上传：单个文件仍限制 2MB，整个请求单独放宽
+app.config['MAX_BATCH_FILES'] = 50
+app.config['MAX_BATCH_CONTENT_LENGTH'] = 64 * 1024 * 1024  # 64MB
+BATCH_UPLOAD_PATH = '/api/upload/batch'
+
+
+class PicRequest(Request):
+    """批量上传接口使用单独的请求体大小上限"""
+
+    @property
+    def max_content_length(self):
+        if self.path == BATCH_UPLOAD_PATH:
+            return app.config['MAX_BATCH_CONTENT_LENGTH']
+        return super().max_content_length
+
+
+app.request_class = PicRequest
+
+# JSON 序列化：安装了 orjson 时使用 orjson，原生编码 ObjectId 和 datetime
+# 必须在任何代码访问 app.jinja_env 之前安装，否则模板中的 tojson 仍使用默认的 provider
+app.json_provider_class = FastJSONProvider
+app.json = FastJSONProvider(app)
+app.logger.info(f"JSON backend: {FastJSONProvider.backend}")
 
 # 确保上传文件夹存在
 upload_path = Path(app.config['UPLOAD_FOLDER'])
@@ -51,21 +93,100 @@ upload_path.mkdir(parents=True, exist_ok=True)
 # 记录上传文件夹路径
 app.logger.info(f"Upload folder: {upload_path.as_posix()}")
 
-# 允许的文件扩展名
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+# 允许的文件扩展名见 utils.file_utils.ALLOWED_EXTENSIONS
 MAX_FILES = 20  # 最大文件数量
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# 初始化MongoDB
-mongo = PyMongo(app)
+# 请求耗时统计：Mongo 命令、图片处理、JSON 序列化、文件读写
+# Server-Timing 响应头会暴露内部耗时，默认关闭，调试时设置 SERVER_TIMING=1
+metrics = MetricsRegistry()
+init_metrics(app, metrics, server_timing=os.getenv('SERVER_TIMING', '0') == '1')
+# /metrics 访问控制：已登录，或携带 METRICS_TOKEN（Authorization: Bearer），或来源地址在 METRICS_ALLOW_IPS 中
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOW_IPS = {ip.strip() for ip in os.getenv('METRICS_ALLOW_IPS', '').split(',') if ip.strip()}
+
+
+# 慢请求分析（默认关闭）：PROFILE_SAMPLE_RATE 为 cProfile 抽样比例，PROFILE_SLOW_MS 为栈采样的慢请求阈值
+profiler = SlowRequestProfiler(
+    os.getenv('PROFILE_DIR', os.path.join('logs', 'profiles')),
+    sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+    slow_threshold=float(os.environ['PROFILE_SLOW_MS']) / 1000 if os.getenv('PROFILE_SLOW_MS') else None,
+    max_profiles=int(os.getenv('PROFILE_MAX_FILES', '200'))
+)
+profiler.init_app(app)
+
+
+# 静态资源：模板中的 asset_url 返回打包后带内容哈希的地址（scripts/build_assets.py）
+assets = AssetManifest(app.static_folder)
+assets.init_app(app)
+
+# 初始化MongoDB（监听器需在创建客户端时注册）
+mongo = PyMongo(app, event_listeners=[MongoCommandListener()])
 
 # 确保索引存在
 mongo.db.images.create_index([("tags", 1)])
 mongo.db.images.create_index([("is_public", 1)])  # 保持原有字段
 mongo.db.images.create_index([("username", 1)])
 mongo.db.images.create_index([("photo_time", -1)])  # 添加拍摄时间索引
+mongo.db.images.create_index([("deleted", 1)], sparse=True)  # 软删除标记
+# 按标签筛选列表时的复合索引（公开状态 + 标签 + 排序字段）
+mongo.db.images.create_index([("is_public", 1), ("tags", 1), ("likes", -1)])
+mongo.db.images.create_index([("is_public", 1), ("tags", 1), ("photo_time", -1)])
+mongo.db.images.create_index([("is_public", 1), ("tags", 1), ("_id", -1)])
+ensure_search_indexes(mongo.db.images)  # 文件名/标签/相机/镜头全文索引
+mongo.db.images.create_index([("dhash_bands", 1)])  # 感知哈希分段索引，用于近似重复检测
+mongo.db.images.create_index([("processing_status", 1)])  # 后台变体生成认领待处理图片
+# 原图内容哈希唯一索引，用于上传前去重（历史图片由迁移脚本补算，重复文件不写入哈希）
+try:
+    mongo.db.images.create_index(
+        [("content_hash", 1)], unique=True,
+        partialFilterExpression={'content_hash': {'$type': 'string'}}
+    )
+except Exception as e:
+    app.logger.error(f"创建 content_hash 唯一索引失败: {str(e)}")
+
+# 软删除的图片在回收前对所有查询不可见
+NOT_DELETED = {'$ne': True}
+
+# 图片文件的大小、修改时间和 ETag 缓存，条件请求和 Range 请求共用
+file_stats = FileStatCache()
+
+# 图片变更计数（公开/私密各一个版本），每个修改图片的接口写入成功后递增
+change_counter = ChangeCounter(mongo.db.counters)
+# 副本集上改由 change stream 推导版本（CHANGE_STREAM=0 关闭）
+if os.getenv('CHANGE_STREAM', '1') != '0':
+    change_counter.watch(mongo.db.images)
+
+# 列表页/年份视图/年份列表/接口响应缓存，首页内联数据与接口共用（GALLERY_CACHE_TTL=0 关闭）
+# 缓存键包含变更计数，数据变化后自动换用新条目，有效期只用于回收不再访问的条目
+gallery_cache = ResponseCache(ttl=float(os.getenv('GALLERY_CACHE_TTL', '300')))
+# JSON 接口响应体超过该大小（字节）时按 Accept-Encoding 压缩
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+# 接口响应格式版本，响应结构变化时递增，使基于数据版本的 ETag 失效
+API_FORMAT_VERSION = 1
+
+# 后台回收软删除的图片及其所有变体文件
+reaper = ImageReaper(mongo.db.images, app.config['UPLOAD_FOLDER'])
+reaper.start()
+
+# 后台生成批量上传图片的缩略图和 WebP
+# 每个 gunicorn worker 进程各有一个编码线程池，默认只用 1 个线程，避免与请求处理争抢 CPU；
+# VARIANT_WORKER_THREADS 调整线程数，VARIANT_WORKER=0 时网页进程不处理，由 scripts/variant_worker.py 独立进程处理
+variant_worker = VariantWorker(
+    mongo.db.images, app.config['UPLOAD_FOLDER'],
+    workers=max(1, int(os.getenv('VARIANT_WORKER_THREADS', '1'))),
+    change_counter=change_counter
+)
+if os.getenv('VARIANT_WORKER', '1') != '0':
+    variant_worker.start()
+
+# 标签统计（标签 -> 公开/私密数量），首次启动时从 images 全量构建
+tag_stats = TagStats(mongo.db.tag_stats)
+tag_stats.ensure_indexes()
+if mongo.db.tag_stats.estimated_document_count() == 0:
+    tag_stats.rebuild(mongo.db.images, {'deleted': NOT_DELETED})
 
 # 设置日志级别
 app.logger.setLevel(logging.INFO)
@@ -103,6 +224,62 @@ def build_image_url(path_value: str) -> str:
 
     return '/' + web_path
 
+def serialize_image(image):
+    """将图片记录转换为列表接口返回的格式（与 /api/public_images 保持一致）"""
+    image['_id'] = str(image['_id'])
+
+    # 统一构造原图 URL
+    if image.get('path'):
+        image['url'] = build_image_url(image['path'])
+    else:
+        # 兼容旧数据，仅有 filename
+        image['url'] = build_image_url(str(Path('uploads') / image['filename']))
+
+    # 列表页使用缩略图，详情页使用 WebP，与 /api/images 保持一致
+    if image.get('thumbnail_path'):
+        image['thumbnail_url'] = build_image_url(image['thumbnail_path'])
+    else:
+        image['thumbnail_url'] = image['url']
+
+    if image.get('webp_path'):
+        image['webp_url'] = build_image_url(image['webp_path'])
+    else:
+        image['webp_url'] = None
+
+    if isinstance(image.get('photo_time'), datetime):
+        image['photo_time'] = image['photo_time'].strftime('%Y-%m-%d %H:%M:%S')
+
+    fill_dimensions(image)
+    return image
+
+def fill_dimensions(image):
+    """确保返回宽高，旧数据从 metadata.size 回退，便于前端预留布局空间"""
+    if not image.get('width') or not image.get('height'):
+        size = (image.get('metadata') or {}).get('size')
+        if size and len(size) == 2:
+            image['width'], image['height'] = size[0], size[1]
+    return image
+
+def build_layout(images, args=None, carry=True):
+    """按请求中的 layout_width 计算两端对齐行布局，未请求时返回 None
+
+    请求参数：layout_width（视口宽度）、row_height（目标行高，默认 240）、gap（间距，默认 8）、
+    carry（上一页未填满的最后一行，与本页图片一起排版）
+    args 默认取当前请求；carry=False 时忽略 carry 参数（年份视图每个月份单独排版）
+    """
+    args = request.args if args is None else args
+    width = args.get('layout_width', type=int)
+    if not width:
+        return None
+    bucket = width_bucket(width)
+    row_height = max(80, min(600, args.get('row_height', 240, type=int)))
+    gap = max(0, min(40, args.get('gap', 8, type=int)))
+
+    items = parse_carry(args.get('carry')) if carry else []
+    items += [(str(image['_id']), aspect_ratio(image)) for image in images]
+    rows = justify_rows(items, bucket, target_height=row_height, gap=gap)
+    return {'width': bucket, 'gap': gap, 'rows': rows}
+
 def get_photo_time(image_path):
     """从图片中获取拍摄时间，优先使用EXIF数据，如果没有则使用文件修改时间"""
     try:
@@ -193,10 +370,148 @@ def logout():
     flash('您已成功登出！', 'success')
     return redirect(url_for('home'))
 
+# 首屏数据：与 /api/public_images 默认请求（第 1 页，按点赞排序）一致
+INITIAL_PAGE_ARGS = {'page': '1', 'sort': 'likes'}
+# 首屏预加载的缩略图数量上限（没有布局信息时使用）
+PRELOAD_THUMBNAILS = 4
+
 # 主页面路由
 @app.route('/')
 def home():
-    return render_template('index.html')
+    """渲染首页，内联首屏图片和年份列表，省去页面加载后的两次接口请求"""
+    initial_data = None
+    preload_urls = []
+    try:
+        version = gallery_version(False)
+        images = cached_public_page(1, INITIAL_PAGE_ARGS['sort'], '', False, version)
+        initial_data = {
+            'page': 1,
+            'sort': INITIAL_PAGE_ARGS['sort'],
+            'data': images,
+            'years': cached_years(False, version)
+        }
+
+        # 浏览器上次访问时记录的视口宽度，用于直接给出两端对齐布局
+        layout_width = request.cookies.get('layout_width', type=int)
+        if layout_width:
+            args = MultiDict({**INITIAL_PAGE_ARGS, 'layout_width': str(layout_width)})
+            layout = build_layout(images, args=args)
+            if layout:
+                initial_data['layout'] = layout
+
+        # 预加载首行缩略图
+        thumbnails = {image['_id']: image['thumbnail_url'] for image in images}
+        if initial_data.get('layout') and initial_data['layout']['rows']:
+            first_row = initial_data['layout']['rows'][0]['items']
+            preload_urls = [thumbnails[item['id']] for item in first_row if item['id'] in thumbnails]
+        else:
+            preload_urls = [image['thumbnail_url'] for image in images[:PRELOAD_THUMBNAILS]]
+    except Exception as e:
+        # 首屏数据失败时退回由前端请求接口
+        app.logger.error(f"Error preparing initial gallery data: {str(e)}")
+
+    return render_template('index.html', initial_data=initial_data, preload_urls=preload_urls)
+
+PAGE_SIZE = 18
+
+def query_public_page(page, sort, tag, is_private):
+    """查询列表页图片（已序列化）"""
+    query = {'deleted': NOT_DELETED, 'is_public': not is_private}
+    if tag:
+        query['tags'] = tag
+
+    if sort == 'likes':
+        sort_key = [('likes', -1)]
+    elif sort == 'date':
+        sort_key = [('photo_time', -1)]
+    else:
+        sort_key = [('_id', -1)]
+
+    skip = (page - 1) * PAGE_SIZE
+    images = list(mongo.db.images.find(query).sort(sort_key).skip(skip).limit(PAGE_SIZE))
+    app.logger.info(f"Found {len(images)} images for query {query}")
+    return [serialize_image(image) for image in images]
+
+def query_year_groups(year, tag, is_private):
+    """查询某一年的图片并按月份分组（已序列化），返回 [{'_id': 月份, 'images': [...]}]"""
+    query = {
+        'deleted': NOT_DELETED,
+        'is_public': not is_private,
+        'photo_time': {'$gte': datetime(year, 1, 1), '$lt': datetime(year + 1, 1, 1)}
+    }
+    if tag:
+        query['tags'] = tag
+
+    app.logger.info(f"Year query conditions: {query}")
+    images = list(mongo.db.images.find(query).sort([('photo_time', -1)]))
+    app.logger.info(f"Found {len(images)} images for year {year}")
+
+    # 手动按月份分组
+    months = {}
+    for image in images:
+        if isinstance(image.get('photo_time'), datetime):
+            month = image['photo_time'].month
+        else:
+            # 如果photo_time不是datetime类型，尝试转换
+            try:
+                if isinstance(image.get('photo_time'), str):
+                    image['photo_time'] = datetime.strptime(image['photo_time'], '%Y-%m-%d %H:%M:%S')
+                month = image['photo_time'].month
+            except (ValueError, TypeError, AttributeError):
+                app.logger.error(f"Invalid photo_time format for image {image.get('_id')}")
+                continue
+
+        # 处理ObjectId、文件URL并格式化photo_time
+        months.setdefault(month, []).append(serialize_image(image))
+
+    # 转换为按月份分组的列表
+    return [{'_id': month, 'images': images} for month, images in sorted(months.items(), reverse=True)]
+
+def query_years(is_private):
+    """获取图片的年份列表（降序）"""
+    pipeline = [
+        {'$match': {'is_public': not is_private, 'deleted': NOT_DELETED}},
+        {'$project': {'year': {'$year': {'$toDate': '$photo_time'}}}},
+        {'$group': {'_id': '$year'}},
+        {'$sort': {'_id': -1}}  # 降序排列
+    ]
+    return [year['_id'] for year in mongo.db.images.aggregate(pipeline)]
+
+def gallery_version(is_private):
+    """公开或私密图片的当前变更计数"""
+    return change_counter.versions()[visibility_key(not is_private)]
+
+# 以下查询结果在首页和接口之间共享缓存，返回值不能修改；version 为对应公开状态的变更计数
+def cached_public_page(page, sort, tag, is_private, version):
+    return gallery_cache.get_or_compute(
+        ('page', page, sort, tag, is_private, version),
+        lambda: query_public_page(page, sort, tag, is_private)
+    )
+
+def cached_year_groups(year, tag, is_private, version):
+    return gallery_cache.get_or_compute(
+        ('year', year, tag, is_private, version),
+        lambda: query_year_groups(year, tag, is_private)
+    )
+
+def cached_years(is_private, version):
+    return gallery_cache.get_or_compute(('years', is_private, version), lambda: query_years(is_private))
+
+def json_api_response(compute, version, cache_control='no-cache'):
+    """
+    序列化 compute() 的结果，返回带 ETag 的 JSON 响应
+
+    ETag 由请求路径、参数和数据版本得出：If-None-Match 命中时直接返回 304，不查询也不序列化。
+    序列化结果和压缩结果按同样的键存入画廊缓存。
+    """
+    key = ('response', request.path, tuple(sorted(request.args.items(multi=True))), version)
+    etag = make_etag(repr((API_FORMAT_VERSION,) + key).encode('utf-8'))
+    response = not_modified(etag, request, cache_control)
+    if response is not None:
+        return response
+
+    body = gallery_cache.get_or_compute(key, lambda: EncodedBody(app.json.dumps_bytes(compute()), etag=etag))
+    return json_response(body, request, min_size=COMPRESS_MIN_SIZE, cache_control=cache_control)
 
 # 获取公开图片API
 @app.route('/api/public_images')
@@ -210,145 +525,43 @@ def get_public_images():
         is_private = request.args.get('private', '').lower() == 'true'  # 获取私密模式参数
         
         app.logger.info(f"Received request - username: {session.get('username')}, private_mode: {is_private}")
+        cache_control = 'private, no-cache' if is_private else 'no-cache'
+        version = gallery_version(is_private)
 
-        # 构建查询条件
-        query = {}
-        if tag:
-            query['tags'] = tag
-
-        # 如果指定了年份，使用聚合管道按月份分组
+        # 如果指定了年份，按月份分组
         if year:
             try:
                 year = int(year)
-                start_date = datetime(year, 1, 1)
-                end_date = datetime(year + 1, 1, 1)
-                query['photo_time'] = {
-                    '$gte': start_date,
-                    '$lt': end_date
-                }
-                
-                # 添加私密模式条件
-                if is_private:
-                    query['is_public'] = False
-                else:
-                    query['is_public'] = True
-                
-                app.logger.info(f"Year query conditions: {query}")
-                
-                # 先获取符合条件的图片
-                images = list(mongo.db.images.find(query).sort([('photo_time', -1)]))
-                app.logger.info(f"Found {len(images)} images for year {year}")
-                
-                # 手动按月份分组
-                months = {}
-                for image in images:
-                    if isinstance(image.get('photo_time'), datetime):
-                        month = image['photo_time'].month
-                    else:
-                        # 如果photo_time不是datetime类型，尝试转换
-                        try:
-                            if isinstance(image.get('photo_time'), str):
-                                image['photo_time'] = datetime.strptime(image['photo_time'], '%Y-%m-%d %H:%M:%S')
-                            month = image['photo_time'].month
-                        except (ValueError, TypeError, AttributeError):
-                            app.logger.error(f"Invalid photo_time format for image {image.get('_id')}")
-                            continue
-                    
-                    if month not in months:
-                        months[month] = []
-                    
-                    # 处理ObjectId
-                    image['_id'] = str(image['_id'])
-
-                    # 统一构造原图 URL
-                    if image.get('path'):
-                        image['url'] = build_image_url(image['path'])
-                    else:
-                        # 兼容旧数据，仅有 filename
-                        image['url'] = build_image_url(str(Path('uploads') / image['filename']))
-
-                    # 列表页使用缩略图，详情页使用 WebP，与 /api/images 保持一致
-                    if image.get('thumbnail_path'):
-                        image['thumbnail_url'] = build_image_url(image['thumbnail_path'])
-                    else:
-                        image['thumbnail_url'] = image['url']
-
-                    if image.get('webp_path'):
-                        image['webp_url'] = build_image_url(image['webp_path'])
-                    else:
-                        image['webp_url'] = None
-
-                    # 格式化photo_time
-                    image['photo_time'] = image['photo_time'].strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    months[month].append(image)
-                
-                # 转换为按月份分组的列表
-                result = [{'_id': month, 'images': images} for month, images in sorted(months.items(), reverse=True)]
-                
-                return jsonify({
-                    'by_month': True,
-                    'year': year,
-                    'data': result
-                })
-                
             except ValueError as e:
                 app.logger.error(f"Invalid year format: {e}")
                 return jsonify({'error': str(e)}), 400
 
-        # 如果没有指定年份，使用原来的逻辑
-        # 根据私密模式设置查询条件
-        if is_private:
-            query['is_public'] = False
-        else:
-            query['is_public'] = True
-            
-        app.logger.info(f"Query conditions: {query}")
-
-        if sort == 'likes':
-            sort_key = [('likes', -1)]
-        elif sort == 'date':
-            sort_key = [('photo_time', -1)]
-        else:
-            sort_key = [('_id', -1)]
-
-        # 获取分页数据
-        skip = (page - 1) * 18
-        images = list(mongo.db.images.find(query).sort(sort_key).skip(skip).limit(18))
-        app.logger.info(f"Found {len(images)} images")
-        
-        # 记录每张图片的公开状态
-        for img in images:
-            app.logger.info(f"Image {img.get('filename')}: is_public={img.get('is_public')}")
-
-        # 处理ObjectId和添加文件URL
-        for image in images:
-            image['_id'] = str(image['_id'])
-
-            # 统一构造原图 URL
-            if image.get('path'):
-                image['url'] = build_image_url(image['path'])
-            else:
-                # 兼容旧数据，仅有 filename
-                image['url'] = build_image_url(str(Path('uploads') / image['filename']))
-
-            # 列表页使用缩略图，详情页使用 WebP，与 /api/images 保持一致
-            if image.get('thumbnail_path'):
-                image['thumbnail_url'] = build_image_url(image['thumbnail_path'])
-            else:
-                image['thumbnail_url'] = image['url']
+            def year_view():
+                result = []
+                for group in cached_year_groups(year, tag, is_private, version):
+                    group = dict(group)
+                    layout = build_layout(group['images'], carry=False)
+                    if layout:
+                        group['layout'] = layout
+                    result.append(group)
+                return {
+                    'by_month': True,
+                    'year': year,
+                    'data': result
+                }
 
-            if image.get('webp_path'):
-                image['webp_url'] = build_image_url(image['webp_path'])
-            else:
-                image['webp_url'] = None
+            return json_api_response(year_view, version, cache_control=cache_control)
 
-            if isinstance(image.get('photo_time'), datetime):
-                image['photo_time'] = image['photo_time'].strftime('%Y-%m-%d %H:%M:%S')
+        # 如果没有指定年份，分页返回
+        def page_view():
+            images = cached_public_page(page, sort, tag, is_private, version)
+            response = {'data': images}
+            layout = build_layout(images)
+            if layout:
+                response['layout'] = layout
+            return response
 
-        return jsonify({
-            'data': images
-        })
+        return json_api_response(page_view, version, cache_control=cache_control)
                 
     except Exception as e:
         app.logger.error(f"Error in get_public_images: {str(e)}")
@@ -361,38 +574,12 @@ def get_years():
     try:
         # 获取私密模式参数
         is_private = request.args.get('private', '').lower() == 'true'
-        app.logger.info(f"Getting years for private mode: {is_private}")
-        
-        # 构建查询条件
-        match_stage = {
-            '$match': {
-                'is_public': False if is_private else True
-            }
-        }
-        
-        # 从数据库中获取所有不同的年份
-        pipeline = [
-            match_stage,
-            {
-                "$project": {
-                    "year": {"$year": {"$toDate": "$photo_time"}}
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$year"
-                }
-            },
-            {
-                "$sort": {"_id": -1}  # 降序排列
-            }
-        ]
-        
-        years = list(mongo.db.images.aggregate(pipeline))
-        # 提取年份并转换为列表
-        year_list = [year["_id"] for year in years]
-        app.logger.info(f"Found years: {year_list} for private mode: {is_private}")
-        return jsonify({"success": True, "years": year_list})
+        version = gallery_version(is_private)
+        return json_api_response(
+            lambda: {"success": True, "years": cached_years(is_private, version)},
+            version,
+            cache_control='private, no-cache' if is_private else 'no-cache'
+        )
     except Exception as e:
         app.logger.error(f"Error getting years: {str(e)}")
         return jsonify({"success": False, "error": str(e)})
@@ -419,26 +606,23 @@ def upload_file():
             metadata = get_image_metadata(save_result['original_path'])
             
             # 保存到数据库
-            image_data = {
-                'filename': save_result['filename'],
-                'path': save_result['original_path'],
-                'thumbnail_path': save_result.get('thumbnail_path'),
-                'webp_path': save_result.get('webp_path'),
-                'has_thumbnail': bool(save_result.get('thumbnail_path')),
-                'has_webp': bool(save_result.get('webp_path')),
-                'file_sizes': save_result.get('file_sizes', {}),
-                'upload_time': datetime.now(),
-                'photo_time': metadata.get('photo_time', datetime.now()),  # 使用拍摄时间
-                'year': metadata.get('year', datetime.now().year),  # 年份
-                'month': metadata.get('month', datetime.now().month),  # 月份
-                'metadata': metadata,
-                'is_public': True,  # 默认设置为公开
-                'likes': 0,
-                'tags': [],
-                'processing_status': 'completed'
-            }
+            image_data = build_image_document(save_result, metadata)
             
-            mongo.db.images.insert_one(image_data)
+            try:
+                mongo.db.images.insert_one(image_data)
+            except DuplicateKeyError:
+                # 服务器已有相同内容的文件，删除刚保存的副本
+                remove_image_files(image_data, app.config['UPLOAD_FOLDER'])
+                existing = find_existing_hashes([image_data['content_hash']]).get(image_data['content_hash'], {})
+                return jsonify({
+                    'success': True,
+                    'duplicate': True,
+                    'message': '文件已存在',
+                    'id': existing.get('id'),
+                    'filename': existing.get('filename')
+                })
+            tag_stats.record([(None, tag_state(image_data))])
+            change_counter.bump([visibility_key(image_data['is_public'])])
             
             return jsonify({
                 'success': True,
@@ -460,21 +644,156 @@ def upload_file():
 
     return render_template('upload.html')
 
+def file_size(file):
+    """获取上传文件大小（不读取内容）"""
+    stream = file.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+# 批量上传API
+@app.route(BATCH_UPLOAD_PATH, methods=['POST'])
+def upload_batch():
+    """一次请求上传多个文件
+
+    只保存原图和元数据，用一次 insert_many 写入数据库，
+    缩略图和 WebP 由后台 VariantWorker 并行生成。返回每个文件的结果。
+    """
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'success': False, 'error': '没有文件被上传'}), 400
+    if len(files) > app.config['MAX_BATCH_FILES']:
+        return jsonify({'success': False, 'error': f"一次最多上传 {app.config['MAX_BATCH_FILES']} 个文件"}), 400
+
+    results = []
+    documents = []
+    for file in files:
+        result = {'filename': file.filename, 'success': False}
+        results.append(result)
+        if not file.filename:
+            result['error'] = '没有选择文件'
+            continue
+        if not allowed_file(file.filename):
+            result['error'] = '不支持的文件类型'
+            continue
+        if file_size(file) > app.config['MAX_CONTENT_LENGTH']:
+            result['error'] = '超过最大文件大小限制'
+            continue
+        try:
+            save_result = save_image(file, app.config['UPLOAD_FOLDER'], generate_variants=False)
+            metadata = get_image_metadata(save_result['original_path'])
+            documents.append((result, build_image_document(save_result, metadata, processing_status='pending')))
+            result['saved_as'] = save_result['filename']
+        except Exception as e:
+            app.logger.error(f"批量上传保存 {file.filename} 时发生错误: {str(e)}")
+            result['error'] = '保存文件时发生错误'
+
+    duplicates = set()
+    if documents:
+        try:
+            mongo.db.images.insert_many([doc for _, doc in documents], ordered=False)
+        except BulkWriteError as e:
+            # 内容哈希重复的文件不写入，其余照常插入
+            write_errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != 11000 for error in write_errors):
+                app.logger.error(f"批量上传写入数据库时发生错误: {str(e)}")
+                return jsonify({'success': False, 'error': '写入数据库时发生错误', 'results': results}), 500
+            duplicates = {error['index'] for error in write_errors}
+        except Exception as e:
+            app.logger.error(f"批量上传写入数据库时发生错误: {str(e)}")
+            return jsonify({'success': False, 'error': '写入数据库时发生错误', 'results': results}), 500
+
+        inserted = [item for i, item in enumerate(documents) if i not in duplicates]
+        if duplicates:
+            existing = find_existing_hashes([documents[i][1]['content_hash'] for i in duplicates])
+            for i in duplicates:
+                result, doc = documents[i]
+                remove_image_files(doc, app.config['UPLOAD_FOLDER'])
+                result.pop('saved_as', None)
+                result.update({
+                    'success': True,
+                    'duplicate': True,
+                    'id': existing.get(doc['content_hash'], {}).get('id')
+                })
+
+        tag_stats.record([(None, tag_state(doc)) for _, doc in inserted])
+        change_counter.bump(scopes_for(doc for _, doc in inserted))
+        for result, doc in inserted:
+            result['success'] = True
+            result['id'] = str(doc['_id'])
+            result['processing_status'] = doc['processing_status']
+        if inserted:
+            variant_worker.wake()
+
+    return jsonify({
+        'success': bool(documents),
+        'uploaded': len(documents) - len(duplicates),
+        'duplicates': len(duplicates),
+        'failed': len(files) - len(documents),
+        'results': results
+    })
+
+CONTENT_HASH_LENGTH = 64  # SHA-256 十六进制
+
+def find_existing_hashes(hashes):
+    """返回 {内容哈希: {'id', 'filename'}}，只包含服务器上已有的文件"""
+    if not hashes:
+        return {}
+    cursor = mongo.db.images.find(
+        {'content_hash': {'$in': list(hashes)}, 'deleted': NOT_DELETED},
+        {'content_hash': 1, 'filename': 1}
+    )
+    return {
+        doc['content_hash']: {'id': str(doc['_id']), 'filename': doc.get('filename')}
+        for doc in cursor
+    }
+
+# 上传前检查文件是否已存在
+@app.route('/api/upload/check', methods=['POST'])
+def upload_check():
+    """接收浏览器计算的 SHA-256 列表，返回服务器上已有的哈希，已有的无需再次上传
+
+    只返回哈希本身，不返回图片 ID 和文件名，避免未登录用户借此探测私密图片。
+    """
+    data = request.get_json(silent=True) or {}
+    hashes = data.get('hashes') or []
+    if not isinstance(hashes, list) or len(hashes) > 1000:
+        return jsonify({'success': False, 'error': '哈希列表无效或过长（最多 1000 个）'}), 400
+
+    hashes = {
+        h.lower() for h in hashes
+        if isinstance(h, str) and len(h) == CONTENT_HASH_LENGTH
+        and all(c in '0123456789abcdef' for c in h.lower())
+    }
+    return jsonify({'success': True, 'existing': sorted(find_existing_hashes(hashes))})
+
+# 查询批量上传图片的处理状态
+@app.route('/api/upload/status')
+def upload_status():
+    """返回 ids 参数（逗号分隔）对应图片的变体处理状态"""
+    try:
+        ids = [ObjectId(i) for i in request.args.get('ids', '').split(',') if i][:200]
+    except Exception:
+        return jsonify({'success': False, 'error': '无效的图片 ID'}), 400
+    statuses = {
+        str(doc['_id']): doc.get('processing_status', 'completed')
+        for doc in mongo.db.images.find({'_id': {'$in': ids}, 'deleted': NOT_DELETED}, {'processing_status': 1})
+    }
+    return jsonify({'success': True, 'status': statuses})
+
 # 管理页面路由
 @app.route('/manage')
 def manage():
     return render_template('manage.html')
 
-# 获取图片列表API
-@app.route('/api/images')
-def get_images():
-    page = int(request.args.get('page', 1))
-    size = int(request.args.get('size', 12))
-    tag = request.args.get('tag', '')
-    privacy = request.args.get('privacy', 'all')
-    
+def query_manage_page(page, size, tag, privacy, search):
+    """查询管理页图片列表（已序列化）"""
     # 构建查询条件
-    query = {}
+    query = {'deleted': NOT_DELETED}
+    if search:
+        query['$text'] = {'$search': search}
     if tag:
         query['tags'] = tag
     if privacy != 'all':
@@ -526,6 +845,8 @@ def get_images():
         # 原图 URL
         image['url'] = '/' + image['path'].replace('\\', '/')
         
+        fill_dimensions(image)
+        
         # 兼容性：如果没有新字段，设置默认值
         if 'has_thumbnail' not in image:
             image['has_thumbnail'] = False
@@ -561,11 +882,125 @@ def get_images():
     
     app.logger.debug(f'处理后的图片数据: {images}')
     
-    return jsonify({
+    return {
         'success': True,
         'images': images,
         'total': total
-    })
+    }
+
+# 获取图片列表API
+@app.route('/api/images')
+def get_images():
+    page = int(request.args.get('page', 1))
+    size = int(request.args.get('size', 12))
+    tag = request.args.get('tag', '')
+    privacy = request.args.get('privacy', 'all')
+    search = request.args.get('search', '').strip()
+    
+    # 数据版本：只看公开或私密图片时只依赖对应的计数
+    versions = change_counter.versions()
+    if privacy == 'all':
+        version = (versions['public'], versions['private'])
+    else:
+        version = versions[visibility_key(privacy == 'public')]
+    
+    return json_api_response(
+        lambda: query_manage_page(page, size, tag, privacy, search),
+        version, cache_control='private, no-cache'
+    )
+
+# 搜索API
+@app.route('/api/search')
+def search_images():
+    """全文搜索 + 分面统计，一次聚合返回结果页和各维度计数"""
+    try:
+        size = min(int(request.args.get('size', 18)), 100)
+        privacy = request.args.get('privacy', 'public')
+        # 未登录用户只能搜索公开图片
+        if 'username' not in session:
+            privacy = 'public'
+        is_public = None if privacy == 'all' else privacy == 'public'
+
+        match = build_search_match(
+            q=request.args.get('q', '').strip(),
+            tag=request.args.get('tag', ''),
+            camera=request.args.get('camera', ''),
+            year=request.args.get('year', ''),
+            date_from=request.args.get('date_from', ''),
+            date_to=request.args.get('date_to', ''),
+            is_public=is_public,
+            base={'deleted': NOT_DELETED}
+        )
+        pipeline = build_search_pipeline(match, cursor=request.args.get('cursor'), size=size)
+        facet_doc = next(mongo.db.images.aggregate(pipeline, allowDiskUse=True), {})
+
+        images = facet_doc.get('results', [])
+        next_cursor = encode_cursor(images[size - 1]) if len(images) > size else None
+        for image in images:
+            image.pop(SORT_TIME_FIELD, None)
+        images = [serialize_image(image) for image in images[:size]]
+        total = facet_doc['total'][0]['count'] if facet_doc.get('total') else 0
+
+        return jsonify({
+            'success': True,
+            'data': images,
+            'total': total,
+            'next_cursor': next_cursor,
+            'facets': format_facets(facet_doc),
+            'layout': build_layout(images)
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Error in search_images: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# 近似重复图片API
+@app.route('/api/images/<image_id>/duplicates')
+def find_duplicates(image_id):
+    """按感知哈希查找与指定图片近似重复的图片
+
+    先用分段索引精确匹配任一哈希段取得候选，再计算完整汉明距离过滤。
+    未登录用户只能查询和看到公开图片。
+    """
+    try:
+        distance = request.args.get('distance', DEFAULT_MAX_DISTANCE, type=int)
+        if distance is None or distance < 0 or not ObjectId.is_valid(image_id):
+            return jsonify({'error': '无效的图片 ID 或距离'}), 400
+        distance = min(distance, DEFAULT_MAX_DISTANCE)
+
+        visibility = {'deleted': NOT_DELETED}
+        if 'username' not in session:
+            visibility['is_public'] = True
+        image = mongo.db.images.find_one(
+            {'_id': ObjectId(image_id), **visibility},
+            {'dhash': 1}
+        )
+        if not image:
+            return jsonify({'error': '图片不存在'}), 404
+        if not image.get('dhash'):
+            return jsonify({'error': '该图片尚未计算感知哈希'}), 409
+
+        value = from_hex(image['dhash'])
+        candidates = mongo.db.images.find({
+            'dhash_bands': {'$in': hash_bands(value)},
+            '_id': {'$ne': image['_id']},
+            **visibility
+        })
+
+        duplicates = []
+        for candidate in candidates:
+            candidate_distance = hamming(value, from_hex(candidate['dhash']))
+            if candidate_distance <= distance:
+                candidate = serialize_image(candidate)
+                candidate['distance'] = candidate_distance
+                duplicates.append(candidate)
+        duplicates.sort(key=lambda item: item['distance'])
+
+        return jsonify({'success': True, 'data': duplicates})
+    except Exception as e:
+        app.logger.error(f"Error finding duplicates for {image_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
 # 更新图片信息API
 @app.route('/api/update_image/<image_id>', methods=['POST'])
@@ -575,7 +1010,7 @@ def update_image(image_id):
         data = request.get_json()
         
         # 验证用户权限
-        image = mongo.db.images.find_one({'_id': ObjectId(image_id)})
+        image = mongo.db.images.find_one({'_id': ObjectId(image_id), 'deleted': NOT_DELETED})
         if not image or ('username' in session and image.get('username') != session['username']):
             return jsonify({'error': '没有权限修改此图片'}), 403
         
@@ -592,6 +1027,8 @@ def update_image(image_id):
         )
         
         if result.modified_count > 0:
+            tag_stats.record([(tag_state(image), tag_state({**image, **update_data}))])
+            change_counter.bump(scopes_for([image, {**image, **update_data}]))
             return jsonify({'success': True, 'message': '更新成功'})
         else:
             return jsonify({'error': '更新失败'}), 400
@@ -600,6 +1037,25 @@ def update_image(image_id):
         app.logger.error(f"Error updating image {image_id}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def soft_delete_images(image_ids):
+    """软删除图片：一次 update_many 打上删除标记，文件和记录由后台回收线程清理"""
+    images = list(mongo.db.images.find(
+        {'_id': {'$in': [ObjectId(id) for id in image_ids]}, 'deleted': NOT_DELETED},
+        {'tags': 1, 'is_public': 1}
+    ))
+    if not images:
+        return 0
+
+    result = mongo.db.images.update_many(
+        {'_id': {'$in': [image['_id'] for image in images]}, 'deleted': NOT_DELETED},
+        # 释放内容哈希，回收前重新上传同一文件不会被判定为重复
+        {'$set': {'deleted': True, 'deleted_at': datetime.now()}, '$unset': {'content_hash': ''}}
+    )
+    tag_stats.record([(tag_state(image), None) for image in images])
+    change_counter.bump(scopes_for(images))
+    reaper.wake()
+    return result.modified_count
+
 # 删除图片API
 @app.route('/api/images', methods=['DELETE'])
 def delete_images():
@@ -607,37 +1063,57 @@ def delete_images():
     if not image_ids:
         return jsonify({'error': '没有选择要删除的图片'}), 400
     
-    # 获取要删除的图片信息
-    images = list(mongo.db.images.find({'_id': {'$in': [ObjectId(id) for id in image_ids]}}))
-    
-    # 删除文件
-    for image in images:
-        try:
-            os.remove(image['path'])
-        except OSError:
-            pass  # 忽略文件不存在的错误
-    
-    # 从数据库中删除记录
-    result = mongo.db.images.delete_many({'_id': {'$in': [ObjectId(id) for id in image_ids]}})
+    deleted_count = soft_delete_images(image_ids)
     
     return jsonify({
-        'message': f'成功删除 {result.deleted_count} 张图片',
-        'deleted_count': result.deleted_count
+        'success': True,
+        'message': f'成功删除 {deleted_count} 张图片',
+        'deleted_count': deleted_count
     })
 
 # 获取所有标签API
 @app.route('/api/tags')
 def get_tags():
-    # 获取所有不重复的标签
-    tags = mongo.db.images.distinct('tags')
-    return jsonify(tags)
+    # 从标签统计集合读取，避免对 images 全表 distinct
+    return jsonify(tag_stats.names())
+
+# 标签自动补全API
+@app.route('/api/tags/suggest')
+def suggest_tags():
+    """按前缀返回标签及对应数量，按数量降序"""
+    try:
+        prefix = request.args.get('q', '').strip()
+        is_private = request.args.get('private', '').lower() == 'true'
+        limit = min(int(request.args.get('limit', 10)), 50)
+        return jsonify({
+            'success': True,
+            'tags': tag_stats.suggest(prefix, private=is_private, limit=limit)
+        })
+    except Exception as e:
+        app.logger.error(f"Error in suggest_tags: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# 标签云API
+@app.route('/api/tags/cloud')
+def tag_cloud():
+    """返回使用次数最多的标签"""
+    try:
+        is_private = request.args.get('private', '').lower() == 'true'
+        limit = min(int(request.args.get('limit', 50)), 200)
+        return jsonify({
+            'success': True,
+            'tags': tag_stats.cloud(private=is_private, limit=limit)
+        })
+    except Exception as e:
+        app.logger.error(f"Error in tag_cloud: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 # 点赞API
 @app.route('/api/like/<image_id>', methods=['POST'])
 def like_image(image_id):
     try:
         # 获取图片信息
-        image = mongo.db.images.find_one({'_id': ObjectId(image_id)})
+        image = mongo.db.images.find_one({'_id': ObjectId(image_id), 'deleted': NOT_DELETED})
         if not image:
             return jsonify({'error': '图片不存在'}), 404
             
@@ -650,6 +1126,7 @@ def like_image(image_id):
             {'_id': ObjectId(image_id)},
             {'$set': {'likes': new_likes}}
         )
+        change_counter.bump([visibility_key(image.get('is_public'))])
         
         return jsonify({
             'success': True,
@@ -664,7 +1141,7 @@ def like_image(image_id):
 # 提供图片文件访问
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    """提供图片文件访问，添加缓存控制"""
+    """提供图片文件访问，添加缓存控制，支持 Range 分段下载"""
     try:
         # 记录基本请求信息
         app.logger.info("=" * 50)
@@ -674,54 +1151,60 @@ def uploaded_file(filename):
         for header, value in request.headers.items():
             app.logger.info(f"  {header}: {value}")
         
-        file_path = Path(app.config['UPLOAD_FOLDER']) / filename
-        
-        if not file_path.exists():
+        file_path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+        try:
+            if file_path is None:
+                raise FileNotFoundError(filename)
+            # 文件大小、修改时间和 ETag，条件请求与分段请求共用
+            info = file_stats.get(file_path)
+        except FileNotFoundError:
             app.logger.error(f"File not found: {file_path}")
             return "File not found", 404
-            
-        # 获取文件信息并记录
-        stats = file_path.stat()
-        file_mtime = datetime.fromtimestamp(stats.st_mtime)
-        file_size = stats.st_size
+        
         app.logger.info(f"File stats:")
-        app.logger.info(f"  Modified time: {file_mtime}")
-        app.logger.info(f"  Size: {file_size} bytes")
+        app.logger.info(f"  Modified time: {info.last_modified}")
+        app.logger.info(f"  Size: {info.size} bytes")
         
-        # 生成更强壮的ETag（结合修改时间和文件大小）
-        etag = f'"{stats.st_mtime_ns}-{stats.st_size}"'
-        app.logger.info(f"Generated ETag: {etag}")
+        def add_cache_headers(response):
+            response.set_etag(info.etag)
+            response.headers['Cache-Control'] = 'public, max-age=1209600, must-revalidate'
+            response.headers['Last-Modified'] = last_modified_header(info)
+            response.headers['Expires'] = http_date(datetime.now() + timedelta(days=14))
+            response.headers['Accept-Ranges'] = 'bytes'
+            return response
         
         # 检查和记录缓存验证信息
         if_none_match = request.headers.get('If-None-Match')
         app.logger.info(f"Client If-None-Match: {if_none_match}")
         
-        if if_none_match and if_none_match == etag:
+        if request.if_none_match.contains_weak(info.etag):
             app.logger.info("Cache HIT - returning 304 Not Modified")
-            response = make_response('', 304)
-            response.headers['ETag'] = etag
-            response.headers['Cache-Control'] = 'public, max-age=1209600, must-revalidate'
-            return response
-        else:
-            if not if_none_match:
-                app.logger.info("Cache MISS - No If-None-Match header")
-            else:
-                app.logger.info(f"Cache MISS - ETag mismatch (client: {if_none_match}, server: {etag})")
-            
-        # 设置响应
-        response = send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+            return add_cache_headers(make_response('', 304))
+        
+        # Range 只对 GET 生效；If-Range 与当前文件不符时忽略 Range，返回完整文件
+        ranges = None
+        if request.method == 'GET' and if_range_matches(request.headers.get('If-Range'), info):
+            ranges = parse_ranges(request.headers.get('Range'), info.size)
         
-        # 设置缓存控制头
-        response.headers['Cache-Control'] = 'public, max-age=1209600, must-revalidate'
-        response.headers['ETag'] = etag
-        response.headers['Last-Modified'] = http_date(file_mtime)
-        response.headers['Expires'] = http_date(datetime.now() + timedelta(days=14))
+        if ranges == []:
+            app.logger.info(f"Range not satisfiable: {request.headers.get('Range')}")
+            # 错误响应不带公共缓存头，避免共享缓存保存 416
+            return range_not_satisfiable(info)
         
+        with timed('file'):
+            if ranges:
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                response = range_response(file_path, info, ranges, mimetype)
+                app.logger.info(f"Returning 206 Partial Content: {ranges}")
+            else:
+                # 缓存头由这里统一设置，不使用 send_file 自带的 ETag 和条件处理
+                response = send_from_directory(app.config['UPLOAD_FOLDER'], filename, conditional=False, etag=False)
+                app.logger.info("Returning 200 OK with full response")
+        
+        add_cache_headers(response)
         app.logger.info("Response headers:")
         for header, value in response.headers.items():
             app.logger.info(f"  {header}: {value}")
-        
-        app.logger.info("Returning 200 OK with full response")
         app.logger.info("=" * 50)
         return response
         
@@ -730,6 +1213,177 @@ def uploaded_file(filename):
         app.logger.exception("Full exception details:")
         return "Error serving file", 500
 
+# 打包下载的图片数量上限（0 表示不限制）
+DOWNLOAD_MAX_IMAGES = int(os.getenv('DOWNLOAD_MAX_IMAGES', '5000'))
+# 打包下载的文件版本 -> 图片记录中的路径字段
+DOWNLOAD_VARIANTS = {'original': 'path', 'webp': 'webp_path'}
+
+def upload_file_path(path_value):
+    """数据库中的图片路径 -> UPLOAD_FOLDER 下的文件路径（与 /uploads/ 地址对应）"""
+    url = build_image_url(path_value)
+    return safe_join(app.config['UPLOAD_FOLDER'], url[len('/uploads/'):]) if url else None
+
+def attachment_header(filename):
+    """Content-Disposition，非 ASCII 文件名同时给出 filename*（RFC 5987）"""
+    ascii_name = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+    ascii_name = ascii_name.replace('"', '').replace('\\', '')
+    if ascii_name.startswith('.'):
+        ascii_name = 'images' + ascii_name
+    if ascii_name == filename:
+        return f'attachment; filename="{filename}"'
+    return f'attachment; filename="{ascii_name}"; filename*=UTF-8\'\'{quote(filename, safe="")}'
+
+# 打包下载图片
+@app.route('/api/download', methods=['GET', 'POST'])
+def download_images():
+    """
+    流式下载 ZIP 压缩包，边读文件边输出，不在内存或磁盘中生成压缩包
+
+    参数（查询字符串或表单）：
+    - image_ids：逗号分隔的图片 ID（管理页选中的图片，需要登录）
+    - tag / year：按标签和年份下载，private=true 时为私密图片（需要登录）
+    - variant：original（默认，原图）或 webp（没有 WebP 的图片使用原图）
+    """
+    try:
+        image_ids = [id for value in request.values.getlist('image_ids') for id in value.split(',') if id]
+        tag = request.values.get('tag', '').strip()
+        year = request.values.get('year', '')
+        is_private = request.values.get('private', '').lower() == 'true'
+        variant = request.values.get('variant', 'original')
+        
+        if variant not in DOWNLOAD_VARIANTS:
+            return jsonify({'error': f'不支持的文件版本: {variant}'}), 400
+        if not (image_ids or tag or year):
+            return jsonify({'error': '没有选择要下载的图片'}), 400
+        if (image_ids or is_private) and 'username' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        query = {'deleted': NOT_DELETED}
+        if image_ids:
+            query['_id'] = {'$in': [ObjectId(id) for id in image_ids]}
+            archive_name = f'images-{len(image_ids)}.zip'
+        else:
+            query['is_public'] = not is_private
+            if tag:
+                query['tags'] = tag
+            if year:
+                try:
+                    year = int(year)
+                except ValueError as e:
+                    app.logger.error(f"Invalid year format: {e}")
+                    return jsonify({'error': str(e)}), 400
+                query['photo_time'] = {'$gte': datetime(year, 1, 1), '$lt': datetime(year + 1, 1, 1)}
+            archive_name = '-'.join(str(part) for part in (tag, year) if part) + '.zip'
+        
+        images = mongo.db.images.find(
+            query, {'filename': 1, 'path': 1, 'webp_path': 1, 'photo_time': 1}
+        ).sort([('photo_time', -1)])
+        if DOWNLOAD_MAX_IMAGES:
+            images = images.limit(DOWNLOAD_MAX_IMAGES + 1)
+        
+        # 先确定所有文件及大小（共用文件信息缓存），以便给出准确的 Content-Length
+        stream = ZipStream()
+        with timed('download_prepare'):
+            for image in images:
+                if DOWNLOAD_MAX_IMAGES and len(stream) >= DOWNLOAD_MAX_IMAGES:
+                    return jsonify({'error': f'一次最多下载 {DOWNLOAD_MAX_IMAGES} 张图片'}), 400
+                path_value = image.get(DOWNLOAD_VARIANTS[variant]) or image.get('path') or image.get('filename')
+                file_path = upload_file_path(path_value)
+                try:
+                    if file_path is None:
+                        raise FileNotFoundError(path_value)
+                    info = file_stats.get(file_path)
+                except FileNotFoundError:
+                    app.logger.warning(f"打包下载时跳过缺失的文件: {path_value}")
+                    continue
+                photo_time = image.get('photo_time')
+                stream.add(
+                    Path(file_path).name, file_path, info.size,
+                    photo_time if isinstance(photo_time, datetime) else info.last_modified
+                )
+        
+        if not len(stream):
+            return jsonify({'error': '没有可下载的图片'}), 404
+        
+        response = app.response_class(iter(stream), mimetype='application/zip', direct_passthrough=True)
+        response.content_length = stream.size()
+        response.headers['Content-Disposition'] = attachment_header(archive_name)
+        response.headers['Cache-Control'] = 'private, no-store'
+        app.logger.info(f"Streaming {len(stream)} images as {archive_name} ({response.content_length} bytes)")
+        return response
+        
+    except Exception as e:
+        app.logger.error(f"打包下载图片时发生错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Service Worker 预缓存的页面外壳（首页使用的静态资源）
+SW_SHELL_ASSETS = ['bootstrap.css', 'fontawesome.css', 'index.css', 'bootstrap.js', 'index.js']
+# Service Worker 缩略图缓存上限（MB）
+SW_THUMBNAIL_CACHE_MB = int(os.getenv('SW_THUMBNAIL_CACHE_MB', '100'))
+
+# Service Worker 需从根路径提供，作用域才能覆盖整个站点
+@app.route('/sw.js')
+def service_worker():
+    # 未打包的源文件地址不随内容变化，不预缓存，避免页面使用旧脚本
+    shell_urls = ['/', url_for('static', filename='favicon.ico')] + [
+        assets.url(name) for name in SW_SHELL_ASSETS if assets.versioned(name)
+    ]
+    response = make_response(render_template(
+        'sw.js',
+        shell_urls=shell_urls,
+        # 外壳资源变化时更换缓存名，旧缓存在激活时删除
+        version=make_etag(repr(shell_urls).encode('utf-8'))[:12],
+        thumbnail_max_bytes=SW_THUMBNAIL_CACHE_MB * 1024 * 1024
+    ))
+    response.mimetype = 'application/javascript'
+    # 浏览器每次检查更新时都重新验证
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def metrics_allowed():
+    """/metrics 访问控制，见 METRICS_TOKEN / METRICS_ALLOW_IPS"""
+    if 'username' in session:
+        return True
+    if request.remote_addr in METRICS_ALLOW_IPS:
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return bool(METRICS_TOKEN) and scheme.lower() == 'bearer' and hmac.compare_digest(token.strip(), METRICS_TOKEN)
+
+# Prometheus 指标
+@app.route('/metrics')
+def prometheus_metrics():
+    """按接口输出请求耗时直方图、各阶段耗时和 Mongo 命令数"""
+    if not metrics_allowed():
+        return jsonify({'error': '无权访问'}), 403
+    response = make_response(metrics.render())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+# 慢请求分析列表
+@app.route('/admin/profiles')
+def admin_profiles():
+    """按耗时列出已捕获的请求分析"""
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    return render_template(
+        'profiles.html',
+        profiles=profiler.list_profiles(limit=request.args.get('limit', 100, type=int)),
+        enabled=profiler.enabled,
+        sample_rate=profiler.sample_rate,
+        slow_threshold=profiler.slow_threshold
+    )
+
+# 下载分析文件（.prof / .folded）
+@app.route('/admin/profiles/<name>')
+def download_profile(name):
+    if 'username' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    meta = profiler.get_profile(name)
+    if not meta:
+        return jsonify({'error': '分析不存在'}), 404
+    return send_from_directory(str(profiler.directory.resolve()), meta['file'], as_attachment=True)
+
 # 批量删除图片
 @app.route('/api/images/batch-delete', methods=['POST'])
 def batch_delete_images():
@@ -741,24 +1395,12 @@ def batch_delete_images():
         if not image_ids:
             return jsonify({'error': '没有选择要删除的图片'}), 400
             
-        # 获取要删除的图片信息
-        images = list(mongo.db.images.find({'_id': {'$in': [ObjectId(id) for id in image_ids]}}))
-        
-        # 删除文件
-        for image in images:
-            file_path = Path(app.config['UPLOAD_FOLDER']) / image['filename']
-            try:
-                if file_path.exists():
-                    file_path.unlink()
-            except Exception as e:
-                app.logger.error(f"删除文件失败 {file_path}: {str(e)}")
-        
-        # 从数据库中删除记录
-        result = mongo.db.images.delete_many({'_id': {'$in': [ObjectId(id) for id in image_ids]}})
+        deleted_count = soft_delete_images(image_ids)
         
         return jsonify({
-            'message': f'成功删除 {result.deleted_count} 张图片',
-            'deleted_count': result.deleted_count
+            'success': True,
+            'message': f'成功删除 {deleted_count} 张图片',
+            'deleted_count': deleted_count
         })
     except Exception as e:
         app.logger.error(f"批量删除图片时发生错误: {str(e)}")
@@ -767,11 +1409,18 @@ def batch_delete_images():
 # 批量更新标签
 @app.route('/api/images/batch-tags', methods=['POST'])
 def batch_update_tags():
-    """批量更新图片标签"""
+    """批量更新图片标签
+
+    action 参数：
+    - set（默认）：用 tags 替换选中图片的全部标签
+    - add：用 $addToSet 为选中图片追加 tags，保留已有标签
+    - remove：用 $pull 从选中图片中移除 tags
+    """
     try:
         data = request.get_json()
         image_ids = data.get('image_ids', [])
-        tags = data.get('tags', [])
+        tags = [tag.strip() for tag in data.get('tags', []) if tag and tag.strip()]
+        action = data.get('action', 'set')
         
         if not image_ids:
             return jsonify({'error': '没有选择要更新的图片'}), 400
@@ -779,11 +1428,30 @@ def batch_update_tags():
         if not tags:
             return jsonify({'error': '没有提供标签'}), 400
         
-        # 更新数据库中的标签
-        result = mongo.db.images.update_many(
-            {'_id': {'$in': [ObjectId(id) for id in image_ids]}},
-            {'$set': {'tags': tags}}
-        )
+        if action not in ('set', 'add', 'remove'):
+            return jsonify({'error': f'不支持的操作: {action}'}), 400
+        
+        object_ids = [ObjectId(id) for id in image_ids]
+        match = {'_id': {'$in': object_ids}, 'deleted': NOT_DELETED}
+        
+        if action == 'add':
+            # 只统计尚未含有该标签的图片，再在服务端原子追加
+            counts = count_tag_membership(mongo.db.images, match, tags, present=False)
+            result = mongo.db.images.update_many(match, {'$addToSet': {'tags': {'$each': tags}}})
+            tag_stats.apply_counts(counts, 1)
+        elif action == 'remove':
+            counts = count_tag_membership(mongo.db.images, match, tags, present=True)
+            result = mongo.db.images.update_many(match, {'$pull': {'tags': {'$in': tags}}})
+            tag_stats.apply_counts(counts, -1)
+        else:
+            before = list(mongo.db.images.find(match, {'tags': 1, 'is_public': 1}))
+            
+            # 更新数据库中的标签
+            result = mongo.db.images.update_many(match, {'$set': {'tags': tags}})
+            tag_stats.record([(tag_state(image), tag_state({**image, 'tags': tags})) for image in before])
+        
+        if result.modified_count:
+            change_counter.bump()
         
         return jsonify({
             'success': True,
@@ -793,6 +1461,54 @@ def batch_update_tags():
         app.logger.error(f"批量更新标签时发生错误: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# 全局重命名标签
+@app.route('/api/tags/rename', methods=['POST'])
+def rename_tag():
+    """将所有图片中的标签 old 重命名为 new，一次 update_many 完成"""
+    try:
+        if 'username' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        data = request.get_json()
+        old = (data.get('old') or '').strip()
+        new = (data.get('new') or '').strip()
+        
+        if not old or not new:
+            return jsonify({'error': '没有提供标签'}), 400
+        if old == new:
+            return jsonify({'success': True, 'modified_count': 0})
+        
+        match = {'tags': old, 'deleted': NOT_DELETED}
+        removed = count_tag_membership(mongo.db.images, match, [old], present=True)
+        added = count_tag_membership(mongo.db.images, match, [new], present=False)
+        
+        # 聚合管道更新：替换标签并去重，保持原有顺序（已含有 new 的图片不会重复）
+        result = mongo.db.images.update_many(match, [{'$set': {'tags': {'$reduce': {
+            'input': {'$map': {
+                'input': '$tags',
+                'in': {'$cond': [{'$eq': ['$$this', old]}, new, '$$this']}
+            }},
+            'initialValue': [],
+            'in': {'$cond': [
+                {'$in': ['$$this', '$$value']},
+                '$$value',
+                {'$concatArrays': ['$$value', ['$$this']]}
+            ]}
+        }}}}])
+        tag_stats.apply_counts(removed, -1)
+        tag_stats.apply_counts(added, 1)
+        if result.modified_count:
+            change_counter.bump()
+        
+        return jsonify({
+            'success': True,
+            'message': f'成功将 {result.modified_count} 张图片的标签“{old}”重命名为“{new}”',
+            'modified_count': result.modified_count
+        })
+    except Exception as e:
+        app.logger.error(f"重命名标签时发生错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 # 批量更新公开状态
 @app.route('/api/images/batch-public', methods=['POST'])
 def batch_update_public():
@@ -811,14 +1527,21 @@ def batch_update_public():
             
         # 将ObjectId字符串转换为ObjectId对象
         object_ids = [ObjectId(id) for id in image_ids]
+        match = {'_id': {'$in': object_ids}, 'deleted': NOT_DELETED}
+        before = list(mongo.db.images.find(match, {'tags': 1, 'is_public': 1}))
         
-        # 更新数据库
+        # 更新数据库（与统计快照使用相同的条件，已删除的图片不更新）
         result = mongo.db.images.update_many(
-            {'_id': {'$in': object_ids}},  # 移除 username 限制
+            match,  # 移除 username 限制
             {'$set': {'is_public': is_public}}  # 只使用 is_public 字段
         )
         
         if result.modified_count > 0:
+            tag_stats.record([
+                (tag_state(image), tag_state({**image, 'is_public': is_public}))
+                for image in before
+            ])
+            change_counter.bump()
             return jsonify({
                 'success': True,
                 'message': f'成功更新{result.modified_count}张图片的公开状态'
@@ -836,7 +1559,7 @@ def update_all_photo_times():
     """更新所有图片的拍摄时间"""
     try:
         # 获取所有图片记录
-        images = list(mongo.db.images.find())
+        images = list(mongo.db.images.find({'deleted': NOT_DELETED}))
         updated_count = 0
         error_count = 0
         error_details = []
@@ -870,6 +1593,9 @@ def update_all_photo_times():
                 error_count += 1
                 error_details.append(error_msg)
         
+        if updated_count:
+            change_counter.bump()
+        
         message = f'更新完成：成功 {updated_count} 个，失败 {error_count} 个'
         if error_details:
             message += '\n\n错误详情：\n' + '\n'.join(error_details[:5])  # 只显示前5个错误
@@ -1,38 +1,306 @@
+"""
+上传目录对账清理工具
+
+功能：
+1. 覆盖原图、thumbnails/、webp/ 三类目录
+2. 将排序后的目录扫描结果与排序后的 MongoDB 游标做流式归并，内存占用有界
+3. 同时报告两类孤立数据：
+   - 孤立文件：磁盘上存在但数据库中没有记录
+   - 缺失文件：数据库中有记录但磁盘上不存在
+4. 支持预览模式（--dry-run）和隔离模式（--quarantine）
+5. 各目录并行对账
+6. 宽限期（--grace-minutes）：跳过最近修改的孤立文件。上传和导入先写文件再插入记录，
+   迁移脚本替换变体后也会保留旧版本一段时间，这些文件在宽限期内不算孤立
+
+用法：
+    python clean_uploads.py --dry-run
+    python clean_uploads.py --quarantine uploads_quarantine
+    python clean_uploads.py --grace-minutes 120
+"""
+
 import os
+import sys
+import glob
+import heapq
+import time
+import shutil
+import argparse
+import tempfile
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from pymongo import MongoClient
 
-def clean_uploads():
-    # 连接到MongoDB
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client['your_database_name']
-    images_collection = db['images']
-    
-    # 获取数据库中的所有图片文件名
-    db_images = set(img['filename'] for img in images_collection.find({}, {'filename': 1}))
-    
-    # 获取uploads目录中的所有jpg文件
-    uploads_dir = Path('uploads')
-    file_images = set(f.name for f in uploads_dir.glob('*.jpg'))
-    
-    # 找出在文件系统中存在但在数据库中不存在的文件
-    orphaned_files = file_images - db_images
-    
-    # 删除孤立文件
-    deleted_count = 0
-    for filename in orphaned_files:
-        file_path = uploads_dir / filename
+# 原图允许的扩展名，与 app.ALLOWED_EXTENSIONS 保持一致
+ORIGINAL_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+
+# 需要对账的目录：名称 -> (相对上传目录的子目录, 数据库字段, 允许的扩展名)
+VARIANT_DIRS = {
+    'original': ('', 'filename', ORIGINAL_EXTENSIONS),
+    'thumbnail': ('thumbnails', 'thumbnail_path', {'webp'}),
+    'webp': ('webp', 'webp_path', {'webp'}),
+}
+
+# 目录扫描时单个有序分段的最大文件名数量，超出后写入临时文件做外部归并
+SCAN_CHUNK_SIZE = 50000
+
+# 默认宽限期（分钟），需大于上传/导入写入记录的耗时和迁移脚本的 --grace
+DEFAULT_GRACE_MINUTES = 60
+
+
+def _spill_run(names, runs):
+    """将一段已排序的文件名写入临时文件"""
+    run = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+    for name in sorted(names):
+        run.write(name + '\n')
+    run.seek(0)
+    runs.append(run)
+
+
+def _read_run(run):
+    for line in run:
+        yield line.rstrip('\n')
+
+
+def iter_sorted_files(directory, extensions, chunk_size=SCAN_CHUNK_SIZE):
+    """
+    按文件名升序流式返回目录中的图片文件名
+
+    使用 os.scandir 扫描，每 chunk_size 个文件名排序后落盘，
+    最后用 heapq.merge 做多路归并，内存中最多保留一个分段。
+    """
+    if not directory.is_dir():
+        return
+
+    names = []
+    runs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                if '.' not in entry.name or '\n' in entry.name:
+                    continue
+                if entry.name.rsplit('.', 1)[1].lower() not in extensions:
+                    continue
+                names.append(entry.name)
+                if len(names) >= chunk_size:
+                    _spill_run(names, runs)
+                    names = []
+
+        if not runs:
+            yield from sorted(names)
+            return
+
+        names.sort()
+        yield from heapq.merge(names, *(_read_run(run) for run in runs))
+    finally:
+        for run in runs:
+            run.close()
+
+
+def iter_sorted_records(collection, field):
+    """
+    按文件名升序流式返回数据库记录 (文件名, _id)
+
+    路径字段可能是绝对路径、相对路径或 Windows 路径，统一在数据库端取出文件名部分，
+    排序交给 MongoDB（allowDiskUse），客户端只持有游标的一个批次。
+    """
+    pipeline = [
+        {'$match': {field: {'$type': 'string', '$ne': ''}}},
+        {'$project': {
+            'name': {'$arrayElemAt': [
+                {'$split': [
+                    {'$replaceAll': {'input': '$' + field, 'find': '\\', 'replacement': '/'}},
+                    '/'
+                ]},
+                -1
+            ]}
+        }},
+        {'$sort': {'name': 1}},
+    ]
+    for doc in collection.aggregate(pipeline, allowDiskUse=True):
+        yield doc['name'], doc['_id']
+
+
+def merge_diff(file_names, records):
+    """
+    归并两个有序序列，返回 (孤立文件, 缺失文件) 的流式事件
+
+    Yields:
+        ('orphan', 文件名, None) 或 ('missing', 文件名, _id)
+    """
+    _end = object()
+    file_iter = iter(file_names)
+    record_iter = iter(records)
+    name = next(file_iter, _end)
+    record = next(record_iter, _end)
+
+    while name is not _end or record is not _end:
+        if record is _end or (name is not _end and name < record[0]):
+            yield 'orphan', name, None
+            name = next(file_iter, _end)
+        elif name is _end or record[0] < name:
+            yield 'missing', record[0], record[1]
+            record = next(record_iter, _end)
+        else:
+            # 同一文件可能被多条记录引用，全部消费掉
+            matched = name
+            while record is not _end and record[0] == matched:
+                record = next(record_iter, _end)
+            name = next(file_iter, _end)
+
+
+def _variant_stem(name):
+    """变体文件名（<原文件名>.<版本>.webp 或旧的 <原文件名>.webp）对应的原文件名部分"""
+    stem = name[:-len('.webp')]
+    base, _, version = stem.rpartition('.')
+    if base and len(version) == 8 and all(c in '0123456789abcdef' for c in version):
+        return base
+    return stem
+
+
+def last_modified(directory, name, versioned):
+    """
+    文件的最近修改时间
+
+    变体目录中被替换的旧版本本身可能很旧，它被替换的时间以同一原图的其他版本中
+    最新的修改时间为准，这样迁移脚本替换后保留的旧变体同样受宽限期保护。
+    """
+    mtime = (directory / name).stat().st_mtime
+    if versioned:
+        stem = _variant_stem(name)
+        for sibling in directory.glob(glob.escape(stem) + '.*webp'):
+            if _variant_stem(sibling.name) == stem:
+                mtime = max(mtime, sibling.stat().st_mtime)
+    return mtime
+
+
+def reconcile_directory(collection, upload_dir, variant, dry_run=False, quarantine_dir=None,
+                        grace_minutes=DEFAULT_GRACE_MINUTES):
+    """
+    对账单个目录
+
+    修改时间在 grace_minutes 分钟以内的孤立文件跳过，计入 recent。
+
+    Returns:
+        统计信息字典
+    """
+    subdir, field, extensions = VARIANT_DIRS[variant]
+    directory = upload_dir / subdir if subdir else upload_dir
+    stats = {
+        'variant': variant,
+        'orphaned': 0,
+        'recent': 0,
+        'removed': 0,
+        'missing': 0,
+        'errors': 0,
+    }
+
+    cutoff = time.time() - grace_minutes * 60
+    versioned = bool(subdir)
+    events = merge_diff(
+        iter_sorted_files(directory, extensions),
+        iter_sorted_records(collection, field)
+    )
+    for kind, name, image_id in events:
+        if kind == 'missing':
+            stats['missing'] += 1
+            print(f"[{variant}] 缺失文件: {name} (_id={image_id})")
+            continue
+
+        file_path = directory / name
         try:
-            os.remove(file_path)
-            print(f"已删除: {filename}")
-            deleted_count += 1
+            if last_modified(directory, name, versioned) > cutoff:
+                stats['recent'] += 1
+                continue
+        except FileNotFoundError:
+            # 扫描后已被删除或移走
+            continue
+
+        stats['orphaned'] += 1
+        if dry_run:
+            print(f"[{variant}] [DRY RUN] 孤立文件: {file_path}")
+            continue
+
+        try:
+            if quarantine_dir:
+                target_dir = quarantine_dir / subdir if subdir else quarantine_dir
+                target_dir.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(file_path), str(target_dir / name))
+                print(f"[{variant}] 已隔离: {name}")
+            else:
+                os.remove(file_path)
+                print(f"[{variant}] 已删除: {name}")
+            stats['removed'] += 1
         except Exception as e:
-            print(f"删除 {filename} 时出错: {e}")
-    
-    print(f"\n清理完成:")
-    print(f"- 数据库中的图片数量: {len(db_images)}")
-    print(f"- 文件系统中的图片数量: {len(file_images)}")
-    print(f"- 删除的孤立文件数量: {deleted_count}")
+            stats['errors'] += 1
+            print(f"[{variant}] 处理 {name} 时出错: {e}")
+
+    return stats
+
+
+def clean_uploads(mongo_uri='mongodb://localhost:27017/', db_name='your_database_name',
+                  upload_folder='uploads', dry_run=False, quarantine=None, workers=None,
+                  grace_minutes=DEFAULT_GRACE_MINUTES):
+    # 连接到MongoDB（MongoClient 线程安全，各目录共享同一个连接池）
+    client = MongoClient(mongo_uri)
+    images_collection = client[db_name]['images']
+
+    uploads_dir = Path(upload_folder)
+    quarantine_dir = Path(quarantine) if quarantine else None
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers or len(VARIANT_DIRS)) as executor:
+            futures = [
+                executor.submit(reconcile_directory, images_collection, uploads_dir,
+                                variant, dry_run, quarantine_dir, grace_minutes)
+                for variant in VARIANT_DIRS
+            ]
+            results = [future.result() for future in futures]
+    finally:
+        client.close()
+
+    action = '隔离' if quarantine_dir else '删除'
+    print(f"\n清理完成{'（预览模式）' if dry_run else ''}:")
+    for stats in results:
+        print(f"- [{stats['variant']}] 孤立文件: {stats['orphaned']}, "
+              f"已{action}: {stats['removed']}, "
+              f"宽限期内跳过: {stats['recent']}, "
+              f"缺失文件的记录: {stats['missing']}, "
+              f"错误: {stats['errors']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对账并清理上传目录中的孤立文件')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/',
+                        help='MongoDB 连接字符串')
+    parser.add_argument('--db-name', default='your_database_name',
+                        help='数据库名称')
+    parser.add_argument('--upload-folder', default='uploads',
+                        help='上传文件夹路径')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='预览模式，只报告不处理')
+    parser.add_argument('--quarantine', default=None,
+                        help='将孤立文件移动到该目录，而不是直接删除')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='并行对账的线程数（默认每个目录一个）')
+    parser.add_argument('--grace-minutes', type=float, default=DEFAULT_GRACE_MINUTES,
+                        help=f'跳过最近多少分钟内修改的孤立文件（默认 {DEFAULT_GRACE_MINUTES}）')
+    args = parser.parse_args()
+
+    results = clean_uploads(
+        mongo_uri=args.mongo_uri,
+        db_name=args.db_name,
+        upload_folder=args.upload_folder,
+        dry_run=args.dry_run,
+        quarantine=args.quarantine,
+        workers=args.workers,
+        grace_minutes=args.grace_minutes
+    )
+    if any(stats['errors'] for stats in results):
+        sys.exit(1)
+
 
 if __name__ == '__main__':
-    clean_uploads()
+    main()
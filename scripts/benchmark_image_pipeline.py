@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+图片处理管线基准测试脚本
+
+功能：
+1. 生成可复现的合成测试图片（JPEG/PNG/GIF，多种像素规模和颜色模式 RGB/RGBA/P/CMYK）
+2. 测量 ImageProcessor.generate_thumbnail、generate_webp、save_image、get_image_metadata
+3. 报告吞吐量、p50/p95 延迟、峰值内存（RSS）和各变体输出字节数
+4. 结果保存为 JSON，可用 --compare 对比不同提交之间的差异
+
+每个用例在独立子进程中运行，峰值 RSS 互不影响。
+
+用法：
+    python scripts/benchmark_image_pipeline.py --sizes 1,4,12 --iterations 5
+    python scripts/benchmark_image_pipeline.py --compare old.json new.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+# (格式, 颜色模式) 组合，只包含格式实际支持的模式
+FIXTURE_MATRIX = [
+    ('JPEG', 'RGB'),
+    ('JPEG', 'CMYK'),
+    ('PNG', 'RGB'),
+    ('PNG', 'RGBA'),
+    ('PNG', 'P'),
+    ('GIF', 'P'),
+]
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+OPERATIONS = ['thumbnail', 'webp', 'save_image', 'metadata']
+
+
+def _make_image(width, height, mode, seed):
+    """生成带渐变和噪声的合成图片，压缩特性接近真实照片"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 40 + rng.randint(0, 20))
+    radial = Image.radial_gradient('L').resize((width, height))
+    img = Image.merge('RGB', (gradient, noise, radial))
+
+    # 叠加一些色块，避免图片过于平滑
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(width // 4 + 1), y0 + rng.randrange(height // 4 + 1)
+        draw.rectangle([x0, y0, x1, y1], fill=tuple(rng.randrange(256) for _ in range(3)))
+
+    if mode == 'RGBA':
+        alpha = Image.linear_gradient('L').rotate(90).resize((width, height))
+        img.putalpha(alpha)
+    elif mode == 'P':
+        img = img.quantize(colors=256)
+    elif mode == 'CMYK':
+        img = img.convert('CMYK')
+    return img
+
+
+def _exif_bytes():
+    import piexif
+
+    exif = {
+        '0th': {piexif.ImageIFD.Make: b'Canon', piexif.ImageIFD.Model: b'Canon EOS R5'},
+        'Exif': {
+            piexif.ExifIFD.DateTimeOriginal: b'2024:05:01 10:20:30',
+            piexif.ExifIFD.LensModel: b'RF24-70mm F2.8 L IS USM',
+        },
+    }
+    return piexif.dump(exif)
+
+
+def build_fixtures(fixture_dir, sizes, seed=1117):
+    """
+    生成测试图片，已存在的同名文件直接复用
+
+    Args:
+        fixture_dir: 测试图片目录
+        sizes: 百万像素列表
+        seed: 随机种子，保证多次运行结果一致
+
+    Returns:
+        测试图片信息列表
+    """
+    fixture_dir = Path(fixture_dir)
+    fixture_dir.mkdir(parents=True, exist_ok=True)
+    fixtures = []
+
+    for megapixels in sizes:
+        # 3:2 画幅
+        width = int((megapixels * 1_000_000 * 3 / 2) ** 0.5)
+        height = int(width * 2 / 3)
+        for fmt, mode in FIXTURE_MATRIX:
+            name = f"{megapixels}mp_{mode.lower()}.{EXTENSIONS[fmt]}"
+            path = fixture_dir / name
+            if not path.exists():
+                img = _make_image(width, height, mode, seed + megapixels)
+                save_kwargs = {}
+                if fmt == 'JPEG':
+                    save_kwargs = {'quality': 92, 'exif': _exif_bytes()}
+                img.save(path, fmt, **save_kwargs)
+            fixtures.append({
+                'name': name,
+                'path': str(path),
+                'format': fmt,
+                'mode': mode,
+                'megapixels': megapixels,
+                'width': width,
+                'height': height,
+                'bytes': path.stat().st_size,
+            })
+    return fixtures
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_case(fixture, operation, iterations, warmup):
+    """在子进程中运行单个用例并返回统计结果"""
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    from werkzeug.datastructures import FileStorage
+    from utils.image_processor import ImageProcessor
+    from utils.file_utils import save_image, get_image_metadata
+
+    work_dir = Path(tempfile.mkdtemp(prefix='bench_'))
+    processor = ImageProcessor(str(work_dir))
+    baseline_rss = _peak_rss_bytes()
+
+    def run_once():
+        if operation == 'thumbnail':
+            out = processor.generate_thumbnail(fixture['path'])
+            return {'thumbnail': Path(out).stat().st_size if out else 0}
+        if operation == 'webp':
+            out = processor.generate_webp(fixture['path'])
+            return {'webp': Path(out).stat().st_size if out else 0}
+        if operation == 'save_image':
+            upload_dir = Path(tempfile.mkdtemp(dir=work_dir))
+            with open(fixture['path'], 'rb') as f:
+                result = save_image(FileStorage(stream=f, filename=fixture['name']), str(upload_dir))
+            sizes = dict(result['file_sizes'])
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            return sizes
+        if operation == 'metadata':
+            get_image_metadata(fixture['path'])
+            return {}
+        raise ValueError(f'未知操作: {operation}')
+
+    try:
+        for _ in range(warmup):
+            run_once()
+
+        latencies = []
+        output_bytes = {}
+        for _ in range(iterations):
+            start = time.perf_counter()
+            output_bytes = run_once()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    total = sum(latencies)
+    peak_rss = _peak_rss_bytes()
+    return {
+        'fixture': fixture['name'],
+        'format': fixture['format'],
+        'mode': fixture['mode'],
+        'megapixels': fixture['megapixels'],
+        'input_bytes': fixture['bytes'],
+        'operation': operation,
+        'iterations': iterations,
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p95_ms': _percentile(latencies, 95) * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'images_per_sec': iterations / total if total else 0,
+        'megapixels_per_sec': iterations * fixture['megapixels'] / total if total else 0,
+        'peak_rss_mb': peak_rss / 1024 / 1024,
+        'peak_rss_delta_mb': (peak_rss - baseline_rss) / 1024 / 1024,
+        'output_bytes': output_bytes,
+    }
+
+
+def environment_info():
+    """记录运行环境，便于跨提交对比"""
+    import PIL
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = 'unknown'
+
+    return {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def print_results(results):
+    header = f"{'用例':<22}{'操作':<12}{'p50(ms)':>10}{'p95(ms)':>10}{'张/秒':>9}{'MP/秒':>9}{'峰值RSS(MB)':>13}  输出字节"
+    print(header)
+    print('-' * 100)
+    for r in results:
+        outputs = ', '.join(f"{k}={v}" for k, v in r['output_bytes'].items()) or '-'
+        print(f"{r['fixture']:<22}{r['operation']:<12}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+              f"{r['images_per_sec']:>9.2f}{r['megapixels_per_sec']:>9.2f}{r['peak_rss_mb']:>13.1f}  {outputs}")
+
+
+def compare(old_path, new_path):
+    """对比两次运行的 p50 延迟和峰值内存"""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+
+    old_index = {(r['fixture'], r['operation']): r for r in old['results']}
+    print(f"对比 {old['environment']['commit']} → {new['environment']['commit']}")
+    print(f"{'用例':<22}{'操作':<12}{'旧p50':>10}{'新p50':>10}{'变化':>9}{'旧RSS':>9}{'新RSS':>9}")
+    for r in new['results']:
+        base = old_index.get((r['fixture'], r['operation']))
+        if not base:
+            continue
+        change = (r['p50_ms'] / base['p50_ms'] - 1) * 100 if base['p50_ms'] else 0
+        print(f"{r['fixture']:<22}{r['operation']:<12}{base['p50_ms']:>10.1f}{r['p50_ms']:>10.1f}"
+              f"{change:>+8.1f}%{base['peak_rss_mb']:>9.1f}{r['peak_rss_mb']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图片处理管线基准测试')
+    parser.add_argument('--sizes', default='1,4,12',
+                        help='测试图片的百万像素列表，逗号分隔')
+    parser.add_argument('--operations', default=','.join(OPERATIONS),
+                        help=f'要测试的操作，可选: {",".join(OPERATIONS)}')
+    parser.add_argument('--iterations', type=int, default=5,
+                        help='每个用例的计时次数')
+    parser.add_argument('--warmup', type=int, default=1,
+                        help='每个用例的预热次数（不计时）')
+    parser.add_argument('--fixture-dir', default=str(Path(tempfile.gettempdir()) / 'pic_bench_fixtures'),
+                        help='测试图片目录（已生成的图片会被复用）')
+    parser.add_argument('--output-dir', default='benchmarks/results',
+                        help='JSON 结果保存目录')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='对比两个 JSON 结果文件')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    operations = [op for op in args.operations.split(',') if op]
+    for op in operations:
+        if op not in OPERATIONS:
+            parser.error(f'未知操作: {op}')
+
+    print(f"生成测试图片到 {args.fixture_dir} ...")
+    fixtures = build_fixtures(args.fixture_dir, sizes)
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for fixture in fixtures:
+        for operation in operations:
+            # 每个用例使用全新子进程，峰值 RSS 只反映该用例
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_case, fixture, operation, args.iterations, args.warmup).result()
+            results.append(result)
+            print(f"  {fixture['name']:<22}{operation:<12}p50={result['p50_ms']:.1f}ms")
+
+    print()
+    print_results(results)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    env = environment_info()
+    output_path = output_dir / f"bench_{env['commit']}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({'environment': env, 'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到 {output_path}")
+
+
+if __name__ == '__main__':
+    main()
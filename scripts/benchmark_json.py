@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+JSON 序列化基准测试脚本
+
+对比 Flask 默认 JSON provider（标准库 json，排序键、ASCII 转义）与
+FastJSONProvider（orjson 或标准库回退）在真实结构图片记录上的序列化耗时：
+
+- page: 首页列表一页（18 张，已序列化的图片记录）
+- manage: 管理页一页（100 张）
+- year: 年份视图（按月分组，默认 1500 张）
+- raw: 未经 serialize_image 转换的原始记录（ObjectId/datetime 由 provider 原生编码）
+
+用法：
+    python scripts/benchmark_json.py --year-size 3000 --repeat 50
+"""
+
+import sys
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.json_provider import FastJSONProvider
+
+TAGS = ['风景', '人像', '旅行', '家庭', '宠物', '美食', '街拍', '夜景', '建筑', '花卉']
+
+
+def make_raw_image(rng):
+    """生成与数据库中结构一致的图片记录"""
+    photo_time = datetime(2024, 1, 1) + timedelta(seconds=rng.randrange(365 * 86400))
+    name = f'IMG_{rng.randrange(10000):04d}'
+    width, height = rng.choice([(6000, 4000), (4000, 6000), (4032, 3024)])
+    return {
+        '_id': ObjectId(),
+        'filename': f'{name}.jpg',
+        'path': f'/var/www/pic/uploads/{name}.jpg',
+        'thumbnail_path': f'/var/www/pic/uploads/thumbnails/{name}.webp',
+        'webp_path': f'/var/www/pic/uploads/webp/{name}.webp',
+        'has_thumbnail': True,
+        'has_webp': True,
+        'file_sizes': {'original': 1843211, 'thumbnail': 48211, 'webp': 612334},
+        'upload_time': photo_time + timedelta(days=3),
+        'photo_time': photo_time,
+        'year': photo_time.year,
+        'month': photo_time.month,
+        'metadata': {
+            'size': [width, height],
+            'format': 'JPEG',
+            'mode': 'RGB',
+            'photo_time': photo_time,
+            'camera_make': 'Canon',
+            'camera_model': 'Canon EOS R5',
+            'lens_model': 'RF24-70mm F2.8 L IS USM',
+        },
+        'is_public': True,
+        'likes': rng.randrange(200),
+        'tags': rng.sample(TAGS, rng.randint(0, 3)),
+        'processing_status': 'completed',
+        'content_hash': '%064x' % rng.getrandbits(256),
+        'dhash': '%016x' % rng.getrandbits(64),
+        'dhash_bands': [rng.getrandbits(18) for _ in range(4)],
+        'width': width,
+        'height': height,
+        'dominant_color': '#%06x' % rng.getrandbits(24),
+        'blurhash': 'LEHV6nWB2yk8pyo0adR*.7kCMdnj',
+    }
+
+
+def serialize(image):
+    """与 app.serialize_image 相同的字段转换（不依赖应用和数据库）"""
+    image = dict(image)
+    image['_id'] = str(image['_id'])
+    image['url'] = '/uploads/' + image['filename']
+    image['thumbnail_url'] = '/uploads/thumbnails/' + Path(image['thumbnail_path']).name
+    image['webp_url'] = '/uploads/webp/' + Path(image['webp_path']).name
+    image['photo_time'] = image['photo_time'].strftime('%Y-%m-%d %H:%M:%S')
+    return image
+
+
+def build_payloads(year_size, seed=1117):
+    rng = random.Random(seed)
+    page = [serialize(make_raw_image(rng)) for _ in range(18)]
+    manage = [serialize(make_raw_image(rng)) for _ in range(100)]
+    year_images = [serialize(make_raw_image(rng)) for _ in range(year_size)]
+    months = {}
+    for image in year_images:
+        months.setdefault(int(image['photo_time'][5:7]), []).append(image)
+    year = [{'_id': month, 'images': images} for month, images in sorted(months.items(), reverse=True)]
+    raw = [make_raw_image(rng) for _ in range(100)]
+    return {
+        'page': {'data': page},
+        'manage': {'images': manage, 'total': 1958, 'page': 1},
+        'year': {'by_month': True, 'year': 2024, 'data': year},
+        'raw': {'images': raw},
+    }
+
+
+def measure(func, repeat):
+    func()  # 预热
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), len(func())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON 序列化基准测试')
+    parser.add_argument('--year-size', type=int, default=1500, help='年份视图的图片数量')
+    parser.add_argument('--repeat', type=int, default=30, help='每个用例的重复次数')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+    payloads = build_payloads(args.year_size)
+
+    print(f"FastJSONProvider 后端: {FastJSONProvider.backend}")
+    print(f"{'用例':<10}{'默认(ms)':>12}{'快速(ms)':>12}{'加速':>8}{'默认字节':>12}{'快速字节':>12}")
+    print('-' * 66)
+    for name, payload in payloads.items():
+        # 与 jsonify 一致：默认 provider 生成 str 后编码为 UTF-8
+        baseline, baseline_size = measure(lambda: default_provider.dumps(payload).encode('utf-8'), args.repeat)
+        fast, fast_size = measure(lambda: fast_provider.dumps_bytes(payload), args.repeat)
+        print(f"{name:<10}{baseline * 1000:>12.2f}{fast * 1000:>12.2f}{baseline / fast:>7.1f}x"
+              f"{baseline_size:>12}{fast_size:>12}")
+
+
+if __name__ == '__main__':
+    main()
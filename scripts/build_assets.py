@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+静态资源打包脚本
+
+功能：
+1. 下载 Bootstrap、Font Awesome（含字体）和 qrcodejs 到 static/vendor/（已存在的文件跳过）
+2. 压缩 static/src/ 下的页面脚本和样式
+3. 按内容哈希命名输出到 static/dist/，生成 manifest.json 供模板中的 asset_url 使用
+4. 保留最近几次打包的输出（--keep），部署期间尚未重启的进程和已打开的页面仍能加载旧文件
+
+部署时在启动应用前执行；修改 static/src/ 下的文件后需要重新打包。
+"""
+
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.assets import DIST_DIR, KEEP_BUILDS, build, clean, fetch_vendor, rjsmin
+
+
+def main():
+    parser = argparse.ArgumentParser(description='打包静态资源')
+    parser.add_argument('--static-folder', default=str(project_root / 'static'),
+                        help='static 目录')
+    parser.add_argument('--skip-fetch', action='store_true',
+                        help='不下载第三方资源（未下载的资源页面使用 CDN 地址）')
+    parser.add_argument('--refetch', action='store_true',
+                        help='重新下载全部第三方资源')
+    parser.add_argument('--keep', type=int, default=KEEP_BUILDS,
+                        help=f'保留最近几次打包的输出（包括本次，默认 {KEEP_BUILDS}），部署期间旧页面仍可加载')
+    parser.add_argument('--clean', action='store_true',
+                        help='删除打包输出后退出（页面退回源文件）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+
+    if args.clean:
+        clean(args.static_folder)
+        print(f"已删除 {Path(args.static_folder) / DIST_DIR}")
+        return
+
+    if not args.skip_fetch:
+        try:
+            count = fetch_vendor(args.static_folder, force=args.refetch)
+            print(f"下载第三方资源 {count} 个")
+        except Exception as e:
+            print(f"下载第三方资源失败: {str(e)}（已下载的文件仍会打包）")
+
+    if rjsmin is None:
+        print("未安装 rjsmin/rcssmin，只做简单的空白压缩")
+
+    manifest = build(args.static_folder, keep=args.keep)
+    dist = Path(args.static_folder)
+    print(f"\n共打包 {len(manifest)} 个资源：")
+    for name, path in sorted(manifest.items()):
+        size = (dist / path).stat().st_size
+        print(f"  {name:<18} -> {path}  ({size / 1024:.1f} KB)")
+
+
+if __name__ == '__main__':
+    main()
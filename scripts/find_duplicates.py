@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+近似重复图片报告脚本
+
+功能：
+1. 读取数据库中所有图片的感知哈希（dhash）
+2. 使用 BK 树按汉明距离聚类，找出连拍、重新导出等近似重复的照片
+3. 输出重复组，可选保存为 JSON
+
+没有感知哈希的历史图片需要先运行 migrate_existing_images.py 补算。
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+from pymongo import MongoClient
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.phash import DEFAULT_MAX_DISTANCE, find_clusters, from_hex, hamming
+
+
+def load_hashes(collection):
+    """流式读取 (哈希, 图片信息)"""
+    cursor = collection.find(
+        {'dhash': {'$exists': True}, 'deleted': {'$ne': True}},
+        {'dhash': 1, 'filename': 1, 'photo_time': 1, 'is_public': 1}
+    )
+    for doc in cursor:
+        yield from_hex(doc['dhash']), {
+            'id': str(doc['_id']),
+            'filename': doc.get('filename'),
+            'dhash': doc['dhash'],
+            'photo_time': str(doc.get('photo_time') or ''),
+            'is_public': doc.get('is_public')
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='查找近似重复的图片')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/',
+                        help='MongoDB 连接字符串')
+    parser.add_argument('--db-name', default='your_database_name',
+                        help='数据库名称')
+    parser.add_argument('--distance', type=int, default=DEFAULT_MAX_DISTANCE,
+                        help='判定为重复的最大汉明距离')
+    parser.add_argument('--output', default=None,
+                        help='将重复组保存为 JSON 文件')
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri)
+    try:
+        entries = list(load_hashes(client[args.db_name].images))
+    finally:
+        client.close()
+
+    clusters = find_clusters(entries, max_distance=args.distance)
+    clusters.sort(key=len, reverse=True)
+
+    print(f"共 {len(entries)} 张图片有感知哈希，发现 {len(clusters)} 组近似重复：")
+    for index, group in enumerate(clusters, 1):
+        anchor = from_hex(group[0]['dhash'])
+        print(f"\n第 {index} 组（{len(group)} 张）")
+        for info in group:
+            distance = hamming(anchor, from_hex(info['dhash']))
+            print(f"  - {info['filename']}  id={info['id']}  距离={distance}  {info['photo_time']}")
+
+    duplicate_count = sum(len(group) - 1 for group in clusters)
+    print(f"\n可清理的重复图片: {duplicate_count} 张")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(clusters, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
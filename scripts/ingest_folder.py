@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+目录批量导入脚本
+
+功能：
+1. 扫描目录树中的图片，按内容哈希去重后复制（或移动）到上传目录
+2. 只读取一次元数据，每批用一次 insert_many 写入数据库
+3. 并行生成缩略图和 WebP，结束时输出吞吐量报告
+4. --watch 持续监视目录（安装了 watchdog 时使用 inotify，否则轮询），摄影师拷入的整组照片自动导入
+
+示例：
+    python scripts/ingest_folder.py /srv/dropbox --db-name pic_share --upload-folder /var/www/pic/uploads
+    python scripts/ingest_folder.py /srv/dropbox --watch --move --tag 活动
+"""
+
+import sys
+import argparse
+import logging
+from pathlib import Path
+from pymongo import MongoClient
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.change_counter import ChangeCounter
+from utils.ingest import FolderIngester, Observer
+from utils.tag_stats import TagStats
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='从目录批量导入图片')
+    parser.add_argument('source', help='导入的目录')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/',
+                        help='MongoDB 连接字符串')
+    parser.add_argument('--db-name', default='your_database_name',
+                        help='数据库名称')
+    parser.add_argument('--upload-folder', default='uploads',
+                        help='上传文件夹路径')
+    parser.add_argument('--move', action='store_true',
+                        help='导入成功后删除源文件（重复的文件保留）')
+    parser.add_argument('--tag', action='append', default=[],
+                        help='为导入的图片添加标签（可重复）')
+    parser.add_argument('--private', action='store_true',
+                        help='导入为私密图片')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='并行线程数（默认 CPU 核数）')
+    parser.add_argument('--batch-size', type=int, default=200,
+                        help='每次写入数据库的图片数量')
+    parser.add_argument('--no-variants', action='store_true',
+                        help='不在本进程生成缩略图和 WebP，交给应用的后台线程')
+    parser.add_argument('--watch', action='store_true',
+                        help='持续监视目录（Ctrl+C 结束）')
+    parser.add_argument('--poll', action='store_true',
+                        help='监视时强制使用轮询（网络文件系统上系统通知不可用）')
+    parser.add_argument('--interval', type=float, default=10.0,
+                        help='轮询间隔（秒）')
+    parser.add_argument('--settle', type=float, default=3.0,
+                        help='文件多久不再变化后才导入（秒）')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='只计算哈希和去重，不复制文件也不写入数据库')
+    args = parser.parse_args()
+
+    # 创建日志目录
+    Path('logs').mkdir(exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('logs/ingest.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+    source = Path(args.source)
+    if not source.is_dir():
+        parser.error(f"目录不存在: {source}")
+    Path(args.upload_folder).mkdir(parents=True, exist_ok=True)
+
+    client = MongoClient(args.mongo_uri)
+    db = client[args.db_name]
+    ingester = FolderIngester(
+        db.images,
+        args.upload_folder,
+        change_counter=ChangeCounter(db.counters),
+        tag_stats=TagStats(db.tag_stats),
+        workers=args.workers,
+        batch_size=args.batch_size,
+        move=args.move,
+        tags=[tag.strip() for tag in args.tag if tag.strip()],
+        is_public=not args.private,
+        generate_variants=not args.no_variants,
+        dry_run=args.dry_run
+    )
+
+    try:
+        if args.watch:
+            if Observer is None and not args.poll:
+                logger.info("未安装 watchdog，使用轮询")
+            ingester.watch(source, interval=args.interval, settle=args.settle, polling=args.poll)
+        else:
+            files = ingester.scan(source)
+            logger.info(f"找到 {len(files)} 个图片文件")
+            ingester.ingest(files)
+    except KeyboardInterrupt:
+        logger.info("\n用户中断导入")
+    finally:
+        print("\n" + "=" * 60)
+        for line in ingester.report():
+            print(line)
+        if ingester.duplicates:
+            print(f"\n重复文件（已存在，未导入）{len(ingester.duplicates)} 个：")
+            for path, content_hash in ingester.duplicates[:50]:
+                print(f"  {path}  ({content_hash[:12]})")
+            if len(ingester.duplicates) > 50:
+                print(f"  ……共 {len(ingester.duplicates)} 个，完整列表见 logs/ingest.log")
+        print("=" * 60)
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
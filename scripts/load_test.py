@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+HTTP 压测脚本
+
+功能：
+1. 向独立的测试库写入 N 条合成图片记录，并生成对应的原图/缩略图/WebP 文件
+2. 用 gunicorn 启动应用（可配置 worker 数和线程数），连接测试库和测试上传目录
+3. 按画廊真实访问比例混合请求：列表分页、标签/年份筛选、年份列表、缩略图、点赞
+4. 报告整体 RPS、各接口延迟分位数，以及每个接口平均触发的 MongoDB 命令数
+
+需要本地 MongoDB；没有常驻实例时可用 --spawn-mongod 在临时目录启动一个。
+（gunicorn 多 worker 进程之间无法共享 mongomock 的内存数据，且 mongomock
+不支持全文索引、$facet 和命令监听，因此这里不使用 mongomock。）
+
+用法：
+    python scripts/load_test.py --images 5000 --workers 4 --concurrency 32 --duration 60
+    python scripts/load_test.py --spawn-mongod --mix thumbnail=50,public_images=50
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+import http.client
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from pymongo import MongoClient
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.phash import dhash, hash_fields
+from utils.placeholder import placeholder_features
+
+GUNICORN_CONFIG = Path(__file__).parent / 'load_test_gunicorn.py'
+ENDPOINT_HEADER = 'X-Loadtest-Endpoint'
+
+TAG_POOL = ['风景', '人像', '旅行', '家庭', '宠物', '美食', '街拍', '夜景', '建筑', '花卉',
+            '山', '海', '雪', '日落', '城市', '黑白', '胶片', '孩子', '聚会', '运动']
+YEARS = list(range(2015, 2025))
+
+# 默认流量比例：首页列表和缩略图占绝大多数
+DEFAULT_MIX = {
+    'public_images': 30,
+    'public_images_date': 8,
+    'public_images_tag': 6,
+    'year_view': 4,
+    'years': 10,
+    'thumbnail': 30,
+    'thumbnail_revalidate': 6,
+    'webp': 3,
+    'like': 3,
+}
+
+
+# ---------------------------------------------------------------------------
+# 数据准备
+# ---------------------------------------------------------------------------
+
+def _make_variants(index, directory):
+    """生成一组原图/缩略图/WebP 样本文件，返回 (文件名, 特征)"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(index)
+    width, height = rng.choice([(1600, 1067), (1067, 1600), (1600, 1200), (1600, 900)])
+    img = Image.new('RGB', (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(20):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        draw.ellipse([x0, y0, x0 + rng.randrange(400), y0 + rng.randrange(400)],
+                     fill=tuple(rng.randrange(256) for _ in range(3)))
+
+    name = f'sample_{index}'
+    img.save(directory / f'{name}.jpg', 'JPEG', quality=90)
+    img.save(directory / 'webp' / f'{name}.webp', 'WEBP', quality=85)
+    thumb = img.copy()
+    thumb.thumbnail((600, 600))
+    thumb.save(directory / 'thumbnails' / f'{name}.webp', 'WEBP', quality=95)
+
+    features = {**placeholder_features(thumb, (width, height)), **hash_fields(dhash(thumb))}
+    return name, features
+
+
+def _link(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def seed(db, upload_folder, count, public_ratio, samples=8, seed_value=1117):
+    """
+    清空测试库并写入合成图片记录
+
+    文件按样本硬链接，N 很大时也不会占用太多磁盘。
+
+    Returns:
+        (公开图片 ID 列表, 缩略图 URL 列表, WebP URL 列表)
+    """
+    upload_folder = Path(upload_folder)
+    for sub in ('thumbnails', 'webp'):
+        (upload_folder / sub).mkdir(parents=True, exist_ok=True)
+
+    sample_dir = upload_folder / '_samples'
+    for sub in ('thumbnails', 'webp'):
+        (sample_dir / sub).mkdir(parents=True, exist_ok=True)
+    sample_list = [_make_variants(i, sample_dir) for i in range(samples)]
+
+    db.images.drop()
+    db.tag_stats.drop()
+
+    rng = random.Random(seed_value)
+    docs = []
+    for i in range(count):
+        sample_name, features = sample_list[i % samples]
+        name = f'img_{i:07d}'
+        _link(sample_dir / f'{sample_name}.jpg', upload_folder / f'{name}.jpg')
+        _link(sample_dir / 'thumbnails' / f'{sample_name}.webp', upload_folder / 'thumbnails' / f'{name}.webp')
+        _link(sample_dir / 'webp' / f'{sample_name}.webp', upload_folder / 'webp' / f'{name}.webp')
+
+        photo_time = datetime(rng.choice(YEARS), 1, 1) + timedelta(seconds=rng.randrange(365 * 86400))
+        docs.append({
+            'filename': f'{name}.jpg',
+            'path': str(upload_folder / f'{name}.jpg'),
+            'thumbnail_path': str(upload_folder / 'thumbnails' / f'{name}.webp'),
+            'webp_path': str(upload_folder / 'webp' / f'{name}.webp'),
+            'has_thumbnail': True,
+            'has_webp': True,
+            'upload_time': photo_time,
+            'photo_time': photo_time,
+            'year': photo_time.year,
+            'month': photo_time.month,
+            'metadata': {'size': [features['width'], features['height']], 'format': 'JPEG'},
+            'is_public': rng.random() < public_ratio,
+            # 点赞数长尾分布
+            'likes': int(rng.paretovariate(1.5)) - 1,
+            'tags': rng.sample(TAG_POOL, rng.randint(0, 3)),
+            'processing_status': 'completed',
+            **features
+        })
+        if len(docs) >= 1000:
+            db.images.insert_many(docs, ordered=False)
+            docs = []
+    if docs:
+        db.images.insert_many(docs, ordered=False)
+
+    public_ids = [str(doc['_id']) for doc in db.images.find({'is_public': True}, {'_id': 1})]
+    names = [f'img_{i:07d}' for i in range(count)]
+    thumbnails = [f'/uploads/thumbnails/{name}.webp' for name in names]
+    webps = [f'/uploads/webp/{name}.webp' for name in names]
+    return public_ids, thumbnails, webps
+
+
+# ---------------------------------------------------------------------------
+# 流量模型
+# ---------------------------------------------------------------------------
+
+class TrafficMix:
+    """按权重随机生成请求 (接口标签, 方法, 路径, 请求头)"""
+
+    def __init__(self, weights, public_ids, thumbnails, webps, layout_width=1280):
+        self.labels = [label for label, weight in weights.items() if weight > 0]
+        self.weights = [weights[label] for label in self.labels]
+        self.public_ids = public_ids
+        self.thumbnails = thumbnails
+        self.webps = webps
+        self.layout_width = layout_width
+
+    @staticmethod
+    def _page(rng):
+        # 大多数访问停留在第一页
+        return 1 if rng.random() < 0.6 else rng.randint(2, 6)
+
+    def next(self, rng, etags):
+        label = rng.choices(self.labels, self.weights)[0]
+        headers = {}
+        if label == 'public_images':
+            path = f'/api/public_images?page={self._page(rng)}&sort=likes&layout_width={self.layout_width}'
+        elif label == 'public_images_date':
+            path = f'/api/public_images?page={self._page(rng)}&sort=date&layout_width={self.layout_width}'
+        elif label == 'public_images_tag':
+            path = f'/api/public_images?page=1&sort=likes&tag={rng.choice(TAG_POOL)}'
+        elif label == 'year_view':
+            path = f'/api/public_images?year={rng.choice(YEARS)}'
+        elif label == 'years':
+            path = '/api/years'
+        elif label == 'thumbnail':
+            path = rng.choice(self.thumbnails)
+        elif label == 'thumbnail_revalidate':
+            # 浏览器缓存过期后带 If-None-Match 重新验证
+            if etags:
+                path, etag = rng.choice(list(etags.items()))
+                headers['If-None-Match'] = etag
+            else:
+                path = rng.choice(self.thumbnails)
+        elif label == 'webp':
+            path = rng.choice(self.webps)
+        elif label == 'like':
+            return label, 'POST', f'/api/like/{rng.choice(self.public_ids)}', headers
+        else:
+            raise ValueError(f'未知接口: {label}')
+        return label, 'GET', path, headers
+
+
+def parse_mix(text):
+    weights = dict(DEFAULT_MIX)
+    if text:
+        weights = {label: 0 for label in DEFAULT_MIX}
+        for item in text.split(','):
+            label, _, weight = item.partition('=')
+            if label not in DEFAULT_MIX:
+                raise ValueError(f'未知接口: {label}，可选: {", ".join(DEFAULT_MIX)}')
+            weights[label] = float(weight or 1)
+    return weights
+
+
+# ---------------------------------------------------------------------------
+# 压测执行
+# ---------------------------------------------------------------------------
+
+def _quote_path(path):
+    from urllib.parse import quote
+    return quote(path, safe='/?&=%')
+
+
+def run_load(host, port, mix, concurrency, duration, warmup, seed_value=1117):
+    """
+    多线程驱动请求，预热阶段的请求不计入结果
+
+    Returns:
+        [(接口标签, 状态码, 延迟秒), ...], 实际计时时长
+    """
+    samples = []
+    samples_lock = threading.Lock()
+    start = time.monotonic()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def worker(index):
+        rng = random.Random(seed_value + index)
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        etags = {}
+        local = []
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            label, method, path, headers = mix.next(rng, etags)
+            headers[ENDPOINT_HEADER] = label
+            begin = time.perf_counter()
+            try:
+                conn.request(method, _quote_path(path), headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+                etag = response.getheader('ETag')
+                if etag and label == 'thumbnail':
+                    etags[path] = etag
+            except (OSError, http.client.HTTPException):
+                status = 0
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+            elapsed = time.perf_counter() - begin
+            if now >= measure_from:
+                local.append((label, status, elapsed))
+        conn.close()
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, duration
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples, elapsed, mongo_stats):
+    """汇总各接口的吞吐、延迟分位数和 Mongo 命令数"""
+    by_label = {}
+    for label, status, latency in samples:
+        by_label.setdefault(label, []).append((status, latency))
+
+    endpoints = {}
+    for label, items in sorted(by_label.items()):
+        latencies = [latency for _, latency in items]
+        statuses = {}
+        for status, _ in items:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        mongo = mongo_stats.get(label, {})
+        served = mongo.get('requests') or 0
+        endpoints[label] = {
+            'requests': len(items),
+            'rps': len(items) / elapsed,
+            'errors': sum(1 for status, _ in items if status == 0 or status >= 500),
+            'status': statuses,
+            'p50_ms': _percentile(latencies, 50) * 1000,
+            'p90_ms': _percentile(latencies, 90) * 1000,
+            'p99_ms': _percentile(latencies, 99) * 1000,
+            'max_ms': max(latencies) * 1000,
+            'mean_ms': statistics.mean(latencies) * 1000,
+            'mongo_queries_per_request': mongo.get('commands', 0) / served if served else 0,
+            'mongo_ms_per_request': mongo.get('duration_us', 0) / 1000 / served if served else 0,
+            'mongo_commands': mongo.get('by_command', {}),
+        }
+
+    latencies = [latency for _, _, latency in samples]
+    total = {
+        'requests': len(samples),
+        'rps': len(samples) / elapsed,
+        'errors': sum(e['errors'] for e in endpoints.values()),
+        'p50_ms': _percentile(latencies, 50) * 1000 if latencies else 0,
+        'p90_ms': _percentile(latencies, 90) * 1000 if latencies else 0,
+        'p99_ms': _percentile(latencies, 99) * 1000 if latencies else 0,
+    }
+    return total, endpoints
+
+
+def merge_worker_stats(stats_dir):
+    merged = {}
+    for path in Path(stats_dir).glob('worker_*.json'):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        for label, stats in data.items():
+            target = merged.setdefault(label, {'requests': 0, 'commands': 0, 'duration_us': 0, 'by_command': {}})
+            target['requests'] += stats['requests']
+            target['commands'] += stats['commands']
+            target['duration_us'] += stats['duration_us']
+            for name, count in stats['by_command'].items():
+                target['by_command'][name] = target['by_command'].get(name, 0) + count
+    return merged
+
+
+def print_report(total, endpoints):
+    print(f"{'接口':<22}{'请求数':>8}{'RPS':>9}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}{'错误':>6}{'查询/请求':>11}{'Mongo ms':>10}")
+    print('-' * 96)
+    for label, e in endpoints.items():
+        print(f"{label:<22}{e['requests']:>8}{e['rps']:>9.1f}{e['p50_ms']:>10.1f}{e['p90_ms']:>10.1f}"
+              f"{e['p99_ms']:>10.1f}{e['errors']:>6}{e['mongo_queries_per_request']:>11.2f}{e['mongo_ms_per_request']:>10.2f}")
+    print('-' * 96)
+    print(f"{'合计':<22}{total['requests']:>8}{total['rps']:>9.1f}{total['p50_ms']:>10.1f}"
+          f"{total['p90_ms']:>10.1f}{total['p99_ms']:>10.1f}{total['errors']:>6}")
+
+
+# ---------------------------------------------------------------------------
+# 进程管理
+# ---------------------------------------------------------------------------
+
+def wait_for(check, timeout, description):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f'等待{description}超时')
+
+
+def spawn_mongod(work_dir, port):
+    """在临时目录启动一个独立的 mongod"""
+    mongod = shutil.which('mongod')
+    if not mongod:
+        raise RuntimeError('未找到 mongod，请安装 MongoDB 或通过 --mongo-uri 指定已有实例')
+    db_path = Path(work_dir) / 'mongo'
+    db_path.mkdir()
+    process = subprocess.Popen(
+        [mongod, '--dbpath', str(db_path), '--port', str(port), '--bind_ip', '127.0.0.1', '--quiet'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    uri = f'mongodb://127.0.0.1:{port}/'
+    wait_for(lambda: MongoClient(uri, serverSelectionTimeoutMS=500).admin.command('ping'), 30, ' mongod 启动')
+    return process, uri
+
+
+def start_gunicorn(args, mongo_uri, upload_folder, stats_dir):
+    env = dict(os.environ)
+    env.update({
+        'MONGO_URI': mongo_uri.rstrip('/') + '/' + args.db_name,
+        'UPLOAD_FOLDER': str(upload_folder),
+        'LOADTEST_STATS_DIR': str(stats_dir),
+    })
+    command = [
+        sys.executable, '-m', 'gunicorn',
+        '-c', str(GUNICORN_CONFIG),
+        '--workers', str(args.workers),
+        '--bind', f'127.0.0.1:{args.port}',
+        '--log-level', 'warning',
+    ]
+    if args.threads > 1:
+        command += ['--worker-class', 'gthread', '--threads', str(args.threads)]
+    command.append('app:app')
+    process = subprocess.Popen(command, cwd=str(project_root), env=env)
+
+    def ready():
+        conn = http.client.HTTPConnection('127.0.0.1', args.port, timeout=2)
+        conn.request('GET', '/api/years')
+        return conn.getresponse().status == 200
+    wait_for(ready, 60, ' gunicorn 启动')
+    return process
+
+
+def stop_process(process, timeout=30):
+    if process and process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='画廊接口 HTTP 压测')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/',
+                        help='MongoDB 连接字符串（不含数据库名）')
+    parser.add_argument('--db-name', default='pic_share_loadtest',
+                        help='测试数据库名称（会被清空）')
+    parser.add_argument('--spawn-mongod', action='store_true',
+                        help='在临时目录启动独立的 mongod')
+    parser.add_argument('--mongod-port', type=int, default=27099)
+    parser.add_argument('--images', type=int, default=2000,
+                        help='合成图片记录数')
+    parser.add_argument('--public-ratio', type=float, default=0.8,
+                        help='公开图片比例')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='gunicorn worker 数')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='每个 worker 的线程数，大于 1 时使用 gthread')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='并发客户端数')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='计时时长（秒）')
+    parser.add_argument('--warmup', type=float, default=5,
+                        help='预热时长（秒），不计入结果')
+    parser.add_argument('--mix', default='',
+                        help=f'流量比例，如 thumbnail=50,public_images=50；可选: {",".join(DEFAULT_MIX)}')
+    parser.add_argument('--output-dir', default='benchmarks/results',
+                        help='JSON 结果保存目录')
+    args = parser.parse_args()
+
+    try:
+        weights = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    work_dir = Path(tempfile.mkdtemp(prefix='pic_loadtest_'))
+    upload_folder = work_dir / 'uploads'
+    stats_dir = work_dir / 'stats'
+    stats_dir.mkdir()
+    mongod = gunicorn = None
+
+    try:
+        mongo_uri = args.mongo_uri
+        if args.spawn_mongod:
+            mongod, mongo_uri = spawn_mongod(work_dir, args.mongod_port)
+
+        print(f"写入 {args.images} 条合成图片记录到 {args.db_name} ...")
+        client = MongoClient(mongo_uri)
+        try:
+            public_ids, thumbnails, webps = seed(client[args.db_name], upload_folder,
+                                                 args.images, args.public_ratio)
+        finally:
+            client.close()
+
+        print(f"启动 gunicorn（{args.workers} worker × {args.threads} 线程）...")
+        gunicorn = start_gunicorn(args, mongo_uri, upload_folder, stats_dir)
+
+        mix = TrafficMix(weights, public_ids, thumbnails, webps)
+        print(f"压测中：并发 {args.concurrency}，预热 {args.warmup}s，计时 {args.duration}s ...")
+        samples, elapsed = run_load('127.0.0.1', args.port, mix, args.concurrency,
+                                    args.duration, args.warmup)
+
+        # worker 退出时才写出 Mongo 统计
+        stop_process(gunicorn)
+        gunicorn = None
+        total, endpoints = summarize(samples, elapsed, merge_worker_stats(stats_dir))
+        print()
+        print_report(total, endpoints)
+
+        output_dir = Path(args.output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output_path = output_dir / f"loadtest_{datetime.now():%Y%m%d_%H%M%S}.json"
+        config = {k: v for k, v in vars(args).items() if k != 'output_dir'}
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'mix': weights, 'total': total, 'endpoints': endpoints},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {output_path}")
+    finally:
+        stop_process(gunicorn)
+        stop_process(mongod)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
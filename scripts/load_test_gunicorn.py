@@ -0,0 +1,83 @@
+"""
+压测用 gunicorn 配置
+
+由 scripts/load_test.py 通过 `gunicorn -c scripts/load_test_gunicorn.py app:app` 加载，
+不修改应用代码即可统计每个接口触发的 MongoDB 命令：
+
+1. post_fork：在 worker 创建 MongoClient 之前注册 pymongo CommandListener
+2. pre_request / post_request：按请求头 X-Loadtest-Endpoint 标记当前线程正在处理的接口
+3. worker_exit：将本 worker 的统计写入 LOADTEST_STATS_DIR/worker_<pid>.json
+
+后台线程（回收器等）发出的命令不带接口标记，不计入统计。
+"""
+
+import os
+import json
+import threading
+
+from pymongo import monitoring
+
+# 必须在 worker 中导入应用，否则 MongoClient 在注册监听器之前就已创建
+preload_app = False
+
+STATS_DIR = os.environ.get('LOADTEST_STATS_DIR')
+ENDPOINT_HEADER = 'X-LOADTEST-ENDPOINT'
+
+_current = threading.local()
+_lock = threading.Lock()
+_stats = {}
+
+
+def _endpoint_stats(label):
+    stats = _stats.get(label)
+    if stats is None:
+        stats = _stats[label] = {'requests': 0, 'commands': 0, 'duration_us': 0, 'by_command': {}}
+    return stats
+
+
+class EndpointCommandListener(monitoring.CommandListener):
+    """按当前请求的接口标记累计 Mongo 命令数和耗时"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    def _record(self, event):
+        label = getattr(_current, 'label', None)
+        if not label:
+            return
+        with _lock:
+            stats = _endpoint_stats(label)
+            stats['commands'] += 1
+            stats['duration_us'] += event.duration_micros
+            stats['by_command'][event.command_name] = stats['by_command'].get(event.command_name, 0) + 1
+
+
+def post_fork(server, worker):
+    monitoring.register(EndpointCommandListener())
+
+
+def pre_request(worker, req):
+    label = next((value for name, value in req.headers if name == ENDPOINT_HEADER), None)
+    _current.label = label
+    if label:
+        with _lock:
+            _endpoint_stats(label)['requests'] += 1
+
+
+def post_request(worker, req, environ, resp):
+    _current.label = None
+
+
+def worker_exit(server, worker):
+    if not STATS_DIR:
+        return
+    with _lock:
+        data = dict(_stats)
+    with open(os.path.join(STATS_DIR, f'worker_{os.getpid()}.json'), 'w', encoding='utf-8') as f:
+        json.dump(data, f)
@@ -4,11 +4,18 @@
 
 功能：
 1. 扫描数据库中所有图片记录
-2. 为每张图片生成缩略图和 WebP 格式
-3. 更新数据库记录
+2. 只重新生成规格版本已变化（或缺失）的缩略图和 WebP，规格见 utils/variant_specs.py
+3. 多线程并行处理，新变体写入新文件，数据库切换到新路径后再删除旧文件
 4. 显示处理进度和统计信息
 5. 支持断点续传
 
+首次运行（升级到带版本的变体之前生成的库）：
+    旧记录没有 variant_versions，会被视为过期而全部重新生成。生成参数没有变化时，
+    先运行 --stamp-existing（可加 --dry-run 查看数量）将已有变体标记为当前规格：
+
+    python scripts/migrate_existing_images.py --stamp-existing --dry-run
+    python scripts/migrate_existing_images.py --stamp-existing
+
 作者: chf1117
 版本: v1.2
 日期: 2025-11-11
@@ -18,16 +25,24 @@ import os
 import sys
 import argparse
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 from tqdm import tqdm
 
 # 添加项目根目录到 Python 路径
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+from utils.change_counter import ChangeCounter, scopes_for
+from utils.file_utils import file_sha256, get_variant_paths
 from utils.image_processor import ImageProcessor
+from utils.phash import from_hex, hash_fields
+from utils.variant_specs import VARIANT_SPECS, stale_query, stale_variants
 
 # 配置日志
 logging.basicConfig(
@@ -44,7 +59,8 @@ logger = logging.getLogger(__name__)
 class ImageMigrator:
     """图片迁移处理器"""
     
-    def __init__(self, mongo_uri, db_name, upload_folder, dry_run=False, force=False):
+    def __init__(self, mongo_uri, db_name, upload_folder, dry_run=False, force=False, workers=None,
+                 grace=300):
         """
         初始化迁移处理器
         
@@ -53,12 +69,19 @@ class ImageMigrator:
             db_name: 数据库名称
             upload_folder: 上传文件夹路径
             dry_run: 是否为预览模式
+            force: 重新生成所有变体（忽略规格版本）
+            workers: 并行处理的线程数，默认为 CPU 核数
+            grace: 递增变更计数后等待多少秒再删除被替换的旧变体，
+                   已打开的页面和画廊缓存（GALLERY_CACHE_TTL）中的旧地址在此期间仍可访问
         """
         self.mongo_uri = mongo_uri
         self.db_name = db_name
         self.upload_folder = Path(upload_folder)
         self.dry_run = dry_run
         self.force = force
+        self.workers = workers or os.cpu_count() or 2
+        self.grace = grace
+        self._stats_lock = threading.Lock()
         
         # 连接数据库
         self.client = MongoClient(mongo_uri)
@@ -74,17 +97,45 @@ class ImageMigrator:
             'processed': 0,
             'skipped': 0,
             'failed': 0,
-            'thumbnail_generated': 0,
-            'webp_generated': 0
+            **{f'{name}_generated': 0 for name in VARIANT_SPECS},
+            'old_files_removed': 0
         }
     
-    def get_images_to_process(self, skip_existing=True, force=None):
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+    
+    def stamp_existing(self):
+        """
+        将已有变体（没有版本记录）标记为当前规格版本，不重新生成
+
+        用于升级到带版本的变体之前生成参数没有变化的库，避免全部重新生成。
+        """
+        stamped = 0
+        for name, spec in VARIANT_SPECS.items():
+            query = {
+                spec.flag: True,
+                spec.field: {'$nin': [None, '']},
+                f'variant_versions.{name}': {'$exists': False},
+                'deleted': {'$ne': True}
+            }
+            if self.dry_run:
+                count = self.images_collection.count_documents(query)
+                logger.info(f"[DRY RUN] 将标记 {count} 个{name}为当前规格 {spec.version}")
+                continue
+            result = self.images_collection.update_many(query, {'$set': {f'variant_versions.{name}': spec.version}})
+            logger.info(f"已将 {result.modified_count} 个{name}标记为当前规格 {spec.version}")
+            stamped += result.modified_count
+        return stamped
+    
+    def get_images_to_process(self, skip_existing=True, force=None, batch_size=100):
         """
         获取需要处理的图片列表
         
         Args:
             skip_existing: 跳过已处理的图片
             force: 强制重新处理所有图片
+            batch_size: 每次从数据库读取的记录数
         
         Returns:
             图片记录列表
@@ -96,20 +147,25 @@ class ImageMigrator:
             force = self.force
 
         if skip_existing and not force:
-            # 只处理没有缩略图或 WebP 的图片
+            # 只处理变体缺失或规格版本已变化、以及缺少特征和内容哈希的图片
             query = {
-                '$or': [
-                    {'has_thumbnail': {'$ne': True}},
-                    {'has_webp': {'$ne': True}},
-                    {'thumbnail_path': {'$exists': False}},
-                    {'webp_path': {'$exists': False}}
+                '$or': stale_query()['$or'] + [
+                    {'dhash': {'$exists': False}},
+                    {'blurhash': {'$exists': False}},
+                    {'content_hash': {'$exists': False}}
                 ]
             }
         
-        images = list(self.images_collection.find(query))
+        # 跳过已软删除、等待回收的图片
+        query['deleted'] = {'$ne': True}
+        
+        images = list(self.images_collection.find(query).batch_size(batch_size))
         self.stats['total'] = len(images)
         
         logger.info(f"找到 {len(images)} 张图片需要处理")
+        for name, spec in VARIANT_SPECS.items():
+            count = len(images) if force else sum(1 for image in images if name in stale_variants(image))
+            logger.info(f"  {name}: {count} 张需要重新生成（当前规格 {spec.version}）")
         return images
     
     def process_image(self, image_record):
@@ -136,34 +192,35 @@ class ImageMigrator:
         
         result = {
             'success': False,
-            'thumbnail_path': None,
-            'webp_path': None,
-            'thumbnail_generated': False,
-            'webp_generated': False
+            **{spec.field: None for spec in VARIANT_SPECS.values()},
+            'versions': {},
+            'features': {},
+            'content_hash': None
         }
         
         try:
-            # 检查是否已有缩略图
-            if self.force or not image_record.get('has_thumbnail'):
-                thumbnail_path = self.processor.generate_thumbnail(original_path)
-                if thumbnail_path:
-                    result['thumbnail_path'] = thumbnail_path
-                    result['thumbnail_generated'] = True
-                    self.stats['thumbnail_generated'] += 1
-            else:
-                result['thumbnail_path'] = image_record.get('thumbnail_path')
-                logger.info(f"跳过已有缩略图: {original_path}")
+            # 只重新生成规格版本变化的变体，其余沿用已有文件
+            stale = list(VARIANT_SPECS) if self.force else stale_variants(image_record)
+            processed = self.processor.process_image(original_path, variants=stale)
+            result['versions'] = processed['versions']
+            result['features'] = processed['features']
+            
+            for name, spec in VARIANT_SPECS.items():
+                if name in processed['versions']:
+                    result[spec.field] = processed[name]
+                    self._count(f'{name}_generated')
+                elif name not in stale:
+                    result[spec.field] = image_record.get(spec.field)
+            
+            # 旧记录缺少感知哈希或占位符、且本次没有重新计算时，直接从已有缩略图计算
+            if not result['features'] and (not image_record.get('dhash') or not image_record.get('blurhash')):
+                result['features'] = self.processor.extract_features(
+                    image_record.get('thumbnail_path') or original_path, original_path
+                )
             
-            # 检查是否已有 WebP
-            if self.force or not image_record.get('has_webp'):
-                webp_path = self.processor.generate_webp(original_path)
-                if webp_path:
-                    result['webp_path'] = webp_path
-                    result['webp_generated'] = True
-                    self.stats['webp_generated'] += 1
-            else:
-                result['webp_path'] = image_record.get('webp_path')
-                logger.info(f"跳过已有 WebP: {original_path}")
+            # 补算原图内容哈希，用于上传前去重
+            if self.force or not image_record.get('content_hash'):
+                result['content_hash'] = file_sha256(original_path)
             
             result['success'] = True
             
@@ -173,52 +230,59 @@ class ImageMigrator:
         
         return result
     
-    def update_database(self, image_id, process_result):
+    def update_database(self, image_id, process_result, image_record=None):
         """
         更新数据库记录
         
         Args:
             image_id: 图片 ID
             process_result: 处理结果
+            image_record: 处理前的图片记录，用于找到被替换的旧文件
+        
+        Returns:
+            被替换的旧变体文件列表；此时页面缓存中可能仍引用这些文件，
+            由 run() 在递增变更计数并等待 grace 秒后统一删除
         """
         if self.dry_run:
             logger.info(f"[DRY RUN] 将更新图片 {image_id}")
-            return
+            return []
         
         update_data = {
             'processing_status': 'completed' if process_result['success'] else 'failed'
         }
         
-        if process_result.get('thumbnail_path'):
-            update_data['thumbnail_path'] = process_result['thumbnail_path']
-            update_data['has_thumbnail'] = True
+        for spec in VARIANT_SPECS.values():
+            if process_result.get(spec.field):
+                update_data[spec.field] = process_result[spec.field]
+                update_data[spec.flag] = True
+        
+        for name, version in process_result.get('versions', {}).items():
+            update_data[f'variant_versions.{name}'] = version
         
-        if process_result.get('webp_path'):
-            update_data['webp_path'] = process_result['webp_path']
-            update_data['has_webp'] = True
+        features = process_result.get('features') or {}
+        if features:
+            update_data.update(features)
+        if features.get('dhash'):
+            update_data.update(hash_fields(from_hex(features['dhash'])))
         
         # 获取文件大小
         if process_result['success']:
             file_sizes = {}
             
             # 原图大小
-            image_record = self.images_collection.find_one({'_id': image_id})
+            if image_record is None:
+                image_record = self.images_collection.find_one({'_id': image_id})
             if image_record and image_record.get('path'):
                 original_path = Path(image_record['path'])
                 if original_path.exists():
                     file_sizes['original'] = original_path.stat().st_size
             
-            # 缩略图大小
-            if process_result.get('thumbnail_path'):
-                thumbnail_path = Path(process_result['thumbnail_path'])
-                if thumbnail_path.exists():
-                    file_sizes['thumbnail'] = thumbnail_path.stat().st_size
-            
-            # WebP 大小
-            if process_result.get('webp_path'):
-                webp_path = Path(process_result['webp_path'])
-                if webp_path.exists():
-                    file_sizes['webp'] = webp_path.stat().st_size
+            # 各变体大小
+            for name, spec in VARIANT_SPECS.items():
+                if process_result.get(spec.field):
+                    variant_path = Path(process_result[spec.field])
+                    if variant_path.exists():
+                        file_sizes[name] = variant_path.stat().st_size
             
             if file_sizes:
                 update_data['file_sizes'] = file_sizes
@@ -231,13 +295,47 @@ class ImageMigrator:
             logger.debug(f"数据库更新成功: {image_id}")
         except Exception as e:
             logger.error(f"数据库更新失败 {image_id}: {str(e)}")
+            return []
+        
+        # 数据库已指向新文件，记录被替换的旧变体（文件名包含规格版本，新旧文件不会重名）
+        replaced = []
+        if image_record:
+            old_paths = get_variant_paths(image_record, str(self.upload_folder))
+            for name in process_result.get('versions', {}):
+                old_path = old_paths.get(name)
+                new_path = process_result.get(VARIANT_SPECS[name].field)
+                if old_path and new_path and old_path.resolve() != Path(new_path).resolve():
+                    replaced.append(old_path)
+        
+        # 内容哈希有唯一索引，单独写入：库中已有相同文件时只记录，不影响其它字段
+        if process_result.get('content_hash'):
+            try:
+                self.images_collection.update_one(
+                    {'_id': image_id},
+                    {'$set': {'content_hash': process_result['content_hash']}}
+                )
+            except DuplicateKeyError:
+                logger.warning(f"重复文件，跳过内容哈希: {image_id} ({process_result['content_hash'][:12]})")
+        
+        return replaced
     
-    def run(self, batch_size=10, skip_existing=True, force=None):
+    def remove_replaced(self, paths):
+        """删除被替换的旧变体文件"""
+        for path in paths:
+            try:
+                path.unlink()
+                self.stats['old_files_removed'] += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"删除旧变体失败 {path}: {str(e)}")
+    
+    def run(self, batch_size=100, skip_existing=True, force=None):
         """
         运行迁移任务
         
         Args:
-            batch_size: 批处理大小
+            batch_size: 每次从数据库读取的记录数
             skip_existing: 跳过已处理的图片
             force: 强制重新处理
         """
@@ -253,24 +351,41 @@ class ImageMigrator:
             force = self.force
 
         # 获取需要处理的图片
-        images = self.get_images_to_process(skip_existing, force)
+        images = self.get_images_to_process(skip_existing, force, batch_size)
         
         if not images:
             logger.info("没有需要处理的图片")
             return
         
-        # 使用进度条处理
-        with tqdm(total=len(images), desc="处理进度") as pbar:
-            for i, image in enumerate(images):
-                try:
-                    # 处理图片
-                    result = self.process_image(image)
-                    
-                    if result['success']:
-                        # 更新数据库
-                        self.update_database(image['_id'], result)
-                        self.stats['processed'] += 1
-                    else:
+        if self.dry_run:
+            logger.info("[DRY RUN] 不生成变体")
+            return
+        
+        def handle(image):
+            result = self.process_image(image)
+            replaced = None
+            if result['success']:
+                replaced = self.update_database(image['_id'], result, image)
+            return result['success'], replaced
+        
+        updated = []
+        replaced = []
+        try:
+            # 多线程并行处理，使用进度条显示
+            with ThreadPoolExecutor(max_workers=self.workers) as executor, \
+                    tqdm(total=len(images), desc="处理进度") as pbar:
+                futures = {executor.submit(handle, image): image for image in images}
+                for future in as_completed(futures):
+                    try:
+                        success, old_files = future.result()
+                        if success:
+                            self.stats['processed'] += 1
+                            updated.append(futures[future])
+                            replaced.extend(old_files)
+                        else:
+                            self.stats['failed'] += 1
+                    except Exception as e:
+                        logger.error(f"处理图片时发生错误: {str(e)}")
                         self.stats['failed'] += 1
                     
                     # 更新进度条
@@ -279,11 +394,16 @@ class ImageMigrator:
                         '成功': self.stats['processed'],
                         '失败': self.stats['failed']
                     })
-                    
-                except Exception as e:
-                    logger.error(f"处理图片时发生错误: {str(e)}")
-                    self.stats['failed'] += 1
-                    pbar.update(1)
+        finally:
+            # 缩略图和 WebP 变化后递增变更计数，使应用中的列表缓存和 ETag 失效（中断时也要递增）
+            if updated:
+                ChangeCounter(self.db.counters).bump(scopes_for(updated))
+        
+        # 旧变体在变更计数递增之前一直被缓存的页面引用，等缓存过期后再删除
+        if replaced:
+            logger.info(f"{self.grace:.0f} 秒后删除 {len(replaced)} 个被替换的旧变体")
+            time.sleep(self.grace)
+            self.remove_replaced(replaced)
         
         # 打印统计信息
         self.print_stats()
@@ -297,6 +417,7 @@ class ImageMigrator:
         logger.info(f"失败: {self.stats['failed']} 张")
         logger.info(f"生成缩略图: {self.stats['thumbnail_generated']} 个")
         logger.info(f"生成 WebP: {self.stats['webp_generated']} 个")
+        logger.info(f"删除旧变体: {self.stats['old_files_removed']} 个")
         logger.info("=" * 60)
         
         # 计算存储空间
@@ -318,19 +439,29 @@ class ImageMigrator:
 
 def main():
     """主函数"""
-    parser = argparse.ArgumentParser(description='批量处理现有图片')
+    parser = argparse.ArgumentParser(
+        description='批量处理现有图片',
+        epilog='首次运行：没有 variant_versions 的旧记录会被全部重新生成，'
+               '生成参数未变化时先运行 --stamp-existing 标记已有变体'
+    )
     parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/',
                         help='MongoDB 连接字符串')
     parser.add_argument('--db-name', default='your_database_name',
                         help='数据库名称')
     parser.add_argument('--upload-folder', default='uploads',
                         help='上传文件夹路径')
-    parser.add_argument('--batch-size', type=int, default=10,
-                        help='批处理大小')
+    parser.add_argument('--batch-size', type=int, default=100,
+                        help='每次从数据库读取的记录数')
     parser.add_argument('--skip-existing', action='store_true', default=True,
                         help='跳过已处理的图片')
     parser.add_argument('--force', action='store_true',
                         help='强制重新处理所有图片')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='并行处理的线程数（默认 CPU 核数）')
+    parser.add_argument('--grace', type=float, default=float(os.getenv('GALLERY_CACHE_TTL', '300')),
+                        help='递增变更计数后等待多少秒再删除被替换的旧变体（默认 GALLERY_CACHE_TTL 或 300）')
+    parser.add_argument('--stamp-existing', action='store_true',
+                        help='将没有版本记录的已有变体标记为当前规格后再处理（首次运行时使用，避免全部重新生成）')
     parser.add_argument('--dry-run', action='store_true',
                         help='预览模式，不实际处理')
     
@@ -345,10 +476,14 @@ def main():
         db_name=args.db_name,
         upload_folder=args.upload_folder,
         dry_run=args.dry_run,
-        force=args.force
+        force=args.force,
+        workers=args.workers,
+        grace=args.grace
     )
     
     try:
+        if args.stamp_existing:
+            migrator.stamp_existing()
         # 运行迁移
         migrator.run(
             batch_size=args.batch_size,
@@ -356,7 +491,7 @@ def main():
             force=args.force
         )
     except KeyboardInterrupt:
-        logger.info("\n用户中断处理")
+        logger.info("\n用户中断处理（未删除的旧变体可用 clean_uploads.py 清理）")
     except Exception as e:
         logger.error(f"处理过程中发生错误: {str(e)}")
     finally:
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+独立的变体生成进程
+
+功能：
+1. 轮询 processing_status='pending' 的图片，并行生成缩略图、WebP 和缩略图特征
+2. 与应用进程中的后台线程使用同样的认领标记，可以同时运行多个，不会重复处理
+
+应用以 VARIANT_WORKER=0 启动时，网页进程不再编码图片，由本进程单独占用 CPU。
+
+示例：
+    python scripts/variant_worker.py --db-name pic_share --upload-folder /var/www/pic/uploads --workers 4
+"""
+
+import sys
+import argparse
+import logging
+from pathlib import Path
+from pymongo import MongoClient
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.change_counter import ChangeCounter
+from utils.variant_worker import VariantWorker
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='后台生成待处理图片的缩略图和 WebP')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/',
+                        help='MongoDB 连接字符串')
+    parser.add_argument('--db-name', default='your_database_name',
+                        help='数据库名称')
+    parser.add_argument('--upload-folder', default='uploads',
+                        help='上传文件夹路径')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='并行线程数（默认 CPU 核数）')
+    parser.add_argument('--batch-size', type=int, default=50,
+                        help='每批认领的图片数量')
+    parser.add_argument('--interval', type=float, default=5.0,
+                        help='没有待处理图片时的轮询间隔（秒）')
+    args = parser.parse_args()
+
+    # 创建日志目录
+    Path('logs').mkdir(exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('logs/variant_worker.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+    client = MongoClient(args.mongo_uri)
+    db = client[args.db_name]
+    worker = VariantWorker(
+        db.images,
+        args.upload_folder,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        interval=args.interval,
+        change_counter=ChangeCounter(db.counters)
+    )
+
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        logger.info("\n用户中断处理")
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,439 @@
+// 全局变量声明
+let currentPage = 1;
+let totalImages = 0;
+let selectedImages = new Set();
+let imageGrid = null;
+let paginationContainer = null;
+let batchToolbar = null;
+let loadingOverlay = null;
+let searchInput = null;
+let selectAllBtn = null;
+let unselectAllBtn = null;
+
+function init() {
+    // 初始化DOM元素引用
+    imageGrid = document.getElementById('imageGrid');
+    paginationContainer = document.getElementById('pagination');
+    batchToolbar = document.getElementById('batchToolbar');
+    loadingOverlay = document.getElementById('loadingOverlay');
+    searchInput = document.getElementById('searchInput');
+    selectAllBtn = document.getElementById('selectAllBtn');
+    unselectAllBtn = document.getElementById('unselectAllBtn');
+
+    setupEventListeners();
+    loadImages();
+
+    if (searchInput) {
+        searchInput.addEventListener('input', debounce(() => {
+            currentPage = 1;
+            loadImages();
+        }, 500));
+    }
+}
+
+async function loadImages() {
+    try {
+        showLoading();
+        const searchQuery = searchInput ? searchInput.value : '';
+        const response = await fetch(`/api/images?page=${currentPage}&search=${encodeURIComponent(searchQuery)}`);
+        const data = await response.json();
+
+        if (data.success) {
+            totalImages = data.total;
+            renderImages(data.images);
+            renderPagination(data.total);
+            updateBatchToolbar();
+        } else {
+            showMessage(data.message || '加载图片失败', 'danger');
+        }
+    } catch (error) {
+        console.error('Error loading images:', error);
+        showMessage('加载图片时发生错误', 'danger');
+    } finally {
+        hideLoading();
+    }
+}
+
+function renderImages(images) {
+    if (!imageGrid) return;
+
+    imageGrid.innerHTML = images.map(image => `
+        <div class="image-card ${selectedImages.has(image._id) ? 'selected' : ''}" 
+             data-image-id="${image._id}" 
+             onclick="toggleSelectImage('${image._id}')">
+            <div class="privacy-badge">
+                <i class="fas fa-${image.is_public ? 'globe' : 'lock'}"></i>
+                ${image.is_public ? '公开' : '私密'}
+            </div>
+            <img src="/uploads/${image.filename}" 
+                 alt="${image.filename}"
+                 onclick="previewImage('/uploads/${image.filename}'); event.stopPropagation();">
+            <div class="image-info">
+                <h5 title="${image.filename}">${image.filename}</h5>
+                <p>上传时间：${formatDate(image.upload_time)}</p>
+                <div class="tags">
+                    ${(image.tags || []).map(tag => 
+                        `<span class="tag-badge">${tag}</span>`
+                    ).join('')}
+                </div>
+            </div>
+        </div>
+    `).join('');
+}
+
+function renderPagination(total) {
+    if (!paginationContainer) return;
+
+    const pageSize = 12;
+    const totalPages = Math.ceil(total / pageSize);
+
+    if (totalPages <= 1) {
+        paginationContainer.innerHTML = '';
+        return;
+    }
+
+    let html = '<ul class="pagination">';
+
+    html += `
+        <li class="page-item ${currentPage === 1 ? 'disabled' : ''}">
+            <a class="page-link" href="#" onclick="changePage(${currentPage - 1}); return false;">
+                <i class="fas fa-chevron-left"></i>
+            </a>
+        </li>
+    `;
+
+    for (let i = 1; i <= totalPages; i++) {
+        if (i === 1 || i === totalPages || (i >= currentPage - 2 && i <= currentPage + 2)) {
+            html += `
+                <li class="page-item ${i === currentPage ? 'active' : ''}">
+                    <a class="page-link" href="#" onclick="changePage(${i}); return false;">${i}</a>
+                </li>
+            `;
+        } else if (i === currentPage - 3 || i === currentPage + 3) {
+            html += '<li class="page-item disabled"><span class="page-link">...</span></li>';
+        }
+    }
+
+    html += `
+        <li class="page-item ${currentPage === totalPages ? 'disabled' : ''}">
+            <a class="page-link" href="#" onclick="changePage(${currentPage + 1}); return false;">
+                <i class="fas fa-chevron-right"></i>
+            </a>
+        </li>
+    `;
+
+    html += '</ul>';
+    paginationContainer.innerHTML = html;
+}
+
+function changePage(page) {
+    if (page < 1 || page > Math.ceil(totalImages / 12)) return;
+    currentPage = page;
+    loadImages();
+}
+
+function selectAllImages() {
+    const imageCards = document.querySelectorAll('.image-card');
+    imageCards.forEach(card => {
+        const imageId = card.dataset.imageId;
+        selectedImages.add(imageId);
+        card.classList.add('selected');
+    });
+    updateBatchToolbar();
+}
+
+function unselectAllImages() {
+    const imageCards = document.querySelectorAll('.image-card');
+    imageCards.forEach(card => {
+        card.classList.remove('selected');
+    });
+    selectedImages.clear();
+    updateBatchToolbar();
+}
+
+function toggleSelectImage(imageId) {
+    const imageCard = document.querySelector(`.image-card[data-image-id="${imageId}"]`);
+    if (!imageCard) return;
+
+    if (selectedImages.has(imageId)) {
+        selectedImages.delete(imageId);
+        imageCard.classList.remove('selected');
+    } else {
+        selectedImages.add(imageId);
+        imageCard.classList.add('selected');
+    }
+
+    updateBatchToolbar();
+}
+
+function updateBatchToolbar() {
+    if (!batchToolbar) return;
+
+    const selectedCount = selectedImages.size;
+    const batchButtons = batchToolbar.querySelectorAll('.btn-batch');
+
+    batchButtons.forEach(btn => {
+        btn.disabled = selectedCount === 0;
+    });
+
+    const countText = document.getElementById('selectedCount');
+    if (countText) {
+        countText.textContent = `已选择 ${selectedCount} 张图片`;
+    }
+}
+
+async function batchDeleteImages() {
+    if (selectedImages.size === 0) return;
+
+    if (!confirm(`确定要删除选中的 ${selectedImages.size} 张图片吗？此操作不可恢复！`)) {
+        return;
+    }
+
+    try {
+        showLoading();
+        const response = await fetch('/api/images/batch-delete', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                image_ids: Array.from(selectedImages)
+            })
+        });
+
+        const data = await response.json();
+        if (data.success) {
+            showMessage(`成功删除 ${selectedImages.size} 张图片`, 'success');
+            selectedImages.clear();
+            loadImages();
+        } else {
+            showMessage(data.message || '删除失败', 'danger');
+        }
+    } catch (error) {
+        console.error('Error deleting images:', error);
+        showMessage('删除图片时发生错误', 'danger');
+    } finally {
+        hideLoading();
+    }
+}
+
+async function batchTagImages() {
+    if (selectedImages.size === 0) return;
+
+    const tagModal = new bootstrap.Modal(document.getElementById('tagModal'));
+    const tagInput = document.getElementById('tagInput');
+    const saveTagsBtn = document.getElementById('saveTags');
+
+    const handleSave = async () => {
+        const tags = tagInput.value.split(',')
+            .map(tag => tag.trim())
+            .filter(tag => tag.length > 0);
+
+        if (tags.length === 0) {
+            showMessage('请输入至少一个标签', 'warning');
+            return;
+        }
+
+        try {
+            showLoading();
+            const response = await fetch('/api/images/batch-tags', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    image_ids: Array.from(selectedImages),
+                    tags: tags,
+                    action: document.getElementById('tagAction').value
+                })
+            });
+
+            const data = await response.json();
+            if (data.success) {
+                showMessage('标签更新成功', 'success');
+                tagModal.hide();
+                loadImages();
+            } else {
+                showMessage(data.message || '更新标签失败', 'danger');
+            }
+        } catch (error) {
+            console.error('Error updating tags:', error);
+            showMessage('更新标签时发生错误', 'danger');
+        } finally {
+            hideLoading();
+        }
+    };
+
+    saveTagsBtn.onclick = handleSave;
+    tagModal.show();
+}
+
+async function batchPublicImages() {
+    if (selectedImages.size === 0) return;
+
+    try {
+        showLoading();
+        const response = await fetch('/api/images/batch-public', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                image_ids: Array.from(selectedImages),
+                is_public: true
+            })
+        });
+
+        const data = await response.json();
+        if (data.success) {
+            showMessage('已将选中的图片设为公开', 'success');
+            loadImages();
+        } else {
+            showMessage(data.message || '设置失败', 'danger');
+        }
+    } catch (error) {
+        console.error('Error setting images public:', error);
+        showMessage('设置图片状态时发生错误', 'danger');
+    } finally {
+        hideLoading();
+    }
+}
+
+async function batchPrivateImages() {
+    if (selectedImages.size === 0) return;
+
+    try {
+        showLoading();
+        const response = await fetch('/api/images/batch-public', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                image_ids: Array.from(selectedImages),
+                is_public: false
+            })
+        });
+
+        const data = await response.json();
+        if (data.success) {
+            showMessage('已将选中的图片设为私密', 'success');
+            loadImages();
+        } else {
+            showMessage(data.message || '设置失败', 'danger');
+        }
+    } catch (error) {
+        console.error('Error setting images private:', error);
+        showMessage('设置图片状态时发生错误', 'danger');
+    } finally {
+        hideLoading();
+    }
+}
+
+// 打包下载选中图片的原图：以表单提交，浏览器直接边下载边保存，不经过内存
+function batchDownloadImages() {
+    if (selectedImages.size === 0) return;
+
+    const form = document.createElement('form');
+    form.method = 'POST';
+    form.action = '/api/download';
+    const input = document.createElement('input');
+    input.type = 'hidden';
+    input.name = 'image_ids';
+    input.value = Array.from(selectedImages).join(',');
+    form.appendChild(input);
+    document.body.appendChild(form);
+    form.submit();
+    form.remove();
+}
+
+function previewImage(src) {
+    const modal = new bootstrap.Modal(document.getElementById('imagePreviewModal'));
+    document.getElementById('previewImage').src = src;
+    modal.show();
+}
+
+function showLoading() {
+    if (loadingOverlay) {
+        loadingOverlay.style.display = 'flex';
+    }
+}
+
+function hideLoading() {
+    if (loadingOverlay) {
+        loadingOverlay.style.display = 'none';
+    }
+}
+
+function showMessage(message, type = 'info') {
+    const alert = document.getElementById('alert');
+    if (!alert) return;
+
+    alert.className = `alert alert-${type} alert-dismissible fade show`;
+    alert.innerHTML = `
+        ${message}
+        <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+    `;
+
+    alert.style.display = 'block';
+
+    setTimeout(() => {
+        if (alert.style.display === 'block') {
+            const bsAlert = new bootstrap.Alert(alert);
+            bsAlert.close();
+        }
+    }, 3000);
+}
+
+function formatDate(dateString) {
+    const date = new Date(dateString);
+    const now = new Date();
+    const diff = now - date;
+
+    if (diff < 60000) {
+        return '刚刚';
+    }
+
+    if (diff < 3600000) {
+        return `${Math.floor(diff / 60000)}分钟前`;
+    }
+
+    if (diff < 86400000) {
+        return `${Math.floor(diff / 3600000)}小时前`;
+    }
+
+    if (diff < 2592000000) {
+        return `${Math.floor(diff / 86400000)}天前`;
+    }
+
+    const year = date.getFullYear();
+    const month = String(date.getMonth() + 1).padStart(2, '0');
+    const day = String(date.getDate()).padStart(2, '0');
+    const hour = String(date.getHours()).padStart(2, '0');
+    const minute = String(date.getMinutes()).padStart(2, '0');
+
+    return `${year}-${month}-${day} ${hour}:${minute}`;
+}
+
+function debounce(func, wait) {
+    let timeout;
+    return function executedFunction(...args) {
+        const later = () => {
+            clearTimeout(timeout);
+            func(...args);
+        };
+        clearTimeout(timeout);
+        timeout = setTimeout(later, wait);
+    };
+}
+
+function setupEventListeners() {
+    if (selectAllBtn) {
+        selectAllBtn.addEventListener('click', selectAllImages);
+    }
+    if (unselectAllBtn) {
+        unselectAllBtn.addEventListener('click', unselectAllImages);
+    }
+}
+
+document.addEventListener('DOMContentLoaded', init);
@@ -0,0 +1,502 @@
+const dropZone = document.getElementById('dropZone');
+const fileInput = document.getElementById('fileInput');
+const previewContainer = document.getElementById('previewContainer');
+const submitBtn = document.getElementById('submitBtn');
+let selectedFiles = [];
+
+// 批量上传：每个请求最多 BATCH_MAX_FILES 个文件 / BATCH_MAX_BYTES 字节，同时进行 BATCH_CONCURRENCY 个请求
+const MAX_SELECTED_FILES = 500;
+const BATCH_MAX_FILES = 10;
+const BATCH_MAX_BYTES = 16 * 1024 * 1024;
+const BATCH_CONCURRENCY = 3;
+
+// 选择文件时在后台计算 SHA-256，上传前询问服务器哪些文件已存在
+let fileHashes = [];
+
+async function hashFile(file) {
+    // crypto.subtle 只在 HTTPS / localhost 下可用，不可用时跳过检查
+    if (!window.crypto || !crypto.subtle) return null;
+    try {
+        const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+        return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+    } catch (error) {
+        console.error('计算文件哈希失败:', error);
+        return null;
+    }
+}
+
+// 返回服务器上已有的哈希集合，检查失败时返回空集合（全部照常上传）
+async function checkExisting(hashes) {
+    const known = hashes.filter(Boolean);
+    if (!known.length) return new Set();
+    try {
+        const response = await fetch('/api/upload/check', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ hashes: known })
+        });
+        const data = await response.json();
+        return new Set(data.success ? data.existing : []);
+    } catch (error) {
+        console.error('检查已存在文件失败:', error);
+        return new Set();
+    }
+}
+
+function updateFileCounter(count) {
+    document.getElementById('fileCounter').textContent = 
+        count > 0 ? `已选择 ${count} 个文件` : '';
+    submitBtn.style.display = count > 0 ? 'inline-block' : 'none';
+}
+
+// 处理文件选择
+function handleFileSelect(files) {
+    const fileList = Array.from(files);
+
+    // 检查文件数量
+    if (fileList.length > MAX_SELECTED_FILES) {
+        showError(`一次最多只能上传${MAX_SELECTED_FILES}张图片`);
+        return;
+    }
+
+    const previewContainer = document.getElementById('previewContainer');
+    previewContainer.innerHTML = '';
+    selectedFiles = [];
+    fileHashes = [];
+
+    for (const file of fileList) {
+        if (!file.type.startsWith('image/')) {
+            showError(`${file.name} 不是图片文件`);
+            continue;
+        }
+
+        if (file.size > 2 * 1024 * 1024) {  // 2MB
+            showError(`${file.name} 超过最大文件大小限制(2MB)`);
+            continue;
+        }
+
+        selectedFiles.push(file);
+        fileHashes.push(hashFile(file));
+
+        // 创建预览
+        const previewItem = document.createElement('div');
+        previewItem.className = 'preview-item';
+
+        const img = document.createElement('img');
+        const reader = new FileReader();
+        reader.onload = (e) => {
+            img.src = e.target.result;
+        };
+        reader.readAsDataURL(file);
+
+        previewItem.appendChild(img);
+        previewContainer.appendChild(previewItem);
+    }
+
+    // 更新文件计数器
+    updateFileCounter(selectedFiles.length);
+}
+
+// 上传状态跟踪
+const uploadState = {
+    total: 0,
+    completed: 0,
+    failed: 0,
+    uploading: 0
+};
+
+// 处理文件上传
+async function uploadFiles() {
+    if (selectedFiles.length === 0) {
+        showError('请选择要上传的文件');
+        return;
+    }
+
+    const submitBtn = document.getElementById('submitBtn');
+    submitBtn.disabled = true;
+
+    // 显示进度区域
+    document.getElementById('uploadProgress').style.display = 'block';
+    document.getElementById('uploadItems').innerHTML = '';
+
+    // 初始化状态
+    uploadState.total = selectedFiles.length;
+    uploadState.completed = 0;
+    uploadState.failed = 0;
+    uploadState.uploading = 0;
+
+    updateTotalProgress();
+
+    selectedFiles.forEach((file, index) => createUploadItem(file, `upload-item-${index}`));
+
+    // 服务器已有的文件直接关联，不再传输
+    const hashes = await Promise.all(fileHashes);
+    const existing = await checkExisting(hashes);
+    const toUpload = [];
+    selectedFiles.forEach((file, index) => {
+        if (hashes[index] && existing.has(hashes[index])) {
+            updateUploadItemStatus(`upload-item-${index}`, 'success', '已存在，跳过上传', 100);
+            uploadState.completed++;
+        } else {
+            toUpload.push({ file, index });
+        }
+    });
+    updateTotalProgress();
+
+    // 分批并行上传
+    const batches = buildBatches(toUpload);
+    const uploadedIds = {};
+    let next = 0;
+    const runners = Array.from({ length: Math.min(BATCH_CONCURRENCY, batches.length) }, async () => {
+        while (next < batches.length) {
+            const batch = batches[next++];
+            Object.assign(uploadedIds, await uploadBatch(batch));
+        }
+    });
+    await Promise.all(runners);
+
+    // 等待后台生成缩略图
+    await waitForProcessing(uploadedIds);
+
+    // 上传完成
+    submitBtn.disabled = false;
+
+    if (uploadState.completed > 0) {
+        showSuccess(`成功上传 ${uploadState.completed} 个文件${uploadState.failed > 0 ? `，失败 ${uploadState.failed} 个` : ''}`);
+
+        // 3秒后清空
+        setTimeout(() => {
+            selectedFiles = [];
+            document.getElementById('previewContainer').innerHTML = '';
+            document.getElementById('uploadProgress').style.display = 'none';
+            updateFileCounter(0);
+        }, 3000);
+    }
+}
+
+// 按数量和大小将文件分批，输入 [{file, index}]，返回 [[{file, index}], ...]
+function buildBatches(items) {
+    const batches = [];
+    let current = [];
+    let bytes = 0;
+    items.forEach(({ file, index }) => {
+        if (current.length && (current.length >= BATCH_MAX_FILES || bytes + file.size > BATCH_MAX_BYTES)) {
+            batches.push(current);
+            current = [];
+            bytes = 0;
+        }
+        current.push({ file, index });
+        bytes += file.size;
+    });
+    if (current.length) batches.push(current);
+    return batches;
+}
+
+// 上传一批文件，请求失败时整批重试，返回 {itemId: 图片 ID}
+async function uploadBatch(batch, retryCount = 0) {
+    const maxRetries = 3;
+    const formData = new FormData();
+    uploadState.uploading += batch.length;
+    for (const { file, index } of batch) {
+        formData.append('files', file);
+        updateUploadItemStatus(`upload-item-${index}`, 'uploading', '正在上传...', 0);
+    }
+
+    const uploadedIds = {};
+    try {
+        const response = await fetch('/api/upload/batch', {
+            method: 'POST',
+            body: formData
+        });
+        if (!response.ok && response.status !== 400) {
+            throw new Error('上传失败');
+        }
+        const data = await response.json();
+        const results = data.results || [];
+
+        batch.forEach(({ file, index }, i) => {
+            const itemId = `upload-item-${index}`;
+            const result = results[i] || { success: false, error: data.error };
+            if (result.success && result.duplicate) {
+                updateUploadItemStatus(itemId, 'success', '已存在，未重复保存', 100);
+                uploadState.completed++;
+            } else if (result.success) {
+                updateUploadItemStatus(itemId, 'processing', '生成缩略图...', 60);
+                uploadedIds[itemId] = result.id;
+                uploadState.completed++;
+            } else {
+                updateUploadItemStatus(itemId, 'error', `上传失败: ${result.error || '未知错误'}`, 0);
+                uploadState.failed++;
+                addRetryButton(itemId, file, index);
+            }
+        });
+    } catch (error) {
+        console.error('批量上传错误:', error);
+        uploadState.uploading -= batch.length;
+        if (retryCount < maxRetries) {
+            batch.forEach(({ index }) => updateUploadItemStatus(
+                `upload-item-${index}`, 'retrying', `重试中 (${retryCount + 1}/${maxRetries})...`, 0));
+            await sleep(1000 * (retryCount + 1)); // 递增延迟
+            return await uploadBatch(batch, retryCount + 1);
+        }
+        batch.forEach(({ file, index }) => {
+            const itemId = `upload-item-${index}`;
+            updateUploadItemStatus(itemId, 'error', `上传失败: ${error.message}`, 0);
+            uploadState.failed++;
+            addRetryButton(itemId, file, index);
+        });
+        updateTotalProgress();
+        return uploadedIds;
+    }
+
+    uploadState.uploading -= batch.length;
+    updateTotalProgress();
+    return uploadedIds;
+}
+
+// 轮询后台处理状态，最多等待 maxWait 毫秒
+async function waitForProcessing(uploadedIds, maxWait = 60000) {
+    const pending = { ...uploadedIds };
+    const deadline = Date.now() + maxWait;
+    while (Object.keys(pending).length && Date.now() < deadline) {
+        await sleep(1000);
+        const itemIds = Object.keys(pending).slice(0, 200);
+        try {
+            const response = await fetch(`/api/upload/status?ids=${itemIds.map(id => pending[id]).join(',')}`);
+            const data = await response.json();
+            for (const itemId of itemIds) {
+                const status = data.status && data.status[pending[itemId]];
+                if (status === 'completed') {
+                    updateUploadItemStatus(itemId, 'success', '上传完成', 100);
+                    delete pending[itemId];
+                } else if (status === 'failed') {
+                    updateUploadItemStatus(itemId, 'success', '上传完成（缩略图生成失败）', 100);
+                    delete pending[itemId];
+                } else if (status === 'processing' || status === 'pending') {
+                    updateUploadItemStatus(itemId, 'processing', '生成缩略图和 WebP...', 80);
+                }
+            }
+        } catch (error) {
+            console.error('查询处理状态失败:', error);
+        }
+    }
+    // 超时未完成的仍在后台处理，不影响上传结果
+    for (const itemId of Object.keys(pending)) {
+        updateUploadItemStatus(itemId, 'success', '上传完成，后台处理中', 100);
+    }
+}
+
+// 上传单个文件（失败后手动重试时使用）
+async function uploadSingleFile(file, index, retryCount = 0) {
+    const maxRetries = 3;
+    const itemId = `upload-item-${index}`;
+
+    // 创建上传项
+    if (retryCount === 0 && !document.getElementById(itemId)) {
+        createUploadItem(file, itemId);
+    }
+
+    uploadState.uploading++;
+    updateUploadItemStatus(itemId, 'uploading', '正在上传...', 0);
+
+    try {
+        const formData = new FormData();
+        formData.append('file', file);
+
+        const response = await fetch('/upload', {
+            method: 'POST',
+            body: formData
+        });
+
+        if (!response.ok) {
+            throw new Error('上传失败');
+        }
+
+        const result = await response.json();
+
+        if (result.success) {
+            // 上传成功，开始处理
+            updateUploadItemStatus(itemId, 'processing', '生成缩略图...', 50);
+
+            // 模拟处理进度
+            await sleep(300);
+            updateUploadItemStatus(itemId, 'processing', '生成 WebP...', 75);
+
+            await sleep(300);
+            updateUploadItemStatus(itemId, 'success', '上传完成', 100);
+
+            uploadState.completed++;
+        } else {
+            throw new Error(result.error || '上传失败');
+        }
+
+    } catch (error) {
+        console.error('上传错误:', error);
+
+        // 重试逻辑
+        if (retryCount < maxRetries) {
+            updateUploadItemStatus(itemId, 'retrying', `重试中 (${retryCount + 1}/${maxRetries})...`, 0);
+            await sleep(1000 * (retryCount + 1)); // 递增延迟
+            return await uploadSingleFile(file, index, retryCount + 1);
+        } else {
+            // 最终失败
+            updateUploadItemStatus(itemId, 'error', `上传失败: ${error.message}`, 0);
+            uploadState.failed++;
+
+            // 添加重试按钮
+            addRetryButton(itemId, file, index);
+        }
+    } finally {
+        uploadState.uploading--;
+        updateTotalProgress();
+    }
+}
+
+// 创建上传项
+function createUploadItem(file, itemId) {
+    const uploadItems = document.getElementById('uploadItems');
+    const item = document.createElement('div');
+    item.className = 'upload-item';
+    item.id = itemId;
+
+    // 创建预览
+    const reader = new FileReader();
+    reader.onload = (e) => {
+        item.querySelector('.preview-thumb').src = e.target.result;
+    };
+    reader.readAsDataURL(file);
+
+    item.innerHTML = `
+        <img class="preview-thumb" src="" alt="预览">
+        <div class="upload-info">
+            <div class="filename">${file.name}</div>
+            <div class="status">等待上传...</div>
+            <div class="progress-bar">
+                <div class="progress-fill" style="width: 0%"></div>
+            </div>
+            <div class="progress-text">0%</div>
+        </div>
+        <div class="upload-actions"></div>
+    `;
+
+    uploadItems.appendChild(item);
+}
+
+// 更新上传项状态
+function updateUploadItemStatus(itemId, status, statusText, progress) {
+    const item = document.getElementById(itemId);
+    if (!item) return;
+
+    const statusEl = item.querySelector('.status');
+    const progressFill = item.querySelector('.progress-fill');
+    const progressText = item.querySelector('.progress-text');
+
+    statusEl.textContent = statusText;
+    progressFill.style.width = progress + '%';
+    progressText.textContent = progress + '%';
+
+    // 更新样式
+    item.className = 'upload-item';
+    progressFill.className = 'progress-fill';
+
+    if (status === 'success') {
+        item.classList.add('success');
+        progressFill.classList.add('success');
+    } else if (status === 'error') {
+        item.classList.add('error');
+        progressFill.classList.add('error');
+    }
+}
+
+// 添加重试按钮
+function addRetryButton(itemId, file, index) {
+    const item = document.getElementById(itemId);
+    if (!item) return;
+
+    const actionsEl = item.querySelector('.upload-actions');
+    actionsEl.innerHTML = `
+        <button class="retry-btn" onclick="retryUpload('${itemId}', ${index})">
+            <i class="fas fa-redo"></i> 重试
+        </button>
+    `;
+}
+
+// 重试上传
+async function retryUpload(itemId, index) {
+    const file = selectedFiles[index];
+    if (!file) return;
+
+    // 清除重试按钮
+    const item = document.getElementById(itemId);
+    item.querySelector('.upload-actions').innerHTML = '';
+
+    // 重置失败计数
+    uploadState.failed--;
+
+    // 重新上传
+    await uploadSingleFile(file, index, 0);
+}
+
+// 更新总体进度
+function updateTotalProgress() {
+    const progressText = document.getElementById('totalProgressText');
+    const progressFill = document.getElementById('totalProgressFill');
+
+    const completed = uploadState.completed + uploadState.failed;
+    const percentage = uploadState.total > 0 ? (completed / uploadState.total * 100) : 0;
+
+    progressText.textContent = `${completed}/${uploadState.total} (成功: ${uploadState.completed}, 失败: ${uploadState.failed})`;
+    progressFill.style.width = percentage + '%';
+
+    if (uploadState.failed > 0) {
+        progressFill.classList.add('error');
+    } else if (completed === uploadState.total) {
+        progressFill.classList.add('success');
+    }
+}
+
+// 辅助函数：延迟
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+function showError(message) {
+    const alert = document.createElement('div');
+    alert.className = 'alert alert-danger';
+    alert.textContent = message;
+    document.querySelector('.upload-container').insertBefore(alert, document.getElementById('uploadForm'));
+    setTimeout(() => alert.remove(), 3000);
+}
+
+function showSuccess(message) {
+    const alert = document.createElement('div');
+    alert.className = 'alert alert-success';
+    alert.textContent = message;
+    document.querySelector('.upload-container').insertBefore(alert, document.getElementById('uploadForm'));
+    setTimeout(() => alert.remove(), 3000);
+}
+
+// 文件选择事件
+fileInput.addEventListener('change', (e) => {
+    handleFileSelect(e.target.files);
+});
+
+// 上传按钮事件
+document.getElementById('submitBtn').addEventListener('click', uploadFiles);
+
+// 拖拽上传
+dropZone.addEventListener('dragover', e => {
+    e.preventDefault();
+    dropZone.style.borderColor = '#0056b3';
+});
+
+dropZone.addEventListener('dragleave', e => {
+    e.preventDefault();
+    dropZone.style.borderColor = '#ccc';
+});
+
+dropZone.addEventListener('drop', e => {
+    e.preventDefault();
+    dropZone.style.borderColor = '#ccc';
+    handleFileSelect(e.dataTransfer.files);
+});
@@ -0,0 +1,198 @@
+// 图片分享平台 Service Worker
+//
+// 1. 预缓存页面外壳（首页和公共静态资源），离线时首页仍可打开
+// 2. 缩略图按“缓存优先”存入 Cache Storage，总大小超过上限时按最近最少使用淘汰
+// 3. 列表接口“网络优先”，离线时退回上次的响应
+// 4. 页面空闲时通知这里预取下一页数据和首行缩略图，翻页时直接命中
+
+const SHELL_CACHE = 'pic-shell-' + {{ version | tojson }};
+const THUMBNAIL_CACHE = 'pic-thumbnails';
+const API_CACHE = 'pic-api';
+const SHELL_URLS = {{ shell_urls | tojson }};
+
+const THUMBNAIL_MAX_BYTES = {{ thumbnail_max_bytes }};
+const THUMBNAIL_PATH = '/uploads/thumbnails/';
+const API_PATHS = ['/api/public_images', '/api/years'];
+const PREFETCH_TTL = 60 * 1000;          // 预取的接口响应有效期（毫秒）
+const PREFETCHED_HEADER = 'X-SW-Prefetched-At';
+const PREFETCH_THUMBNAILS = 8;           // 预取下一页的缩略图数量上限
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(SHELL_CACHE)
+            .then(cache => Promise.all(SHELL_URLS.map(url => {
+                // 跨域资源以 no-cors 方式缓存
+                const request = new Request(url, url.startsWith('/') ? {} : { mode: 'no-cors' });
+                return fetch(request).then(response => cache.put(request, response)).catch(() => null);
+            })))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(names
+                .filter(name => name.startsWith('pic-shell-') && name !== SHELL_CACHE)
+                .map(name => caches.delete(name))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+
+    if (url.origin !== self.location.origin) {
+        if (SHELL_URLS.includes(request.url)) {
+            event.respondWith(caches.match(request).then(cached => cached || fetch(request)));
+        }
+        return;
+    }
+
+    if (request.mode === 'navigate' && url.pathname === '/') {
+        event.respondWith(networkFirst(request, SHELL_CACHE, '/'));
+    } else if (url.pathname.startsWith(THUMBNAIL_PATH)) {
+        event.respondWith(thumbnail(request));
+    } else if (API_PATHS.includes(url.pathname) && url.searchParams.get('private') !== 'true') {
+        event.respondWith(apiResponse(request));
+    } else if (SHELL_URLS.includes(url.pathname)) {
+        event.respondWith(caches.match(request).then(cached => cached || fetch(request)));
+    }
+});
+
+self.addEventListener('message', event => {
+    const data = event.data || {};
+    if (data.type === 'prefetch' && data.url) {
+        event.waitUntil(prefetchPage(data.url));
+    }
+});
+
+// 网络优先，失败时返回缓存
+async function networkFirst(request, cacheName, cacheKey) {
+    const cache = await caches.open(cacheName);
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            cache.put(cacheKey || request, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = await cache.match(cacheKey || request, { ignoreVary: true });
+        if (cached) return cached;
+        throw error;
+    }
+}
+
+// 列表接口：刚预取过的响应直接使用，否则网络优先
+async function apiResponse(request) {
+    const cache = await caches.open(API_CACHE);
+    const cached = await cache.match(request, { ignoreVary: true });
+    if (cached) {
+        const prefetchedAt = Number(cached.headers.get(PREFETCHED_HEADER));
+        if (prefetchedAt && Date.now() - prefetchedAt < PREFETCH_TTL) {
+            // 预取结果只用一次，之后回到网络优先
+            await cache.put(request, await withoutPrefetchMark(cached));
+            return cached;
+        }
+    }
+    return networkFirst(request, API_CACHE);
+}
+
+async function withoutPrefetchMark(response) {
+    const headers = new Headers(response.headers);
+    headers.delete(PREFETCHED_HEADER);
+    return new Response(await response.clone().blob(), { status: response.status, headers });
+}
+
+// 重新构造响应时去掉传输相关的头（响应体已解压）
+function storedHeaders(response) {
+    const headers = new Headers(response.headers);
+    headers.delete('Content-Encoding');
+    headers.delete('Content-Length');
+    return headers;
+}
+
+// 缩略图：缓存优先，命中时更新最近使用顺序
+const touched = new Set();
+
+async function thumbnail(request) {
+    const cache = await caches.open(THUMBNAIL_CACHE);
+    const cached = await cache.match(request);
+    if (cached) {
+        touch(cache, request, cached);
+        return cached;
+    }
+    const response = await fetch(request);
+    if (response.ok) {
+        await cache.put(request, response.clone());
+        touched.add(request.url);
+        scheduleTrim();
+    }
+    return response;
+}
+
+// Cache Storage 的 keys() 按写入顺序返回，重新写入即移到末尾；每个缩略图每次启动只移动一次
+function touch(cache, request, response) {
+    if (touched.has(request.url)) return;
+    touched.add(request.url);
+    response.clone().blob()
+        .then(body => cache.delete(request)
+            .then(() => cache.put(request, new Response(body, { headers: response.headers }))))
+        .catch(() => null);
+}
+
+let trimTimer = null;
+
+function scheduleTrim() {
+    if (trimTimer) return;
+    trimTimer = setTimeout(() => {
+        trimTimer = null;
+        trimThumbnails().catch(() => null);
+    }, 5000);
+}
+
+// 总大小超过上限时从最早写入（最近最少使用）的缩略图开始删除
+async function trimThumbnails() {
+    const cache = await caches.open(THUMBNAIL_CACHE);
+    const requests = await cache.keys();
+    const sizes = [];
+    let total = 0;
+    for (const request of requests) {
+        const response = await cache.match(request);
+        const size = Number(response && response.headers.get('Content-Length')) || 0;
+        sizes.push(size);
+        total += size;
+    }
+    for (let i = 0; i < requests.length && total > THUMBNAIL_MAX_BYTES; i++) {
+        await cache.delete(requests[i]);
+        touched.delete(requests[i].url);
+        total -= sizes[i];
+    }
+}
+
+// 预取下一页数据，并预取首行（或前几张）缩略图
+async function prefetchPage(url) {
+    const request = new Request(new URL(url, self.location.origin).href);
+    const cache = await caches.open(API_CACHE);
+    const response = await fetch(request);
+    if (!response.ok) return;
+
+    const headers = storedHeaders(response);
+    headers.set(PREFETCHED_HEADER, String(Date.now()));
+    const body = await response.blob();
+    await cache.put(request, new Response(body, { status: response.status, headers }));
+
+    const data = JSON.parse(await body.text());
+    const images = Array.isArray(data.data) ? data.data : [];
+    let first = images;
+    if (data.layout && data.layout.rows && data.layout.rows.length) {
+        const ids = new Set(data.layout.rows[0].items.map(item => item.id));
+        first = images.filter(image => ids.has(image._id));
+    }
+    await Promise.all(first.slice(0, PREFETCH_THUMBNAILS)
+        .map(image => image.thumbnail_url)
+        .filter(src => src && src.startsWith(THUMBNAIL_PATH))
+        .map(src => thumbnail(new Request(new URL(src, self.location.origin).href)).catch(() => null)));
+}
@@ -0,0 +1,181 @@
+"""
+测试图片文件的分段下载（/uploads/<filename>）
+
+测试：
+1. parse_ranges：后缀范围、开放范围、重叠与相邻范围合并、start > end、范围过多、空文件
+2. if_range_matches：弱 ETag、日期、不匹配
+3. 接口：单段和多段 206（Content-Length 与实际长度一致）、416、If-Range 不匹配时返回 200
+
+运行：python -m pytest -q test_file_serving.py
+接口测试需要导入 app（连接 MONGO_URI 指定的 MongoDB），连接失败时跳过。
+"""
+
+import os
+import re
+import uuid
+
+import pytest
+from werkzeug.http import http_date
+
+from utils.file_serving import FileInfo, MAX_RANGES, if_range_matches, parse_ranges
+
+INFO = FileInfo(size=1000, mtime=1700000000.0, etag='1700000000000000000-1000')
+
+
+# parse_ranges
+
+def test_single_range():
+    assert parse_ranges('bytes=0-99', 1000) == [(0, 99)]
+
+
+def test_suffix_range():
+    assert parse_ranges('bytes=-100', 1000) == [(900, 999)]
+    # 后缀长度超过文件大小时返回整个文件
+    assert parse_ranges('bytes=-5000', 1000) == [(0, 999)]
+
+
+def test_open_ended_range():
+    assert parse_ranges('bytes=900-', 1000) == [(900, 999)]
+    # 结束位置超过文件大小时截断
+    assert parse_ranges('bytes=900-5000', 1000) == [(900, 999)]
+
+
+def test_overlapping_and_adjacent_ranges_are_merged():
+    assert parse_ranges('bytes=0-99,50-149', 1000) == [(0, 149)]
+    assert parse_ranges('bytes=0-99,100-199', 1000) == [(0, 199)]
+    assert parse_ranges('bytes=500-599,0-99', 1000) == [(0, 99), (500, 599)]
+    assert parse_ranges('bytes=0-99,-100,200-', 1000) == [(0, 99), (200, 999)]
+
+
+def test_start_after_end_is_ignored():
+    assert parse_ranges('bytes=200-100', 1000) is None
+
+
+def test_unsatisfiable_range():
+    assert parse_ranges('bytes=1000-', 1000) == []
+    assert parse_ranges('bytes=2000-3000', 1000) == []
+
+
+def test_too_many_ranges_is_ignored():
+    header = 'bytes=' + ','.join(f'{i * 10}-{i * 10 + 1}' for i in range(MAX_RANGES + 1))
+    assert parse_ranges(header, 1000) is None
+    header = 'bytes=' + ','.join(f'{i * 10}-{i * 10 + 1}' for i in range(MAX_RANGES))
+    assert len(parse_ranges(header, 1000)) == MAX_RANGES
+
+
+def test_zero_byte_file():
+    assert parse_ranges('bytes=0-', 0) == []
+    assert parse_ranges('bytes=-1', 0) == []
+
+
+def test_malformed_header_is_ignored():
+    assert parse_ranges(None, 1000) is None
+    assert parse_ranges('items=0-1', 1000) is None
+    assert parse_ranges('bytes=abc', 1000) is None
+    assert parse_ranges('bytes=-', 1000) is None
+
+
+# if_range_matches
+
+def test_if_range_strong_etag():
+    assert if_range_matches(None, INFO)
+    assert if_range_matches(f'"{INFO.etag}"', INFO)
+
+
+def test_if_range_weak_etag_never_matches():
+    assert not if_range_matches(f'W/"{INFO.etag}"', INFO)
+
+
+def test_if_range_date():
+    assert if_range_matches(http_date(INFO.last_modified), INFO)
+    assert not if_range_matches(http_date(INFO.mtime - 60), INFO)
+
+
+def test_if_range_mismatch():
+    assert not if_range_matches('"other-etag"', INFO)
+    assert not if_range_matches('not a date', INFO)
+
+
+# 接口
+
+@pytest.fixture(scope='module')
+def client():
+    try:
+        from app import app
+    except Exception as e:
+        pytest.skip(f"无法导入 app: {e}")
+    return app.test_client()
+
+
+@pytest.fixture
+def upload(client):
+    """在上传目录中写入 1000 字节的测试文件，返回 (地址, 内容)"""
+    from app import app
+    filename = f'range-test-{uuid.uuid4().hex}.bin'
+    content = bytes(i % 251 for i in range(1000))
+    path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    with open(path, 'wb') as f:
+        f.write(content)
+    yield f'/uploads/{filename}', content
+    os.remove(path)
+
+
+def test_full_response(client, upload):
+    url, content = upload
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == content
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag']
+
+
+def test_single_range_response(client, upload):
+    url, content = upload
+    response = client.get(url, headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == 'bytes 100-199/1000'
+    assert int(response.headers['Content-Length']) == len(response.data) == 100
+    assert response.data == content[100:200]
+
+
+def test_multipart_range_response(client, upload):
+    url, content = upload
+    response = client.get(url, headers={'Range': 'bytes=0-9,-10'})
+    assert response.status_code == 206
+    match = re.match(r'multipart/byteranges; boundary=(\S+)', response.headers['Content-Type'])
+    assert match
+    assert int(response.headers['Content-Length']) == len(response.data)
+
+    boundary = match.group(1).encode('ascii')
+    parts = response.data.split(b'--' + boundary)
+    assert parts[-1] == b'--\r\n'
+    bodies = [part.split(b'\r\n\r\n', 1) for part in parts[1:-1]]
+    assert b'Content-Range: bytes 0-9/1000' in bodies[0][0]
+    assert bodies[0][1] == content[:10] + b'\r\n'
+    assert b'Content-Range: bytes 990-999/1000' in bodies[1][0]
+    assert bodies[1][1] == content[990:] + b'\r\n'
+
+
+def test_range_not_satisfiable(client, upload):
+    url, _ = upload
+    response = client.get(url, headers={'Range': 'bytes=5000-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == 'bytes */1000'
+    # 错误响应不能被共享缓存保存
+    assert 'public' not in response.headers.get('Cache-Control', '')
+    assert 'Expires' not in response.headers
+
+
+def test_if_range_mismatch_returns_full_file(client, upload):
+    url, content = upload
+    response = client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale-etag"'})
+    assert response.status_code == 200
+    assert response.data == content
+
+
+def test_if_range_match_returns_partial(client, upload):
+    url, content = upload
+    etag = client.get(url).headers['ETag']
+    response = client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': etag})
+    assert response.status_code == 206
+    assert response.data == content[:10]
@@ -0,0 +1,90 @@
+"""
+测试图片搜索（utils/search.py）
+
+测试：
+1. 分页游标：日期游标和只有 _id 的游标（photo_time 无法解析）可以往返编码
+2. 聚合管道不再对 photo_time 使用 $toDate
+3. 在 MongoDB 上执行：历史记录中无法解析的 photo_time（EXIF 格式字符串）不会使搜索失败，
+   年份分面忽略这些图片，分页可以翻到这些图片
+
+运行：python -m pytest -q test_search.py
+MongoDB 测试使用 MONGO_URI 指定的实例（默认 mongodb://localhost:27017/）中的临时数据库，连接失败时跳过。
+"""
+
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from utils.search import (
+    SORT_TIME_FIELD, build_search_match, build_search_pipeline, decode_cursor, encode_cursor, format_facets
+)
+
+
+def test_cursor_round_trip_with_date():
+    image_id = ObjectId()
+    cursor = encode_cursor({'_id': image_id, SORT_TIME_FIELD: datetime(2023, 5, 1, 12, 30)})
+    assert decode_cursor(cursor) == (datetime(2023, 5, 1, 12, 30), image_id)
+
+
+def test_cursor_round_trip_without_date():
+    image_id = ObjectId()
+    cursor = encode_cursor({'_id': image_id, SORT_TIME_FIELD: None, 'photo_time': '2023:01:01 12:00:00'})
+    assert decode_cursor(cursor) == (None, image_id)
+
+
+def test_invalid_cursor():
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+
+
+def test_pipeline_does_not_use_to_date():
+    assert '$toDate' not in repr(build_search_pipeline({}, size=5))
+
+
+def test_null_year_bucket_is_dropped():
+    facets = format_facets({'years': [{'_id': 2023, 'count': 2}, {'_id': None, 'count': 1}]})
+    assert facets['years'] == [{'value': 2023, 'count': 2}]
+
+
+@pytest.fixture
+def images():
+    pymongo = pytest.importorskip('pymongo')
+    client = pymongo.MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/'), serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command('ping')
+    except Exception as e:
+        pytest.skip(f"无法连接 MongoDB: {e}")
+    db_name = f'pic_share_test_{uuid.uuid4().hex[:8]}'
+    yield client[db_name].images
+    client.drop_database(db_name)
+    client.close()
+
+
+def run_search(collection, cursor=None, size=2):
+    pipeline = build_search_pipeline(build_search_match(base={'deleted': {'$ne': True}}), cursor=cursor, size=size)
+    return next(collection.aggregate(pipeline))
+
+
+def test_unparsable_photo_time(images):
+    images.insert_many([
+        {'filename': 'a.jpg', 'photo_time': datetime(2024, 3, 1), 'is_public': True},
+        {'filename': 'b.jpg', 'photo_time': datetime(2023, 6, 1), 'is_public': True},
+        {'filename': 'c.jpg', 'photo_time': '2023:01:01 12:00:00', 'is_public': True},
+        {'filename': 'd.jpg', 'is_public': True},
+    ])
+
+    first = run_search(images)
+    assert first['total'][0]['count'] == 4
+    assert format_facets(first)['years'] == [{'value': 2024, 'count': 1}, {'value': 2023, 'count': 1}]
+
+    # 按拍摄时间降序，无法解析的排在最后，分页不会提前结束
+    seen = [doc['filename'] for doc in first['results'][:2]]
+    cursor = encode_cursor(first['results'][1])
+    second = run_search(images, cursor=cursor)
+    seen += [doc['filename'] for doc in second['results'][:2]]
+    assert seen[:2] == ['a.jpg', 'b.jpg']
+    assert sorted(seen[2:]) == ['c.jpg', 'd.jpg']
+    assert len(second['results']) == 2
@@ -4,12 +4,34 @@ Utils 包
 提供图片处理和文件管理功能
 """
 
-from .file_utils import save_image, get_image_metadata
+from .file_utils import (
+    ALLOWED_EXTENSIONS, save_image, get_image_metadata, get_variant_paths, remove_image_files,
+    file_sha256, build_image_document
+)
 from .image_processor import ImageProcessor, create_image_processor
+from .reaper import ImageReaper
+from .tag_stats import TagStats, tag_state, count_tag_membership
+from .variant_worker import VariantWorker
+from .change_counter import ChangeCounter, scopes_for
+from .variant_specs import VARIANT_SPECS, VariantSpec
 
 __all__ = [
     'save_image',
     'get_image_metadata',
+    'get_variant_paths',
+    'remove_image_files',
+    'file_sha256',
+    'build_image_document',
+    'ALLOWED_EXTENSIONS',
     'ImageProcessor',
-    'create_image_processor'
+    'create_image_processor',
+    'ImageReaper',
+    'TagStats',
+    'tag_state',
+    'count_tag_membership',
+    'VariantWorker',
+    'ChangeCounter',
+    'scopes_for',
+    'VARIANT_SPECS',
+    'VariantSpec'
 ]
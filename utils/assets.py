@@ -0,0 +1,267 @@
+"""
+静态资源打包模块
+
+功能：
+1. 页面脚本和样式的源文件位于 static/src/，第三方库（Bootstrap、Font Awesome、qrcodejs）下载到 static/vendor/
+2. build：压缩源文件，与第三方文件一起按内容哈希命名输出到 static/dist/，并写入 manifest.json
+3. AssetManifest.url：模板中的 asset_url('index.js') 返回打包后的地址
+4. static/dist/ 下的文件名随内容变化，响应头设置为一年有效且不可变（immutable）
+5. 保留最近几次打包的输出（builds.json 记录每次打包的文件），部署期间尚未重启的进程
+   和已打开的页面仍引用旧文件名，只删除更早的打包文件
+
+未打包时 asset_url 退回 static/src/ 的源文件；第三方库未下载时退回 CDN，开发环境无需先执行打包。
+"""
+
+import re
+import json
+import shutil
+import hashlib
+import logging
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from flask import request, url_for
+
+try:
+    import rjsmin
+    import rcssmin
+except ImportError:  # pragma: no cover - 压缩库为可选依赖
+    rjsmin = rcssmin = None
+
+logger = logging.getLogger(__name__)
+
+DIST_DIR = 'dist'
+SOURCE_DIR = 'src'
+VENDOR_DIR = 'vendor'
+MANIFEST_NAME = 'manifest.json'
+BUILDS_NAME = 'builds.json'
+
+# 保留最近几次打包的输出（包括本次）
+KEEP_BUILDS = 3
+
+# 打包后文件的缓存时间（秒）
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# 第三方资源：名称 -> (CDN 地址, static/vendor/ 下的路径)
+VENDOR_ASSETS = {
+    'bootstrap.css': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css',
+        'bootstrap/bootstrap.min.css'
+    ),
+    'bootstrap.js': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js',
+        'bootstrap/bootstrap.bundle.min.js'
+    ),
+    'fontawesome.css': (
+        'https://cdn.bootcdn.net/ajax/libs/font-awesome/6.0.0/css/all.min.css',
+        'fontawesome/css/all.min.css'
+    ),
+    'qrcode.js': (
+        'https://cdn.bootcdn.net/ajax/libs/qrcodejs/1.0.0/qrcode.min.js',
+        'qrcodejs/qrcode.min.js'
+    ),
+}
+
+# 第三方样式引用的字体文件：CDN 目录 -> static/vendor/ 下的目录
+VENDOR_FONTS = {
+    'https://cdn.bootcdn.net/ajax/libs/font-awesome/6.0.0/webfonts/': 'fontawesome/webfonts/',
+}
+FONT_FILES = [
+    f'{family}.{ext}'
+    for family in ('fa-brands-400', 'fa-regular-400', 'fa-solid-900', 'fa-v4compatibility')
+    for ext in ('woff2', 'ttf')
+]
+
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def _hashed_name(path: str, data: bytes) -> str:
+    """index.js -> index.<哈希>.js"""
+    stem, dot, ext = Path(path).name.rpartition('.')
+    return f"{stem}.{_content_hash(data)}.{ext}" if dot else f"{path}.{_content_hash(data)}"
+
+
+def minify_css(text: str) -> str:
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    # 未安装 rcssmin 时只去掉注释和多余空白
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r'([{;])\s*([\w-]+)\s*:\s*', r'\1\2:', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text: str) -> str:
+    if rjsmin is not None:
+        return rjsmin.jsmin(text)
+    # 未安装 rjsmin 时只去掉缩进、空行和整行注释，不改动语句本身
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith('//'):
+            continue
+        lines.append(stripped)
+    return '\n'.join(lines) + '\n'
+
+
+def fetch_vendor(static_folder: str, force: bool = False) -> int:
+    """
+    下载第三方资源到 static/vendor/
+
+    Returns:
+        新下载的文件数量
+    """
+    vendor = Path(static_folder) / VENDOR_DIR
+    downloads = [(url, vendor / path) for url, path in VENDOR_ASSETS.values()]
+    for base, directory in VENDOR_FONTS.items():
+        downloads += [(base + name, vendor / directory / name) for name in FONT_FILES]
+
+    count = 0
+    for url, target in downloads:
+        if target.exists() and not force:
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        logger.info(f"下载 {url}")
+        with urllib.request.urlopen(url, timeout=30) as response:
+            target.write_bytes(response.read())
+        count += 1
+    return count
+
+
+def _previous_builds(dist: Path) -> List[List[str]]:
+    """之前每次打包输出的文件名，最近的在前"""
+    path = dist / BUILDS_NAME
+    if path.exists():
+        try:
+            return json.loads(path.read_text(encoding='utf-8'))
+        except Exception as e:
+            logger.error(f"读取打包记录失败: {str(e)}")
+    # 没有打包记录时（旧版本的输出），把现有文件视为上一次打包
+    existing = sorted(
+        entry.name for entry in dist.iterdir()
+        if entry.is_file() and entry.name not in (MANIFEST_NAME, BUILDS_NAME)
+    )
+    return [existing] if existing else []
+
+
+def build(static_folder: str, keep: int = KEEP_BUILDS) -> Dict[str, str]:
+    """
+    打包静态资源到 static/dist/ 并写入 manifest.json
+
+    Args:
+        static_folder: static 目录
+        keep: 保留最近几次打包的输出（包括本次），更早的文件被删除
+
+    Returns:
+        manifest：资源名称 -> static 目录下的相对路径
+    """
+    static = Path(static_folder)
+    dist = static / DIST_DIR
+    dist.mkdir(parents=True, exist_ok=True)
+    manifest: Dict[str, str] = {}
+    outputs = set()
+
+    def emit(name: str, data: bytes) -> str:
+        filename = _hashed_name(name, data)
+        target = dist / filename
+        if not target.exists():
+            target.write_bytes(data)
+        outputs.add(filename)
+        return filename
+
+    # 字体先输出，样式中的引用改写为带哈希的文件名（与样式同在 dist/ 目录）
+    fonts: Dict[Path, str] = {}
+    for directory in VENDOR_FONTS.values():
+        for font in sorted((static / VENDOR_DIR / directory).glob('*')):
+            fonts[font.resolve()] = emit(font.name, font.read_bytes())
+
+    for name, (_, path) in VENDOR_ASSETS.items():
+        source = static / VENDOR_DIR / path
+        if not source.exists():
+            logger.warning(f"未找到第三方资源 {source}，页面将使用 CDN 地址")
+            continue
+        data = source.read_bytes()
+        if name.endswith('.css'):
+            def rewrite(match, base=source.parent):
+                target = fonts.get((base / match.group(2).split('?')[0].split('#')[0]).resolve())
+                return f'url({target})' if target else match.group(0)
+            data = _CSS_URL.sub(rewrite, data.decode('utf-8')).encode('utf-8')
+        manifest[name] = f"{DIST_DIR}/{emit(name, data)}"
+
+    for source in sorted((static / SOURCE_DIR).glob('*')):
+        text = source.read_text(encoding='utf-8')
+        if source.suffix == '.css':
+            text = minify_css(text)
+        elif source.suffix == '.js':
+            text = minify_js(text)
+        else:
+            continue
+        manifest[source.name] = f"{DIST_DIR}/{emit(source.name, text.encode('utf-8'))}"
+
+    # 清理更早的打包文件：本次和之前 keep - 1 次打包的输出都保留
+    builds = [sorted(outputs)] + _previous_builds(dist)[:max(keep - 1, 0)]
+    retained = set().union(*builds)
+    for stale in dist.iterdir():
+        if stale.is_file() and stale.name not in (MANIFEST_NAME, BUILDS_NAME) and stale.name not in retained:
+            stale.unlink()
+
+    (dist / BUILDS_NAME).write_text(json.dumps(builds, indent=2), encoding='utf-8')
+    (dist / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding='utf-8')
+    return manifest
+
+
+def clean(static_folder: str):
+    """删除打包输出"""
+    shutil.rmtree(Path(static_folder) / DIST_DIR, ignore_errors=True)
+
+
+class AssetManifest:
+    """模板中 asset_url 的实现"""
+
+    def __init__(self, static_folder: str):
+        self.static_folder = Path(static_folder)
+        self.manifest: Dict[str, str] = {}
+        path = self.static_folder / DIST_DIR / MANIFEST_NAME
+        if path.exists():
+            try:
+                self.manifest = json.loads(path.read_text(encoding='utf-8'))
+            except Exception as e:
+                logger.error(f"读取静态资源清单失败: {str(e)}")
+        if not self.manifest:
+            logger.info("未找到打包后的静态资源，使用源文件")
+
+    def path(self, name: str) -> Optional[str]:
+        """资源在 static 目录下的相对路径，只能使用 CDN 时返回 None"""
+        if name in self.manifest:
+            return self.manifest[name]
+        if name in VENDOR_ASSETS:
+            vendored = f"{VENDOR_DIR}/{VENDOR_ASSETS[name][1]}"
+            return vendored if (self.static_folder / vendored).exists() else None
+        return f"{SOURCE_DIR}/{name}"
+
+    def versioned(self, name: str) -> bool:
+        """地址是否随内容变化（打包后的文件或固定版本的 CDN），可以长期缓存"""
+        return self.path(name) is None or name in self.manifest
+
+    def url(self, name: str) -> str:
+        path = self.path(name)
+        if path is None:
+            return VENDOR_ASSETS[name][0]
+        return url_for('static', filename=path)
+
+    def init_app(self, app):
+        """注册模板函数 asset_url，并为打包后的文件设置不可变缓存"""
+        app.add_template_global(self.url, 'asset_url')
+
+        @app.after_request
+        def cache_immutable_assets(response):
+            filename = (request.view_args or {}).get('filename', '')
+            if request.endpoint == 'static' and filename.startswith(DIST_DIR + '/') and response.status_code == 200:
+                response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+            return response
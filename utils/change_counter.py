@@ -0,0 +1,185 @@
+"""
+图片集合变更计数模块
+
+功能：
+1. 在 counters 集合中为 images 维护按公开状态划分的单调计数（public / private）
+2. 每个修改图片的接口在写入成功后原子 $inc 对应的计数
+3. 缓存和 ETag 以计数作为版本：一次按 _id 的读取即可判断数据是否变化，无需重新查询
+4. 可选：运行在副本集上时通过 change stream 感知脚本或 mongo shell 的直接修改，
+   且读取版本不再访问数据库
+
+change stream 模式下，各进程把图片变更的 clusterTime 用 $max 写入计数文档（stream_public /
+stream_private），并监听计数文档本身；版本始终由计数文档得出，所有进程对相同数据给出相同的版本，
+接口写入后同步调用的 bump() 也会立即改变本进程的版本。
+
+计数先写数据、后递增：读到旧版本时最多把新数据缓存在旧版本下，不会出现新版本对应旧数据。
+"""
+
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from .tag_stats import visibility_key
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ('public', 'private')
+
+# 只修改这些字段的变更不影响图片展示（后台线程的认领标记）
+DEFAULT_IGNORED_FIELDS = frozenset({
+    'reap_claim', 'reap_claimed_at', 'variant_claim', 'variant_claimed_at'
+})
+
+
+def scopes_for(images: Iterable[dict]) -> set:
+    """图片记录涉及的公开状态"""
+    return {visibility_key(image.get('is_public')) for image in images}
+
+
+class ChangeCounter:
+    """images 集合的变更计数"""
+
+    def __init__(self, collection, name: str = 'images'):
+        """
+        Args:
+            collection: counters 集合
+            name: 计数文档的 _id
+        """
+        self.collection = collection
+        self.name = name
+
+        # change stream 模式下本进程缓存的版本（公开状态 -> (计数, 最后一次变更的 clusterTime)）
+        self._stream_versions: Optional[Dict[str, Tuple[int, int]]] = None
+        self._lock = threading.Lock()
+        self._ignored_fields = DEFAULT_IGNORED_FIELDS
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def watching(self) -> bool:
+        return self._stream_versions is not None
+
+    def bump(self, scopes: Iterable[str] = SCOPES):
+        """
+        递增计数，在写入图片成功后调用
+
+        Args:
+            scopes: 'public' / 'private' 的集合，默认两者都递增；为空时不做任何操作
+        """
+        wanted = set(scopes)
+        scopes = [scope for scope in SCOPES if scope in wanted]
+        if not scopes:
+            return
+        update = {'$inc': {scope: 1 for scope in scopes}}
+        if self._stream_versions is None:
+            self.collection.update_one({'_id': self.name}, update, upsert=True)
+            return
+        # change stream 模式下用写入后的文档立即更新本进程的版本，写后读不会命中旧缓存
+        doc = self.collection.find_one_and_update(
+            {'_id': self.name}, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        self._merge(doc)
+
+    def versions(self) -> Dict[str, object]:
+        """返回 {'public': 版本, 'private': 版本}"""
+        stream_versions = self._stream_versions
+        if stream_versions is not None:
+            return {scope: self._format(stream_versions[scope]) for scope in SCOPES}
+        doc = self.collection.find_one({'_id': self.name}) or {}
+        return {scope: self._format(self._read(doc, scope)) for scope in SCOPES}
+
+    @staticmethod
+    def _read(doc: dict, scope: str) -> Tuple[int, int]:
+        return doc.get(scope, 0), doc.get(f'stream_{scope}', 0)
+
+    @staticmethod
+    def _format(version: Tuple[int, int]) -> str:
+        return f"{version[0]}.{version[1]}"
+
+    def _merge(self, doc: Optional[dict]):
+        """合并计数文档到本进程的版本；两个分量都单调递增，取较大值避免读到较早的文档时版本倒退"""
+        if not doc:
+            return
+        with self._lock:
+            current = self._stream_versions
+            if current is None:
+                return
+            merged = {}
+            for scope in SCOPES:
+                count, stream = self._read(doc, scope)
+                merged[scope] = (max(count, current[scope][0]), max(stream, current[scope][1]))
+            self._stream_versions = merged
+
+    def watch(self, images_collection, ignored_fields: Iterable[str] = DEFAULT_IGNORED_FIELDS) -> bool:
+        """
+        在副本集上启动 change stream 监听线程，由变更事件推导版本
+
+        Returns:
+            是否已启动（单机 MongoDB 不支持 change stream，返回 False）
+        """
+        try:
+            hello = images_collection.database.client.admin.command('hello')
+        except Exception as e:
+            logger.error(f"检测 MongoDB 副本集失败: {str(e)}")
+            return False
+        if not hello.get('setName'):
+            logger.info("MongoDB 未运行在副本集上，变更计数由接口维护")
+            return False
+
+        self._ignored_fields = frozenset(ignored_fields)
+        pipeline = [{'$match': {'$or': [
+            {'ns.coll': images_collection.name},
+            {'ns.coll': self.collection.name, 'documentKey._id': self.name},
+        ]}}]
+        try:
+            stream = images_collection.database.watch(pipeline, full_document='updateLookup')
+        except Exception as e:
+            logger.error(f"启动 change stream 失败: {str(e)}")
+            return False
+        # 先打开 stream 再读取计数文档：之后的变更都会从 stream 收到，初始版本取自共享的计数文档
+        doc = self.collection.find_one({'_id': self.name}) or {}
+        self._stream_versions = {scope: self._read(doc, scope) for scope in SCOPES}
+        self._thread = threading.Thread(
+            target=self._run, args=(stream, images_collection.name), name='change-stream', daemon=True
+        )
+        self._thread.start()
+        logger.info("已通过 change stream 监听图片变更")
+        return True
+
+    def _run(self, stream, images_name: str):
+        try:
+            with stream:
+                for change in stream:
+                    if change.get('ns', {}).get('coll') != images_name:
+                        # 计数文档的变更（本进程或其它进程的 bump / $max）
+                        self._merge(change.get('fullDocument'))
+                        continue
+                    scopes = self._scopes_for_change(change)
+                    if not scopes:
+                        continue
+                    # 各进程写入相同的 clusterTime，$max 保证只有第一次写入生效
+                    cluster_time = change['clusterTime']
+                    stamp = (cluster_time.time << 32) | cluster_time.inc
+                    self.collection.update_one(
+                        {'_id': self.name},
+                        {'$max': {f'stream_{scope}': stamp for scope in scopes}},
+                        upsert=True
+                    )
+        except Exception as e:
+            logger.error(f"change stream 中断，退回接口维护的变更计数: {str(e)}")
+        self._stream_versions = None
+
+    def _scopes_for_change(self, change) -> set:
+        operation = change.get('operationType')
+        if operation in ('insert', 'replace', 'update'):
+            description = change.get('updateDescription') or {}
+            fields = set(description.get('updatedFields') or {}) | set(description.get('removedFields') or [])
+            if operation == 'update' and fields and fields <= self._ignored_fields:
+                return set()
+            document = change.get('fullDocument')
+            if document is None or 'is_public' in fields:
+                return set(SCOPES)
+            return {visibility_key(document.get('is_public'))}
+        # 删除、集合重命名或删除等事件
+        return set(SCOPES)
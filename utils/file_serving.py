@@ -0,0 +1,188 @@
+"""
+图片文件分段下载模块
+
+功能：
+1. FileStatCache：缓存文件的大小、修改时间和 ETag，条件请求和分段请求共用，避免每次 stat
+2. parse_ranges：解析 Range 请求头（单段、多段、后缀范围），合并重叠的范围
+3. if_range_matches：按 ETag（强比较）或 Last-Modified 校验 If-Range，文件变化时返回完整内容
+4. range_response：返回 206 响应，单段直接返回片段，多段返回 multipart/byteranges
+
+移动端下载原图中断后可以从断点续传，客户端也可以只读取文件头部的 EXIF。
+"""
+
+import os
+import stat
+import uuid
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional, Tuple
+
+from flask import Response
+from werkzeug.http import http_date, parse_date
+
+from .response_cache import ResponseCache
+
+# 单个请求最多接受的范围数量，超过时忽略 Range 返回完整文件
+MAX_RANGES = 16
+CHUNK_SIZE = 64 * 1024
+
+
+class FileInfo(NamedTuple):
+    size: int
+    mtime: float
+    etag: str  # 不带引号的强 ETag
+
+    @property
+    def last_modified(self) -> datetime:
+        return datetime.fromtimestamp(self.mtime, tz=timezone.utc)
+
+
+class FileStatCache:
+    """文件元信息缓存（短有效期，文件被替换后最多延迟一个有效期）"""
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 5.0):
+        self._cache = ResponseCache(max_entries=max_entries, ttl=ttl)
+
+    def get(self, path: str) -> FileInfo:
+        """返回文件信息，文件不存在时抛出 FileNotFoundError（不缓存）"""
+        return self._cache.get_or_compute(path, lambda: self._stat(path))
+
+    @staticmethod
+    def _stat(path: str) -> FileInfo:
+        stats = os.stat(path)
+        if not stat.S_ISREG(stats.st_mode):
+            raise FileNotFoundError(path)
+        return FileInfo(stats.st_size, stats.st_mtime, f"{stats.st_mtime_ns}-{stats.st_size}")
+
+
+def parse_ranges(header: Optional[str], size: int, max_ranges: int = MAX_RANGES) -> Optional[List[Tuple[int, int]]]:
+    """
+    解析 Range 请求头
+
+    Args:
+        header: Range 请求头，如 "bytes=0-1023,-512"
+        size: 文件大小
+
+    Returns:
+        None 表示忽略 Range（格式错误、不支持的单位或范围过多），返回完整文件；
+        空列表表示所有范围都无法满足（416）；
+        否则为合并后按起始位置排序的 [(start, end)]，end 包含在内
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec.strip():
+        return None
+
+    parts = [part.strip() for part in spec.split(',')]
+    if len(parts) > max_ranges:
+        return None
+
+    ranges = []
+    for part in parts:
+        first, dash, last = part.partition('-')
+        first, last = first.strip(), last.strip()
+        if not dash or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            # 后缀范围：最后 N 个字节
+            if not last:
+                return None
+            length = int(last)
+            if length > 0 and size > 0:
+                ranges.append((max(size - length, 0), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = int(last) if last else size - 1
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+
+    # 合并重叠或相邻的范围
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(if_range: Optional[str], info: FileInfo) -> bool:
+    """If-Range 是否仍然有效（没有该请求头时视为有效）"""
+    if not if_range:
+        return True
+    value = if_range.strip()
+    if value.startswith('W/'):
+        # 弱 ETag 不能用于 If-Range
+        return False
+    if value.startswith('"'):
+        return value == f'"{info.etag}"'
+    date = parse_date(value)
+    return date is not None and int(date.timestamp()) == int(info.mtime)
+
+
+def _read(path: str, ranges: List[Tuple[int, int]], separators: Optional[List[bytes]] = None, closing: bytes = b''):
+    """按范围流式读取文件，separators 为每段之前输出的分隔内容"""
+    with open(path, 'rb') as f:
+        for index, (start, end) in enumerate(ranges):
+            if separators:
+                yield separators[index]
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    if closing:
+        yield closing
+
+
+def range_response(path: str, info: FileInfo, ranges: List[Tuple[int, int]], mimetype: str) -> Response:
+    """
+    生成 206 分段响应
+
+    Args:
+        path: 文件路径
+        info: 文件信息
+        ranges: parse_ranges 返回的非空范围列表
+        mimetype: 文件类型
+    """
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        response = Response(_read(path, ranges), status=206, mimetype=mimetype, direct_passthrough=True)
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{info.size}'
+        response.content_length = end - start + 1
+        return response
+
+    boundary = uuid.uuid4().hex
+    separators = [
+        (f'\r\n--{boundary}\r\n'
+         f'Content-Type: {mimetype}\r\n'
+         f'Content-Range: bytes {start}-{end}/{info.size}\r\n\r\n').encode('ascii')
+        for start, end in ranges
+    ]
+    closing = f'\r\n--{boundary}--\r\n'.encode('ascii')
+    length = sum(len(sep) for sep in separators) + sum(end - start + 1 for start, end in ranges) + len(closing)
+
+    response = Response(
+        _read(path, ranges, separators, closing), status=206,
+        content_type=f'multipart/byteranges; boundary={boundary}', direct_passthrough=True
+    )
+    response.content_length = length
+    return response
+
+
+def range_not_satisfiable(info: FileInfo) -> Response:
+    """416 响应（不可缓存）"""
+    response = Response('Range Not Satisfiable', status=416)
+    response.headers['Content-Range'] = f'bytes */{info.size}'
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def last_modified_header(info: FileInfo) -> str:
+    return http_date(info.last_modified)
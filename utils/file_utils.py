@@ -13,15 +13,46 @@
 
 from pathlib import Path
 import os
+import hashlib
 import piexif
 from PIL import Image
 from werkzeug.utils import secure_filename
 import logging
 from datetime import datetime
 from .image_processor import ImageProcessor
+from .metrics import timed, timed_stage
+from .phash import from_hex, hash_fields
+from .variant_specs import VARIANT_SPECS
 
 logger = logging.getLogger(__name__)
 
+# 允许上传和导入的图片扩展名
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+
+
+def unique_upload_path(upload_folder, filename):
+    """
+    在上传目录下占用一个不与已有文件重名的保存路径（重名时添加 _1、_2 ... 后缀）
+
+    以 O_CREAT | O_EXCL 原子地创建空的占位文件，网页上传和目录导入并发选择同名文件时
+    只有一方成功，另一方换用下一个后缀，不会覆盖对方写入的原图。
+    调用方随后写入内容；写入失败时需要删除占位文件。
+
+    Returns:
+        已创建占位文件的保存路径
+    """
+    first = Path(upload_folder) / filename
+    counter = 0
+    while True:
+        save_path = first if counter == 0 else first.with_name(f"{first.stem}_{counter}{first.suffix}")
+        try:
+            fd = os.open(str(save_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            counter += 1
+            continue
+        os.close(fd)
+        return save_path
+
 
 def save_image(file, upload_folder, generate_variants=True):
     """
@@ -39,6 +70,10 @@ def save_image(file, upload_folder, generate_variants=True):
             'thumbnail_path': 缩略图路径（可能为 None）,
             'webp_path': WebP 路径（可能为 None）,
             'filename': 文件名,
+            'content_hash': 原图内容的 SHA-256（十六进制）,
+            'features': 缩略图特征，可直接写入数据库
+                        （dhash、dhash_bands、width、height、dominant_color、blurhash）,
+            'variant_versions': {变体名称: 生成时的规格版本},
             'file_sizes': {
                 'original': 原图大小,
                 'thumbnail': 缩略图大小,
@@ -49,35 +84,29 @@ def save_image(file, upload_folder, generate_variants=True):
     try:
         # 保留原始文件名，但确保安全
         filename = secure_filename(file.filename)
-        # 使用pathlib处理路径
-        upload_path = Path(upload_folder)
-        save_path = upload_path / filename
-        
-        # 如果文件已存在，添加数字后缀
-        counter = 1
-        while save_path.exists():
-            stem = save_path.stem
-            # 如果文件名已经有数字后缀，移除它
-            if stem.endswith(f'_{counter-1}'):
-                stem = stem.rsplit('_', 1)[0]
-            new_name = f"{stem}_{counter}{save_path.suffix}"
-            save_path = save_path.with_name(new_name)
-            counter += 1
+        # 如果文件已存在，添加数字后缀（原子地占用保存路径）
+        save_path = unique_upload_path(upload_folder, filename)
             
         # 保存原图
-        file.save(str(save_path))
+        with timed('file_write'):
+            try:
+                file.save(str(save_path))
+            except Exception:
+                save_path.unlink(missing_ok=True)
+                raise
         logger.info(f"Successfully saved image to {save_path.as_posix()}")
         
         # 初始化返回结果
         result = {
             'original_path': str(save_path),
-            'thumbnail_path': None,
-            'webp_path': None,
+            'content_hash': file_sha256(save_path),
+            **{spec.field: None for spec in VARIANT_SPECS.values()},
             'filename': save_path.name,
+            'features': {},
+            'variant_versions': {},
             'file_sizes': {
                 'original': save_path.stat().st_size,
-                'thumbnail': 0,
-                'webp': 0
+                **{name: 0 for name in VARIANT_SPECS}
             }
         }
         
@@ -87,19 +116,20 @@ def save_image(file, upload_folder, generate_variants=True):
                 processor = ImageProcessor(upload_folder)
                 processed = processor.process_image(str(save_path))
                 
-                result['thumbnail_path'] = processed.get('thumbnail')
-                result['webp_path'] = processed.get('webp')
-                
-                # 更新文件大小
-                if result['thumbnail_path']:
-                    result['file_sizes']['thumbnail'] = Path(result['thumbnail_path']).stat().st_size
-                if result['webp_path']:
-                    result['file_sizes']['webp'] = Path(result['webp_path']).stat().st_size
+                for name, spec in VARIANT_SPECS.items():
+                    result[spec.field] = processed.get(name)
+                    # 更新文件大小
+                    if result[spec.field]:
+                        result['file_sizes'][name] = Path(result[spec.field]).stat().st_size
+                result['variant_versions'] = processed.get('versions', {})
+                result['features'] = dict(processed.get('features') or {})
+                if result['features'].get('dhash'):
+                    result['features'].update(hash_fields(from_hex(result['features']['dhash'])))
                 
                 logger.info(
-                    f"Image processing completed: {filename} "
-                    f"(thumbnail: {bool(result['thumbnail_path'])}, "
-                    f"webp: {bool(result['webp_path'])})"
+                    f"Image processing completed: {filename} ("
+                    + ', '.join(f"{name}: {bool(result[spec.field])}" for name, spec in VARIANT_SPECS.items())
+                    + ")"
                 )
             except Exception as e:
                 logger.error(f"Error generating variants for {filename}: {str(e)}")
@@ -112,6 +142,72 @@ def save_image(file, upload_folder, generate_variants=True):
         raise
 
 
+def build_image_document(save_result, metadata, processing_status='completed'):
+    """
+    根据 save_image 结果和元数据构造新图片记录（网页上传和目录导入共用）
+
+    Args:
+        save_result: save_image 的返回值
+        metadata: get_image_metadata 的返回值
+        processing_status: 变体处理状态，只保存原图时为 'pending'
+    """
+    now = datetime.now()
+    return {
+        'filename': save_result['filename'],
+        'path': save_result['original_path'],
+        **{spec.field: save_result.get(spec.field) for spec in VARIANT_SPECS.values()},
+        **{spec.flag: bool(save_result.get(spec.field)) for spec in VARIANT_SPECS.values()},
+        'file_sizes': save_result.get('file_sizes', {}),
+        'upload_time': now,
+        'photo_time': metadata.get('photo_time', now),  # 使用拍摄时间
+        'year': metadata.get('year', now.year),  # 年份
+        'month': metadata.get('month', now.month),  # 月份
+        'metadata': metadata,
+        'is_public': True,  # 默认设置为公开
+        'likes': 0,
+        'tags': [],
+        'processing_status': processing_status,
+        'content_hash': save_result.get('content_hash'),
+        'variant_versions': save_result.get('variant_versions', {}),  # 各变体的生成规格版本
+        **save_result.get('features', {})  # 感知哈希等缩略图特征
+    }
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """计算文件内容的 SHA-256，与浏览器端 crypto.subtle.digest('SHA-256') 结果一致"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _decode_exif_text(value):
+    """将 EXIF 中的字节串解码为去除空白和结尾 NUL 的字符串"""
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', errors='ignore')
+    value = str(value).strip().strip('\x00').strip()
+    return value or None
+
+
+def _read_camera_info(exif_dict):
+    """从 piexif 结果中提取相机厂商、型号和镜头型号"""
+    info = {}
+    fields = {
+        'camera_make': ('0th', piexif.ImageIFD.Make),
+        'camera_model': ('0th', piexif.ImageIFD.Model),
+        'lens_model': ('Exif', piexif.ExifIFD.LensModel),
+    }
+    for key, (ifd, tag) in fields.items():
+        value = exif_dict.get(ifd, {}).get(tag)
+        if value is not None:
+            text = _decode_exif_text(value)
+            if text:
+                info[key] = text
+    return info
+
+
+@timed_stage('exif')
 def get_image_metadata(image_path):
     """
     获取图片的EXIF元数据，包括拍摄时间
@@ -156,6 +252,12 @@ def get_image_metadata(image_path):
                         photo_time = datetime.strptime(date_str, '%Y:%m:%d %H:%M:%S')
                 except (ValueError, KeyError) as e:
                     logger.warning(f"Error parsing EXIF date for {image_path.name}: {str(e)}")
+                
+                # 相机和镜头信息（用于搜索和分面统计）
+                try:
+                    metadata.update(_read_camera_info(piexif.load(img.info['exif'])))
+                except Exception as e:
+                    logger.warning(f"Error parsing EXIF camera info for {image_path.name}: {str(e)}")
             
             # 保存拍摄时间
             metadata['photo_time'] = photo_time
@@ -167,3 +269,67 @@ def get_image_metadata(image_path):
     except Exception as e:
         logger.error(f"Error getting image metadata: {str(e)}")
         return {}
+
+
+# 各文件变体所在的子目录及数据库字段
+VARIANT_LOCATIONS = {
+    'original': ('', 'path'),
+    **{name: (spec.folder, spec.field) for name, spec in VARIANT_SPECS.items()},
+}
+
+
+def get_variant_paths(image, upload_folder):
+    """
+    获取一条图片记录对应的所有文件路径（原图、缩略图、WebP）
+
+    数据库中的路径可能是绝对路径、相对路径或 Windows 风格路径，
+    如果记录的路径不可用，则回退到 上传目录/子目录/文件名。
+
+    Args:
+        image: 图片记录
+        upload_folder: 上传文件夹路径
+
+    Returns:
+        {变体名称: Path} 字典，只包含记录中存在的变体
+    """
+    upload_path = Path(upload_folder)
+    paths = {}
+
+    for variant, (subdir, field) in VARIANT_LOCATIONS.items():
+        path_value = image.get(field)
+        if not path_value and variant == 'original':
+            path_value = image.get('filename')
+        if not path_value:
+            continue
+
+        path_value = str(path_value).replace('\\', '/')
+        candidate = Path(path_value)
+        if not candidate.is_absolute() or not candidate.exists():
+            folder = upload_path / subdir if subdir else upload_path
+            candidate = folder / path_value.rsplit('/', 1)[-1]
+        paths[variant] = candidate
+
+    return paths
+
+
+def remove_image_files(image, upload_folder):
+    """
+    删除一条图片记录对应的所有文件，忽略已不存在的文件
+
+    Args:
+        image: 图片记录
+        upload_folder: 上传文件夹路径
+
+    Returns:
+        实际删除的文件数量
+    """
+    removed = 0
+    for variant, path in get_variant_paths(image, upload_folder).items():
+        try:
+            path.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"删除文件失败 {path}: {str(e)}")
+    return removed
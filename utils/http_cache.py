@@ -0,0 +1,146 @@
+"""
+JSON 接口条件请求与压缩模块
+
+功能：
+1. EncodedBody：序列化后的响应体，附带强 ETag，并缓存 gzip/brotli 压缩结果
+2. not_modified：If-None-Match 命中时直接返回 304，调用方可以在查询和序列化之前检查
+3. json_response：按 Accept-Encoding 选择压缩格式，响应体小于阈值时不压缩
+4. brotli 为可选依赖，未安装时只使用 gzip
+
+EncodedBody 可以直接放进 ResponseCache，压缩结果随缓存条目一起复用，
+同一页面的重复请求既不重新查询，也不重新序列化和压缩。
+"""
+
+import gzip
+import hashlib
+from typing import Dict, Optional
+
+from flask import Response
+
+from .metrics import timed
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli 为可选依赖
+    brotli = None
+
+# 小于该大小的响应体不压缩（字节）
+DEFAULT_MIN_SIZE = 1024
+
+# 压缩格式 -> ETag 后缀（同一内容的不同编码使用不同的强 ETag）
+_SUFFIXES = {'br': '-br', 'gzip': '-gz'}
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def make_etag(data: bytes) -> str:
+    """根据内容计算 ETag"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def negotiate_encoding(accept_encodings) -> Optional[str]:
+    """
+    根据 Accept-Encoding 选择压缩格式
+
+    Args:
+        accept_encodings: request.accept_encodings
+
+    Returns:
+        'br'、'gzip' 或 None（不压缩）
+    """
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def matched_etag(etag: str, if_none_match) -> Optional[str]:
+    """返回 If-None-Match 中与 etag（任一编码）匹配的值，不匹配时返回 None"""
+    if not if_none_match:
+        return None
+    if if_none_match.star_tag:
+        return etag
+    for candidate in [etag] + [etag + suffix for suffix in _SUFFIXES.values()]:
+        if if_none_match.contains_weak(candidate):
+            return candidate
+    return None
+
+
+def _finish(response: Response, etag: str, cache_control: str) -> Response:
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def not_modified(etag: str, request, cache_control: str = 'no-cache') -> Optional[Response]:
+    """客户端缓存仍有效时返回 304 响应，否则返回 None"""
+    matched = matched_etag(etag, request.if_none_match)
+    if matched is None:
+        return None
+    # 回传客户端持有的那个编码的 ETag
+    return _finish(Response(status=304), matched, cache_control)
+
+
+class EncodedBody:
+    """序列化后的 JSON 响应体及其压缩版本"""
+
+    def __init__(self, data: bytes, etag: Optional[str] = None):
+        """
+        Args:
+            data: 序列化后的响应体
+            etag: 预先计算的 ETag（如由数据版本得出），默认根据内容计算
+        """
+        self.data = data
+        self.etag = etag or make_etag(data)
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: Optional[str], min_size: int = DEFAULT_MIN_SIZE):
+        """
+        返回指定编码的响应体
+
+        Returns:
+            (响应体, 实际使用的编码)，不压缩时编码为 None
+        """
+        if encoding is None or len(self.data) < min_size:
+            return self.data, None
+        body = self._encoded.get(encoding)
+        if body is None:
+            # 并发请求可能重复压缩同一内容，结果相同，直接覆盖即可
+            with timed('compress'):
+                body = _compress(self.data, encoding)
+            self._encoded[encoding] = body
+        return body, encoding
+
+
+def json_response(
+    body: EncodedBody,
+    request,
+    min_size: int = DEFAULT_MIN_SIZE,
+    cache_control: str = 'no-cache'
+) -> Response:
+    """
+    生成带 ETag 的 JSON 响应，客户端缓存仍有效时返回 304
+
+    Args:
+        body: 序列化后的响应体
+        request: 当前请求
+        min_size: 压缩阈值（字节）
+        cache_control: Cache-Control 响应头，默认要求浏览器每次重新验证
+    """
+    response = not_modified(body.etag, request, cache_control)
+    if response is not None:
+        return response
+
+    data, encoding = body.encoded(negotiate_encoding(request.accept_encodings), min_size)
+    response = Response(data, mimetype='application/json')
+    etag = body.etag
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+        etag += _SUFFIXES[encoding]
+    return _finish(response, etag, cache_control)
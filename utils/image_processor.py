@@ -4,6 +4,7 @@
 功能：
 1. 生成保持宽高比的缩略图
 2. 转换为 WebP 格式
+   （生成参数见 variant_specs.VARIANT_SPECS，文件名包含规格版本）
 3. 管理文件路径
 4. 错误处理和日志记录
 
@@ -16,7 +17,12 @@ import os
 import logging
 from pathlib import Path
 from PIL import Image
-from typing import Tuple, Optional, Dict
+from typing import Tuple, Optional, Dict, Iterable
+
+from .metrics import timed, timed_stage
+from .variant_specs import VARIANT_SPECS, VariantSpec
+from .phash import dhash, to_hex
+from .placeholder import placeholder_features
 
 logger = logging.getLogger(__name__)
 
@@ -32,40 +38,38 @@ class ImageProcessor:
             upload_folder: 上传文件夹路径
         """
         self.upload_folder = Path(upload_folder)
-        self.thumbnail_folder = self.upload_folder / 'thumbnails'
-        self.webp_folder = self.upload_folder / 'webp'
+        self.thumbnail_folder = self._folder(VARIANT_SPECS['thumbnail'])
+        self.webp_folder = self._folder(VARIANT_SPECS['webp'])
         
         # 确保目录存在
         self._ensure_directories()
     
     def _ensure_directories(self):
         """确保所有必要的目录存在"""
-        self.thumbnail_folder.mkdir(parents=True, exist_ok=True)
-        self.webp_folder.mkdir(parents=True, exist_ok=True)
-        logger.info(f"图片处理目录已创建: {self.thumbnail_folder}, {self.webp_folder}")
+        folders = [self._folder(spec) for spec in VARIANT_SPECS.values()]
+        for folder in folders:
+            folder.mkdir(parents=True, exist_ok=True)
+        logger.info(f"图片处理目录已创建: {', '.join(str(folder) for folder in folders)}")
     
-    def generate_thumbnail(
-        self, 
-        input_path: str, 
-        max_size: int = 600,
-        quality: int = 95
-    ) -> Optional[str]:
+    def _folder(self, spec: VariantSpec) -> Path:
+        return self.upload_folder / spec.folder
+
+    def _render(self, input_path: str, spec: VariantSpec, features: Optional[Dict] = None) -> Optional[str]:
         """
-        生成保持宽高比的缩略图
-        
+        按变体规格生成 WebP 文件
+
         Args:
             input_path: 原图路径
-            max_size: 最长边的最大尺寸（默认 200px）
-            quality: WebP 质量（1-100，默认 85）
-        
+            spec: 变体规格（VARIANT_SPECS 中的一项）
+            features: 可选的字典，传入时会填充基于输出图片计算的特征
+
         Returns:
-            缩略图路径，失败返回 None
-        
-        示例:
-            横向照片 4000x3000 → 200x150px
-            竖向照片 3000x4000 → 150x200px
-            全景照片 6000x2000 → 200x67px
+            变体文件路径（文件名包含规格版本），失败返回 None
         """
+        with timed(spec.name):
+            return self._render_file(input_path, spec, features)
+
+    def _render_file(self, input_path, spec: VariantSpec, features: Optional[Dict]) -> Optional[str]:
         try:
             input_path = Path(input_path)
             
@@ -74,9 +78,7 @@ class ImageProcessor:
                 logger.error(f"原图不存在: {input_path}")
                 return None
             
-            # 生成缩略图文件名（保持原文件名，改为 .webp）
-            thumbnail_name = input_path.stem + '.webp'
-            thumbnail_path = self.thumbnail_folder / thumbnail_name
+            output_path = self._folder(spec) / spec.filename(input_path.stem)
             
             # 打开图片
             with Image.open(input_path) as img:
@@ -93,159 +95,157 @@ class ImageProcessor:
                 
                 # 记录原始尺寸
                 original_size = img.size
+                original_file_size = input_path.stat().st_size
                 
-                # 使用 thumbnail 方法，自动保持宽高比
-                # 最长边不超过 max_size
-                img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+                # 使用 thumbnail 方法，自动保持宽高比，最长边不超过 max_size
+                if spec.max_size:
+                    img.thumbnail((spec.max_size, spec.max_size), Image.Resampling.LANCZOS)
                 
                 # 保存为 WebP 格式
                 img.save(
-                    str(thumbnail_path), 
+                    str(output_path), 
                     'WEBP', 
-                    quality=quality, 
-                    method=6  # 最佳压缩
+                    quality=spec.quality, 
+                    method=spec.method
                 )
                 
-                # 记录缩略图尺寸
-                thumbnail_size = img.size
-                file_size = thumbnail_path.stat().st_size
+                # 基于已缩小的图片计算特征，避免再次解码原图
+                if features is not None:
+                    features.update(self.compute_features(img, original_size))
                 
+                # 记录文件大小
+                file_size = output_path.stat().st_size
                 logger.info(
-                    f"缩略图生成成功: {input_path.name} "
-                    f"{original_size} → {thumbnail_size} "
-                    f"({file_size / 1024:.1f}KB)"
+                    f"{spec.name} 生成成功: {input_path.name} "
+                    f"{original_size} → {img.size} "
+                    f"{original_file_size / 1024:.1f}KB → {file_size / 1024:.1f}KB "
+                    f"(规格 {spec.version})"
                 )
                 
-                return str(thumbnail_path)
+                return str(output_path)
         
         except Exception as e:
-            logger.error(f"生成缩略图失败 {input_path}: {str(e)}")
+            logger.error(f"生成 {spec.name} 失败 {input_path}: {str(e)}")
             return None
     
-    def generate_webp(
+    def generate_thumbnail(
         self, 
         input_path: str, 
-        quality: int = 85
+        features: Optional[Dict] = None
     ) -> Optional[str]:
         """
-        转换为 WebP 格式（保持原尺寸）
+        生成保持宽高比的缩略图（参数见 VARIANT_SPECS['thumbnail']）
         
         Args:
             input_path: 原图路径
-            quality: WebP 质量（1-100，默认 85）
+            features: 可选的字典，传入时会填充基于缩略图计算的特征
+                      （dhash: 感知哈希十六进制字符串；width/height: 原图尺寸；
+                      dominant_color: 主色调；blurhash: 模糊占位符）
         
         Returns:
-            WebP 文件路径，失败返回 None
+            缩略图路径，失败返回 None
+        
+        示例（最长边 600px）:
+            横向照片 4000x3000 → 600x450px
+            竖向照片 3000x4000 → 450x600px
+            全景照片 6000x2000 → 600x200px
         """
-        try:
-            input_path = Path(input_path)
-            
-            # 检查原图是否存在
-            if not input_path.exists():
-                logger.error(f"原图不存在: {input_path}")
-                return None
-            
-            # 生成 WebP 文件名
-            webp_name = input_path.stem + '.webp'
-            webp_path = self.webp_folder / webp_name
-            
-            # 打开图片
-            with Image.open(input_path) as img:
-                # 转换 RGBA 或 P 模式为 RGB
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    # 创建白色背景
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # 记录原始尺寸
-                original_size = img.size
-                original_file_size = input_path.stat().st_size
-                
-                # 保存为 WebP 格式（保持原尺寸）
-                img.save(
-                    str(webp_path), 
-                    'WEBP', 
-                    quality=quality, 
-                    method=6  # 最佳压缩
-                )
-                
-                # 记录文件大小
-                webp_file_size = webp_path.stat().st_size
-                compression_ratio = (1 - webp_file_size / original_file_size) * 100
-                
-                logger.info(
-                    f"WebP 转换成功: {input_path.name} "
-                    f"{original_size} "
-                    f"{original_file_size / 1024:.1f}KB → {webp_file_size / 1024:.1f}KB "
-                    f"(压缩 {compression_ratio:.1f}%)"
-                )
-                
-                return str(webp_path)
+        return self._render(input_path, VARIANT_SPECS['thumbnail'], features=features)
+    
+    @staticmethod
+    @timed_stage('features')
+    def compute_features(img: Image.Image, original_size: Tuple[int, int]) -> Dict:
+        """
+        基于缩略图计算写入数据库的特征
+
+        Args:
+            img: 已缩小的 RGB 图片
+            original_size: 原图尺寸 (width, height)
+
+        Returns:
+            {'dhash', 'width', 'height', 'dominant_color', 'blurhash'}
+        """
+        features = {'dhash': to_hex(dhash(img))}
+        features.update(placeholder_features(img, original_size))
+        return features
+    
+    def extract_features(self, thumbnail_path: str, original_path: str) -> Dict:
+        """
+        从已有缩略图补算特征（用于历史图片），失败返回空字典
         
+        Args:
+            thumbnail_path: 缩略图路径
+            original_path: 原图路径（只读取文件头获取尺寸）
+        """
+        try:
+            original_size = get_image_dimensions(original_path)
+            with Image.open(thumbnail_path) as img:
+                img = img.convert('RGB')
+                return self.compute_features(img, original_size or img.size)
         except Exception as e:
-            logger.error(f"WebP 转换失败 {input_path}: {str(e)}")
-            return None
+            logger.error(f"补算缩略图特征失败 {thumbnail_path}: {str(e)}")
+            return {}
+    
+    def generate_webp(self, input_path: str) -> Optional[str]:
+        """
+        转换为 WebP 格式（保持原尺寸，参数见 VARIANT_SPECS['webp']）
+        
+        Args:
+            input_path: 原图路径
+        
+        Returns:
+            WebP 文件路径，失败返回 None
+        """
+        return self._render(input_path, VARIANT_SPECS['webp'])
     
     def process_image(
         self, 
         input_path: str,
-        thumbnail_size: int = 600,
-        quality: int = 95
+        variants: Optional[Iterable[str]] = None
     ) -> Dict[str, Optional[str]]:
         """
         完整处理图片：生成缩略图和 WebP
         
         Args:
             input_path: 原图路径
-            thumbnail_size: 缩略图最长边尺寸
-            quality: 图片质量
+            variants: 只生成这些变体（VARIANT_SPECS 中的名称），默认全部
         
         Returns:
             包含所有路径的字典:
             {
                 'original': 原图路径,
-                'thumbnail': 缩略图路径,
-                'webp': WebP 路径,
-                'success': 是否全部成功
+                变体名称: 变体路径（thumbnail / webp，见 VARIANT_SPECS）,
+                'features': 缩略图特征（感知哈希、尺寸、占位符）,
+                'versions': {变体名称: 规格版本}，只包含生成成功的变体,
+                'success': 请求的变体是否全部成功
             }
         """
+        variants = list(VARIANT_SPECS) if variants is None else list(variants)
         result = {
             'original': str(input_path),
-            'thumbnail': None,
-            'webp': None,
+            **{name: None for name in VARIANT_SPECS},
+            'features': {},
+            'versions': {},
             'success': False
         }
         
         try:
-            # 生成缩略图
-            thumbnail_path = self.generate_thumbnail(
-                input_path, 
-                max_size=thumbnail_size,
-                quality=quality
-            )
-            result['thumbnail'] = thumbnail_path
-            
-            # 生成 WebP
-            webp_path = self.generate_webp(
-                input_path,
-                quality=quality
-            )
-            result['webp'] = webp_path
+            for name in variants:
+                spec = VARIANT_SPECS[name]
+                features = result['features'] if spec.features else None
+                result[name] = self._render(input_path, spec, features=features)
+                if result[name]:
+                    result['versions'][name] = spec.version
             
             # 判断是否全部成功
-            result['success'] = bool(thumbnail_path and webp_path)
+            result['success'] = all(result[name] for name in variants)
             
             if result['success']:
                 logger.info(f"图片处理完成: {Path(input_path).name}")
             else:
                 logger.warning(
                     f"图片处理部分失败: {Path(input_path).name} "
-                    f"(缩略图: {bool(thumbnail_path)}, WebP: {bool(webp_path)})"
+                    f"({', '.join(f'{name}: {bool(result[name])}' for name in variants)})"
                 )
         
         except Exception as e:
@@ -0,0 +1,438 @@
+"""
+目录导入模块
+
+功能：
+1. FolderIngester.scan：扫描目录树中的图片文件
+2. FolderIngester.ingest：并行计算内容哈希并去重（批内和数据库中已有的文件），
+   复制或移动到上传目录，只读取一次元数据，每批用一次 insert_many 写入数据库
+3. 新图片以 processing_status='pending' 写入，由 VariantWorker 并行生成缩略图和 WebP
+4. FolderIngester.watch：持续监视目录，安装了 watchdog 时使用 inotify 等系统通知，否则定时轮询；
+   文件大小和修改时间在 settle 秒内不再变化后才导入，避免读到正在拷贝的文件
+
+移动模式下只在记录写入成功后删除源文件；重复的文件保留在源目录中，由导入报告列出。
+"""
+
+import os
+import time
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+from werkzeug.utils import secure_filename
+
+from .change_counter import scopes_for
+from .file_utils import (
+    ALLOWED_EXTENSIONS, build_image_document, file_sha256, get_image_metadata,
+    remove_image_files, unique_upload_path
+)
+from .tag_stats import tag_state
+from .variant_worker import VariantWorker
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover - watchdog 为可选依赖
+    Observer = None
+    FileSystemEventHandler = object
+
+logger = logging.getLogger(__name__)
+
+
+def is_image_file(path: Path) -> bool:
+    """是否为可导入的图片（忽略隐藏文件和下载中的临时文件）"""
+    return (
+        not path.name.startswith('.')
+        and path.suffix[1:].lower() in ALLOWED_EXTENSIONS
+    )
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    """收集文件系统事件中出现的图片路径"""
+
+    def __init__(self):
+        self.paths = set()
+        self.directories = set()
+        self.event = threading.Event()
+        self._lock = threading.Lock()
+
+    def _add(self, path: str, is_directory: bool):
+        with self._lock:
+            # 整个目录移入时只有目录事件，需要扫描其中的文件
+            (self.directories if is_directory else self.paths).add(Path(path))
+        self.event.set()
+
+    def on_created(self, event):
+        self._add(event.src_path, event.is_directory)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._add(event.src_path, False)
+
+    def on_moved(self, event):
+        self._add(event.dest_path, event.is_directory)
+
+    def drain(self) -> Tuple[set, set]:
+        with self._lock:
+            paths, directories = self.paths, self.directories
+            self.paths, self.directories = set(), set()
+        return paths, directories
+
+
+class FolderIngester:
+    """把目录中的图片批量导入到上传目录和数据库"""
+
+    def __init__(
+        self,
+        collection,
+        upload_folder: str,
+        change_counter=None,
+        tag_stats=None,
+        workers: Optional[int] = None,
+        batch_size: int = 200,
+        move: bool = False,
+        tags: Optional[List[str]] = None,
+        is_public: bool = True,
+        generate_variants: bool = True,
+        dry_run: bool = False
+    ):
+        """
+        初始化导入器
+
+        Args:
+            collection: images 集合
+            upload_folder: 上传文件夹路径
+            change_counter: 图片变更计数（ChangeCounter），每批写入后递增
+            tag_stats: 标签统计（TagStats），导入时指定了标签才会变化
+            workers: 计算哈希、复制文件和生成变体的并行线程数，默认为 CPU 核数
+            batch_size: 每次 insert_many 写入的图片数量
+            move: 导入成功后删除源文件
+            tags: 为导入的图片添加的标签
+            is_public: 导入的图片是否公开
+            generate_variants: 导入后在本进程中生成缩略图和 WebP（否则由应用的后台线程生成）
+            dry_run: 只计算哈希和去重，不复制文件也不写入数据库
+        """
+        self.collection = collection
+        self.upload_folder = Path(upload_folder)
+        self.change_counter = change_counter
+        self.tag_stats = tag_stats
+        self.workers = workers or os.cpu_count() or 2
+        self.batch_size = batch_size
+        self.move = move
+        self.tags = list(tags or [])
+        self.is_public = is_public
+        self.dry_run = dry_run
+        self.variant_worker = VariantWorker(
+            collection, upload_folder, workers=self.workers, change_counter=change_counter
+        ) if generate_variants else None
+
+        # 路径 -> (大小, 修改时间)，本次运行中已处理过的文件不再重复计算哈希
+        self._seen: Dict[Path, Tuple[int, float]] = {}
+        self.duplicates: List[Tuple[Path, str]] = []
+        self.stats = {
+            'scanned': 0,
+            'ingested': 0,
+            'duplicates': 0,
+            'failed': 0,
+            'bytes': 0,
+            'variants': 0,
+            'hash_seconds': 0.0,
+            'copy_seconds': 0.0,
+            'insert_seconds': 0.0,
+            'variant_seconds': 0.0,
+            'started': time.perf_counter()
+        }
+
+    def _is_upload_file(self, path: Path) -> bool:
+        """源目录包含上传目录时，跳过上传目录中的文件"""
+        return self.upload_folder.resolve() in path.parents
+
+    def scan(self, root) -> List[Path]:
+        """返回目录树中尚未处理过（或处理后又有变化）的图片文件"""
+        files = []
+        for directory, dirnames, filenames in os.walk(root):
+            dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+            for name in filenames:
+                path = Path(directory, name).resolve()
+                if not is_image_file(path) or self._is_upload_file(path):
+                    continue
+                try:
+                    stats = path.stat()
+                except FileNotFoundError:
+                    continue
+                if self._seen.get(path) != (stats.st_size, stats.st_mtime):
+                    files.append(path)
+        return sorted(files)
+
+    def ingest(self, paths: Iterable[Path]) -> int:
+        """
+        导入文件并生成变体
+
+        Returns:
+            新写入的图片数量
+        """
+        paths = list(paths)
+        inserted = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ingest') as executor:
+            for start in range(0, len(paths), self.batch_size):
+                inserted += self._ingest_batch(paths[start:start + self.batch_size], executor)
+
+            if inserted and self.variant_worker is not None and not self.dry_run:
+                started = time.perf_counter()
+                # 认领全部待处理图片（包括网页批量上传的），直到处理完
+                while True:
+                    count = self.variant_worker.process_once(executor)
+                    if not count:
+                        break
+                    self.stats['variants'] += count
+                self.stats['variant_seconds'] += time.perf_counter() - started
+        return inserted
+
+    def _reserve(self, filename: str) -> Optional[Path]:
+        """
+        创建占位文件，占用上传目录中的保存路径（与网页上传共用 unique_upload_path 的原子创建）
+
+        Returns:
+            保存路径，无法创建时返回 None
+        """
+        try:
+            return unique_upload_path(self.upload_folder, filename)
+        except OSError as e:
+            logger.error(f"创建文件失败 {filename}: {str(e)}")
+            return None
+
+    def _hash(self, path: Path):
+        try:
+            stats = path.stat()
+            return path, file_sha256(path), stats
+        except OSError as e:
+            logger.error(f"读取文件失败 {path}: {str(e)}")
+            return path, None, None
+
+    def _ingest_batch(self, paths: List[Path], executor: ThreadPoolExecutor) -> int:
+        self.stats['scanned'] += len(paths)
+
+        # 1. 并行计算内容哈希
+        started = time.perf_counter()
+        hashed = list(executor.map(self._hash, paths))
+        self.stats['hash_seconds'] += time.perf_counter() - started
+
+        # 2. 去重：批内重复和数据库中已有的文件（软删除时会移除 content_hash，已删除的图片可以重新导入）
+        hashes = {content_hash for _, content_hash, _ in hashed if content_hash}
+        existing = {
+            doc['content_hash'] for doc in
+            self.collection.find({'content_hash': {'$in': list(hashes)}}, {'content_hash': 1})
+        } if hashes else set()
+
+        candidates = []
+        for path, content_hash, stats in hashed:
+            if content_hash is None:
+                self.stats['failed'] += 1
+                continue
+            self._seen[path] = (stats.st_size, stats.st_mtime)
+            if content_hash in existing:
+                self._duplicate(path, content_hash)
+                continue
+            existing.add(content_hash)
+            candidates.append((path, content_hash, stats))
+
+        if self.dry_run or not candidates:
+            if self.dry_run:
+                logger.info(f"[DRY RUN] 将导入 {len(candidates)} 个文件")
+            return 0
+
+        # 3. 依次确定保存路径并创建占位文件（避免与并行的文件名或网页上传冲突），再并行复制和读取元数据
+        reserved = []
+        for path, content_hash, stats in candidates:
+            filename = secure_filename(path.name)
+            if '.' not in filename:
+                filename = f"{content_hash[:16]}{path.suffix.lower()}"
+            target = self._reserve(filename)
+            if target is None:
+                self.stats['failed'] += 1
+                continue
+            reserved.append((path, content_hash, stats, target))
+        if not reserved:
+            return 0
+
+        started = time.perf_counter()
+        prepared = list(executor.map(self._prepare, reserved))
+        self.stats['copy_seconds'] += time.perf_counter() - started
+
+        documents = [(path, doc) for path, doc in prepared if doc is not None]
+        self.stats['failed'] += len(prepared) - len(documents)
+        if not documents:
+            return 0
+
+        # 4. 一次 insert_many 写入，与其他进程并发导入同一文件时由唯一索引去重
+        started = time.perf_counter()
+        duplicates, failed = set(), set()
+        try:
+            self.collection.insert_many([doc for _, doc in documents], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                if error.get('code') == 11000:
+                    duplicates.add(error['index'])
+                else:
+                    failed.add(error['index'])
+                    logger.error(f"写入图片记录失败 {documents[error['index']][0]}: {error.get('errmsg')}")
+            self.stats['failed'] += len(failed)
+        self.stats['insert_seconds'] += time.perf_counter() - started
+
+        inserted = []
+        for index, (path, doc) in enumerate(documents):
+            if index in duplicates or index in failed:
+                remove_image_files(doc, str(self.upload_folder))
+                if index in duplicates:
+                    self._duplicate(path, doc['content_hash'])
+                continue
+            inserted.append(doc)
+            self.stats['bytes'] += doc['file_sizes'].get('original', 0)
+            if self.move:
+                try:
+                    path.unlink()
+                except OSError as e:
+                    logger.warning(f"删除源文件失败 {path}: {str(e)}")
+
+        self.stats['ingested'] += len(inserted)
+        if inserted:
+            if self.tag_stats is not None and self.tags:
+                self.tag_stats.record([(None, tag_state(doc)) for doc in inserted])
+            if self.change_counter is not None:
+                self.change_counter.bump(scopes_for(inserted))
+        logger.info(f"已导入 {len(inserted)} 张图片（本批 {len(paths)} 个文件）")
+        return len(inserted)
+
+    def _duplicate(self, path: Path, content_hash: str):
+        self.stats['duplicates'] += 1
+        self.duplicates.append((path, content_hash))
+        logger.info(f"跳过重复文件: {path} ({content_hash[:12]})")
+
+    def _prepare(self, item):
+        """复制（或链接）文件到上传目录，读取元数据并构造图片记录"""
+        path, content_hash, stats, target = item
+        try:
+            self._place(path, target)
+            metadata = get_image_metadata(target)
+            if not metadata:
+                raise ValueError('无法读取图片')
+            save_result = {
+                'filename': target.name,
+                'original_path': str(target),
+                'content_hash': content_hash,
+                'file_sizes': {'original': stats.st_size, 'thumbnail': 0, 'webp': 0}
+            }
+            doc = build_image_document(save_result, metadata, processing_status='pending')
+            doc['tags'] = list(self.tags)
+            doc['is_public'] = self.is_public
+            return path, doc
+        except Exception as e:
+            logger.error(f"导入文件失败 {path}: {str(e)}")
+            try:
+                target.unlink()
+            except OSError:
+                pass
+            return path, None
+
+    def _place(self, path: Path, target: Path):
+        """移动模式下优先使用硬链接（同一文件系统内不复制数据），否则复制并保留修改时间"""
+        if self.move:
+            temporary = target.with_name(f".{target.name}.ingest")
+            try:
+                os.link(path, temporary)
+                os.replace(temporary, target)
+                return
+            except OSError:
+                pass
+        shutil.copy2(path, target)
+
+    def watch(self, root, interval: float = 10.0, settle: float = 3.0, polling: bool = False):
+        """
+        持续监视目录，导入新出现的图片（Ctrl+C 结束）
+
+        Args:
+            root: 监视的目录
+            interval: 轮询间隔（秒），使用系统通知时为空闲时的兜底扫描间隔
+            settle: 文件大小和修改时间保持不变多久（秒）后才导入
+            polling: 强制使用轮询
+        """
+        root = Path(root).resolve()
+        handler = _ChangeHandler() if Observer is not None and not polling else None
+        observer = None
+        if handler is not None:
+            observer = Observer()
+            observer.schedule(handler, str(root), recursive=True)
+            observer.start()
+            logger.info(f"开始监视 {root}（系统通知）")
+        else:
+            logger.info(f"开始监视 {root}（每 {interval:g} 秒轮询）")
+
+        # 等待写入完成的文件：路径 -> 上次看到的 (大小, 修改时间)
+        pending: Dict[Path, Tuple[int, float]] = {}
+        full_scan = True
+        try:
+            while True:
+                if full_scan or handler is None:
+                    paths = set(self.scan(root))
+                else:
+                    paths, directories = handler.drain()
+                    for directory in directories:
+                        paths.update(self.scan(directory))
+                    paths = {path.resolve() for path in paths if is_image_file(path) and not self._is_upload_file(path)}
+                paths.update(pending)
+
+                ready = []
+                now = time.time()
+                for path in paths:
+                    try:
+                        stats = path.stat()
+                    except FileNotFoundError:
+                        pending.pop(path, None)
+                        continue
+                    signature = (stats.st_size, stats.st_mtime)
+                    if self._seen.get(path) == signature:
+                        pending.pop(path, None)
+                    elif pending.get(path) == signature and now - stats.st_mtime >= settle:
+                        ready.append(path)
+                        pending.pop(path)
+                    else:
+                        pending[path] = signature
+
+                if ready:
+                    self.ingest(sorted(ready))
+                    for line in self.report():
+                        logger.info(line)
+
+                timeout = settle if pending else interval
+                if handler is None:
+                    time.sleep(timeout)
+                else:
+                    # 超时（没有新事件）时做一次全量扫描，弥补丢失的通知
+                    full_scan = not handler.event.wait(timeout) and not pending
+                    handler.event.clear()
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    def report(self) -> List[str]:
+        """导入统计和吞吐量"""
+        stats = self.stats
+        elapsed = max(time.perf_counter() - stats['started'], 1e-6)
+        megabytes = stats['bytes'] / 1024 / 1024
+        lines = [
+            f"扫描 {stats['scanned']} 个文件：导入 {stats['ingested']}，重复 {stats['duplicates']}，失败 {stats['failed']}",
+            f"导入 {megabytes:.1f} MB，用时 {elapsed:.1f} 秒"
+            f"（{stats['ingested'] / elapsed:.1f} 张/秒，{megabytes / elapsed:.1f} MB/秒）",
+            f"  计算哈希 {stats['hash_seconds']:.1f} 秒，复制和读取元数据 {stats['copy_seconds']:.1f} 秒，"
+            f"写入数据库 {stats['insert_seconds']:.1f} 秒",
+        ]
+        if stats['variants']:
+            lines.append(
+                f"  生成变体 {stats['variants']} 张，用时 {stats['variant_seconds']:.1f} 秒"
+                f"（{stats['variants'] / max(stats['variant_seconds'], 1e-6):.1f} 张/秒）"
+            )
+        return lines
@@ -0,0 +1,112 @@
+"""
+两端对齐画廊布局模块
+
+功能：
+1. 根据已存储的宽高，在服务端按视口宽度预先计算两端对齐的行布局
+2. 行打包为线性时间：按顺序累加宽高比，行宽达到容器宽度即断行并缩放行高
+3. 分页衔接：每页未填满的最后一行标记为 open 并给出 carry，客户端请求下一页时带上 carry，
+   这些图片与下一页一起重新排版，页与页之间不会出现未对齐的短行
+
+布局结果随接口响应一起缓存（键包含数据版本和布局参数），这里不单独缓存。
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 视口宽度按档位取整，同一档位的客户端共享缓存
+WIDTH_BUCKET = 40
+MIN_WIDTH = 320
+MAX_WIDTH = 3840
+
+# 缺少尺寸信息时使用的默认宽高比
+DEFAULT_ASPECT = 4 / 3
+
+# carry 最多接受的图片数量和宽高比范围（carry 来自客户端，只影响该客户端的布局）
+MAX_CARRY = 32
+MIN_ASPECT, MAX_ASPECT = 0.05, 20.0
+
+
+def width_bucket(width: int) -> int:
+    """将视口宽度向下取整到档位"""
+    width = max(MIN_WIDTH, min(MAX_WIDTH, int(width)))
+    return width - width % WIDTH_BUCKET
+
+
+def aspect_ratio(image: dict) -> float:
+    width, height = image.get('width'), image.get('height')
+    if width and height:
+        return width / height
+    return DEFAULT_ASPECT
+
+
+def encode_carry(items: Sequence[Tuple[str, float]]) -> str:
+    """[(图片 ID, 宽高比)] -> "id:ratio,id:ratio"，客户端原样放入下一页请求的 carry 参数"""
+    return ','.join(f"{image_id}:{ratio:.4f}" for image_id, ratio in items)
+
+
+def parse_carry(value: Optional[str]) -> List[Tuple[str, float]]:
+    """解析 carry 参数，忽略格式错误的项"""
+    items = []
+    for part in (value or '').split(',')[:MAX_CARRY]:
+        image_id, _, ratio = part.partition(':')
+        try:
+            ratio = float(ratio)
+        except ValueError:
+            continue
+        if image_id and MIN_ASPECT <= ratio <= MAX_ASPECT:
+            items.append((image_id, ratio))
+    return items
+
+
+def justify_rows(
+    items: Sequence[Tuple[str, float]],
+    container_width: int,
+    target_height: int = 240,
+    gap: int = 8,
+    max_height_ratio: float = 1.5
+) -> List[Dict]:
+    """
+    计算两端对齐的行布局
+
+    Args:
+        items: [(图片 ID, 宽高比), ...]，按展示顺序
+        container_width: 容器宽度（像素）
+        target_height: 目标行高
+        gap: 图片间距
+        max_height_ratio: 单行最大高度相对目标行高的倍数，防止极宽容器中的孤图过大
+
+    Returns:
+        [{'height': 行高, 'items': [{'id', 'width', 'height'}]}, ...]
+        最后一行未填满时保持目标行高，不拉伸，并带有 'open': True 和 'carry'（见 encode_carry）
+    """
+    rows = []
+    row: List[Tuple[str, float]] = []
+    ratio_sum = 0.0
+
+    def close_row(height: float, fill_width: int = 0):
+        cells = [
+            {'id': image_id, 'width': round(ratio * height), 'height': round(height)}
+            for image_id, ratio in row
+        ]
+        # 取整误差补到最后一张，保证整行宽度与容器完全一致
+        if fill_width:
+            cells[-1]['width'] += fill_width - sum(cell['width'] for cell in cells)
+        rows.append({'height': round(height), 'items': cells})
+
+    for image_id, ratio in items:
+        row.append((image_id, ratio))
+        ratio_sum += ratio
+        available = container_width - gap * (len(row) - 1)
+        if ratio_sum * target_height >= available:
+            height = available / ratio_sum
+            if height > target_height * max_height_ratio:
+                close_row(target_height * max_height_ratio)
+            else:
+                close_row(height, fill_width=available)
+            row, ratio_sum = [], 0.0
+
+    if row:
+        close_row(target_height)
+        rows[-1].update({'open': True, 'carry': encode_carry(row)})
+
+    return rows
+
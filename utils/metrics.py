@@ -0,0 +1,218 @@
+"""
+请求耗时与 MongoDB 查询统计模块
+
+功能：
+1. MongoCommandListener：pymongo 命令监听器，把每条命令的次数和耗时记入当前请求
+2. timed：上下文管理器/装饰器，记录图片处理、JSON 序列化、文件读写等阶段耗时
+3. MetricsRegistry：按接口累计请求耗时直方图、Mongo 命令数和各阶段耗时，输出 Prometheus 文本格式
+4. init_app：注册 Flask 钩子，请求结束时写入统计，并附加 Server-Timing 响应头
+
+统计只在请求上下文中生效，后台线程（回收器等）的命令和耗时不会被记录。
+gunicorn 多 worker 时每个进程各自统计，/metrics 返回的是处理该请求的 worker 的数据。
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Optional
+
+from pymongo import monitoring
+
+# Prometheus 默认的延迟分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current: ContextVar[Optional['RequestTimings']] = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """单个请求内各阶段的累计次数和耗时"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, list] = {}  # 阶段 -> [次数, 秒]
+        self.mongo_commands: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, count: int = 1):
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+
+    def add_command(self, name: str, seconds: float):
+        self.add('mongo', seconds)
+        with self._lock:
+            self.mongo_commands[name] = self.mongo_commands.get(name, 0) + 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """生成 Server-Timing 响应头，浏览器开发者工具可直接显示各阶段耗时"""
+        parts = []
+        for stage, (count, seconds) in self.stages.items():
+            part = f'{stage};dur={seconds * 1000:.1f}'
+            if count > 1:
+                part += f';desc="{count}x"'
+            parts.append(part)
+        parts.append(f'total;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(parts)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+@contextmanager
+def timed(stage: str):
+    """记录代码块耗时到当前请求，不在请求中时不做任何事"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, time.perf_counter() - start)
+
+
+def timed_stage(stage: str):
+    """timed 的装饰器形式"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """把 Mongo 命令次数和耗时记入发起命令的请求"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    @staticmethod
+    def _record(event):
+        timings = _current.get()
+        if timings is not None:
+            timings.add_command(event.command_name, event.duration_micros / 1_000_000)
+
+
+class MetricsRegistry:
+    """进程内的接口指标，按 Prometheus 文本格式导出"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._requests: Dict[tuple, int] = {}            # (接口, 方法, 状态码) -> 次数
+        self._latency: Dict[str, list] = {}              # 接口 -> [各分桶计数..., 总数, 总秒数]
+        self._stages: Dict[tuple, list] = {}             # (接口, 阶段) -> [次数, 秒]
+        self._commands: Dict[tuple, int] = {}            # (接口, 命令) -> 次数
+
+    def observe(self, endpoint: str, method: str, status: int, timings: RequestTimings):
+        seconds = timings.elapsed()
+        with self._lock:
+            key = (endpoint, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+            histogram = self._latency.get(endpoint)
+            if histogram is None:
+                histogram = self._latency[endpoint] = [0] * len(self.buckets) + [0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[index] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+
+            for stage, (count, stage_seconds) in timings.stages.items():
+                entry = self._stages.setdefault((endpoint, stage), [0, 0.0])
+                entry[0] += count
+                entry[1] += stage_seconds
+
+            for name, count in timings.mongo_commands.items():
+                key = (endpoint, name)
+                self._commands[key] = self._commands.get(key, 0) + count
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            lines.append('# HELP pic_http_requests_total HTTP 请求数')
+            lines.append('# TYPE pic_http_requests_total counter')
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(
+                    f'pic_http_requests_total{{endpoint="{_escape(endpoint)}",method="{method}",status="{status}"}} {count}'
+                )
+
+            lines.append('# HELP pic_http_request_duration_seconds 请求耗时')
+            lines.append('# TYPE pic_http_request_duration_seconds histogram')
+            for endpoint, histogram in sorted(self._latency.items()):
+                label = f'endpoint="{_escape(endpoint)}"'
+                for bound, count in zip(self.buckets, histogram):
+                    lines.append(f'pic_http_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'pic_http_request_duration_seconds_bucket{{{label},le="+Inf"}} {histogram[-2]}')
+                lines.append(f'pic_http_request_duration_seconds_count{{{label}}} {histogram[-2]}')
+                lines.append(f'pic_http_request_duration_seconds_sum{{{label}}} {histogram[-1]:.6f}')
+
+            lines.append('# HELP pic_stage_duration_seconds 请求内各阶段（mongo/图片处理/json/文件）累计耗时')
+            lines.append('# TYPE pic_stage_duration_seconds summary')
+            for (endpoint, stage), (count, seconds) in sorted(self._stages.items()):
+                label = f'endpoint="{_escape(endpoint)}",stage="{stage}"'
+                lines.append(f'pic_stage_duration_seconds_count{{{label}}} {count}')
+                lines.append(f'pic_stage_duration_seconds_sum{{{label}}} {seconds:.6f}')
+
+            lines.append('# HELP pic_mongo_commands_total 各接口发出的 MongoDB 命令数')
+            lines.append('# TYPE pic_mongo_commands_total counter')
+            for (endpoint, name), count in sorted(self._commands.items()):
+                lines.append(
+                    f'pic_mongo_commands_total{{endpoint="{_escape(endpoint)}",command="{name}"}} {count}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def init_app(app, registry: MetricsRegistry, server_timing: bool = False, exclude=('/metrics',)):
+    """
+    注册请求计时钩子
+
+    Args:
+        app: Flask 应用
+        registry: 指标注册表
+        server_timing: 是否附加 Server-Timing 响应头
+        exclude: 不计入统计的路由规则
+    """
+    from flask import request
+
+    @app.before_request
+    def _start_timings():
+        _current.set(RequestTimings())
+
+    @app.after_request
+    def _record_timings(response):
+        timings = _current.get()
+        if timings is None:
+            return response
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        if endpoint not in exclude:
+            registry.observe(endpoint, request.method, response.status_code, timings)
+        if server_timing:
+            response.headers['Server-Timing'] = timings.server_timing()
+        return response
+
+    @app.teardown_request
+    def _clear_timings(exc=None):
+        _current.set(None)
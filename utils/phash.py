@@ -0,0 +1,148 @@
+"""
+感知哈希模块
+
+功能：
+1. 基于缩略图计算 64 位 dHash（差值哈希），同一张照片的不同尺寸/重新导出哈希相近
+2. 将哈希切分为 4 段 16 位，按鸽巢原理做多段索引：
+   汉明距离 <= 3 的两个哈希至少有一段完全相同，数据库只需精确匹配段值
+3. BK 树：在内存中按汉明距离做亚线性近邻查询，用于全库重复聚类
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+BAND_COUNT = 4
+BAND_BITS = HASH_BITS // BAND_COUNT
+
+# 默认近似重复阈值，与段数配合保证多段索引不漏检
+DEFAULT_MAX_DISTANCE = BAND_COUNT - 1
+
+
+def dhash(img: Image.Image) -> int:
+    """
+    计算图片的 dHash
+
+    缩放为 9x8 灰度图，比较每行相邻像素的亮度，得到 64 位哈希。
+    传入已缩小的缩略图即可，避免再次解码原图。
+    """
+    small = img.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def to_hex(value: int) -> str:
+    return f'{value:0{HASH_BITS // 4}x}'
+
+
+def from_hex(text: str) -> int:
+    return int(text, 16)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def hash_bands(value: int) -> List[int]:
+    """
+    将哈希切分为带段号的整数，存入多键索引字段
+
+    段号编码在高位，保证不同位置的相同段值不会互相匹配。
+    """
+    mask = (1 << BAND_BITS) - 1
+    return [
+        (band << BAND_BITS) | ((value >> (band * BAND_BITS)) & mask)
+        for band in range(BAND_COUNT)
+    ]
+
+
+def hash_fields(value: Optional[int]) -> Dict[str, object]:
+    """生成写入图片记录的哈希字段"""
+    if value is None:
+        return {}
+    return {'dhash': to_hex(value), 'dhash_bands': hash_bands(value)}
+
+
+class BKTree:
+    """以汉明距离为度量的 BK 树"""
+
+    def __init__(self):
+        self.root = None  # (hash, [items], {distance: child})
+        self.size = 0
+
+    def add(self, value: int, item) -> None:
+        self.size += 1
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [item], {})
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, object]]:
+        """返回与 value 汉明距离不超过 max_distance 的所有 (距离, item)"""
+        if self.root is None:
+            return []
+
+        results = []
+        stack = [self.root]
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                results.extend((distance, item) for item in items)
+            # 三角不等式剪枝
+            low, high = distance - max_distance, distance + max_distance
+            for child_distance, child in children.items():
+                if low <= child_distance <= high:
+                    stack.append(child)
+        return results
+
+
+def find_clusters(entries: Iterable[Tuple[int, object]],
+                  max_distance: int = DEFAULT_MAX_DISTANCE) -> List[List[object]]:
+    """
+    将 (哈希, item) 聚类为近似重复组
+
+    使用 BK 树查询近邻，并查集合并，只返回成员数大于 1 的组。
+    """
+    entries = list(entries)
+    tree = BKTree()
+    for index, (value, _) in enumerate(entries):
+        tree.add(value, index)
+
+    parent = list(range(len(entries)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for index, (value, _) in enumerate(entries):
+        for _, other in tree.search(value, max_distance):
+            root_a, root_b = find(index), find(other)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+    groups: Dict[int, List[object]] = {}
+    for index, (_, item) in enumerate(entries):
+        groups.setdefault(find(index), []).append(item)
+    return [group for group in groups.values() if len(group) > 1]
@@ -0,0 +1,133 @@
+"""
+图片占位符模块
+
+功能：
+1. 计算图片主色调（十六进制颜色）
+2. 计算 BlurHash 字符串（约 20-30 字节），前端可解码为模糊预览图
+3. 均基于已缩小的缩略图计算，入库时一次完成，不产生额外请求
+"""
+
+import math
+from typing import Tuple
+
+from PIL import Image
+
+# BlurHash 编码使用的 base83 字符表
+_BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+# 计算 BlurHash 前先缩小到该尺寸，结果与原图尺寸无关
+_SAMPLE_SIZE = 32
+
+
+def _encode83(value: int, length: int) -> str:
+    result = ''
+    for i in range(1, length + 1):
+        digit = (value // (83 ** (length - i))) % 83
+        result += _BASE83[digit]
+    return result
+
+
+def _srgb_to_linear(value: int) -> float:
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value: float, exp: float) -> float:
+    return math.copysign(abs(value) ** exp, value)
+
+
+def blurhash_encode(img: Image.Image, x_components: int = 4, y_components: int = 3) -> str:
+    """
+    计算图片的 BlurHash
+
+    Args:
+        img: RGB 图片（建议传入缩略图）
+        x_components / y_components: 水平/垂直方向的分量数（1-9）
+
+    Returns:
+        BlurHash 字符串
+    """
+    small = img.convert('RGB')
+    small.thumbnail((_SAMPLE_SIZE, _SAMPLE_SIZE), Image.Resampling.BILINEAR)
+    width, height = small.size
+    linear = [tuple(_srgb_to_linear(c) for c in pixel) for pixel in small.getdata()]
+
+    # 预计算余弦基函数
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            normalisation = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                cy = cos_y[j][y]
+                for x in range(width):
+                    basis = cos_x[i][x] * cy
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = normalisation / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(abs(c) for factor in ac for c in factor)
+        quantised_max = max(0, min(82, int(actual_max * 166 - 0.5)))
+        max_value = (quantised_max + 1) / 166
+        result += _encode83(quantised_max, 1)
+    else:
+        max_value = 1
+        result += _encode83(0, 1)
+
+    dc_value = (_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2])
+    result += _encode83(dc_value, 4)
+
+    for factor in ac:
+        quant = [
+            max(0, min(18, int(math.floor(_sign_pow(c / max_value, 0.5) * 9 + 9.5))))
+            for c in factor
+        ]
+        result += _encode83(quant[0] * 19 * 19 + quant[1] * 19 + quant[2], 2)
+
+    return result
+
+
+def dominant_color(img: Image.Image, colors: int = 5) -> str:
+    """
+    计算图片主色调
+
+    将图片缩小并量化为少量颜色，取像素数最多的颜色。
+
+    Returns:
+        '#rrggbb' 格式的颜色
+    """
+    small = img.convert('RGB')
+    small.thumbnail((64, 64), Image.Resampling.BILINEAR)
+    quantized = small.quantize(colors=colors)
+    palette = quantized.getpalette()
+    _, index = max(quantized.getcolors())
+    r, g, b = palette[index * 3:index * 3 + 3]
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+def placeholder_features(img: Image.Image, original_size: Tuple[int, int]) -> dict:
+    """生成写入图片记录的尺寸和占位符字段"""
+    return {
+        'width': original_size[0],
+        'height': original_size[1],
+        'dominant_color': dominant_color(img),
+        'blurhash': blurhash_encode(img)
+    }
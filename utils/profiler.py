@@ -0,0 +1,268 @@
+"""
+慢请求采样分析模块（默认关闭）
+
+功能：
+1. 按比例抽样请求，用 cProfile 记录完整调用统计（.prof，可用 snakeviz / pstats 查看）
+2. 后台线程对进行中的请求做栈采样，请求超过阈值时保存折叠栈（.folded，可直接生成火焰图）
+3. 每份分析附带 JSON 元数据：接口、参数、耗时、状态码、热点函数
+4. 目录按数量轮转，只保留最近的 max_profiles 份
+
+栈采样只读取正在处理请求的线程的栈帧，没有请求时采样线程空转，开销很小；
+cProfile 同一时间只允许一个请求使用，其它被抽中的请求直接跳过。
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 元数据中保留的热点函数数量
+TOP_FUNCTIONS = 20
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})'
+
+
+class _RequestState:
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.started = time.perf_counter()
+        self.samples: Counter = Counter()
+        self.profile: Optional[cProfile.Profile] = None
+
+
+class SlowRequestProfiler:
+    """
+    慢请求分析器
+
+    Args:
+        directory: 分析文件保存目录
+        sample_rate: cProfile 抽样比例（0-1），0 表示不抽样
+        slow_threshold: 慢请求阈值（秒），为 None 时不启动栈采样
+        interval: 栈采样间隔（秒）
+        max_profiles: 目录中最多保留的分析份数
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        sample_rate: float = 0.0,
+        slow_threshold: Optional[float] = None,
+        interval: float = 0.005,
+        max_profiles: int = 200
+    ):
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.interval = interval
+        self.max_profiles = max_profiles
+
+        self._active: Dict[int, _RequestState] = {}
+        self._lock = threading.Lock()
+        self._cprofile_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.slow_threshold is not None
+
+    def init_app(self, app):
+        """注册请求钩子，未启用时不做任何事"""
+        if not self.enabled:
+            return
+        from flask import request, g
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.slow_threshold is not None:
+            self._start_sampler()
+
+        @app.before_request
+        def _begin_profile():
+            g._profile_state = self.begin()
+
+        @app.after_request
+        def _end_profile(response):
+            state = g.pop('_profile_state', None)
+            if state is not None:
+                self.end(state, {
+                    'endpoint': request.url_rule.rule if request.url_rule else 'unmatched',
+                    'method': request.method,
+                    'path': request.path,
+                    'args': request.args.to_dict(flat=False),
+                    'status': response.status_code
+                })
+            return response
+
+        @app.teardown_request
+        def _discard_profile(exc=None):
+            # after_request 未执行（如未处理的异常）时也要注销线程
+            state = g.pop('_profile_state', None)
+            if state is not None:
+                self._finish(state)
+
+    # ------------------------------------------------------------------
+    # 单个请求
+    # ------------------------------------------------------------------
+
+    def begin(self) -> _RequestState:
+        state = _RequestState(threading.get_ident())
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            if self._cprofile_lock.acquire(blocking=False):
+                state.profile = cProfile.Profile()
+                state.profile.enable()
+        if self.slow_threshold is not None:
+            with self._lock:
+                self._active[state.thread_id] = state
+        return state
+
+    def _finish(self, state: _RequestState) -> float:
+        duration = time.perf_counter() - state.started
+        if state.profile is not None:
+            state.profile.disable()
+            self._cprofile_lock.release()
+        with self._lock:
+            self._active.pop(state.thread_id, None)
+        return duration
+
+    def end(self, state: _RequestState, info: dict):
+        duration = self._finish(state)
+        try:
+            if state.profile is not None:
+                self._save_cprofile(state.profile, info, duration)
+            elif self.slow_threshold is not None and duration >= self.slow_threshold and state.samples:
+                self._save_samples(state.samples, info, duration)
+        except Exception as e:
+            logger.error(f"保存请求分析失败 {info.get('path')}: {str(e)}")
+
+    # ------------------------------------------------------------------
+    # 栈采样
+    # ------------------------------------------------------------------
+
+    def _start_sampler(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._sample_loop, name='slow-request-sampler', daemon=True)
+        self._thread.start()
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                active = dict(self._active)
+            frames = sys._current_frames()
+            for thread_id, state in active.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                state.samples[';'.join(reversed(stack))] += 1
+
+    # ------------------------------------------------------------------
+    # 写入与轮转
+    # ------------------------------------------------------------------
+
+    def _new_name(self, info: dict, duration: float) -> str:
+        slug = info['endpoint'].strip('/').replace('/', '_').replace('<', '').replace('>', '').replace(':', '-') or 'root'
+        return f"{datetime.now():%Y%m%d_%H%M%S}_{int(duration * 1000)}ms_{slug}_{uuid.uuid4().hex[:6]}"
+
+    def _save_cprofile(self, profile: cProfile.Profile, info: dict, duration: float):
+        name = self._new_name(info, duration)
+        data_path = self.directory / f'{name}.prof'
+        profile.dump_stats(str(data_path))
+
+        stats = pstats.Stats(profile)
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+        hotspots = [
+            {
+                'function': f'{func} ({Path(filename).name}:{line})',
+                'calls': calls,
+                'total_ms': round(total * 1000, 2),
+                'cumulative_ms': round(cumulative * 1000, 2)
+            }
+            for (filename, line, func), (_, calls, total, cumulative, _) in top
+        ]
+        self._write_meta(name, data_path.name, 'cprofile', info, duration, hotspots)
+
+    def _save_samples(self, samples: Counter, info: dict, duration: float):
+        name = self._new_name(info, duration)
+        data_path = self.directory / f'{name}.folded'
+        with open(data_path, 'w', encoding='utf-8') as f:
+            for stack, count in samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+        # 按栈顶函数（自身耗时）汇总热点
+        total = sum(samples.values())
+        leaves: Counter = Counter()
+        for stack, count in samples.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        hotspots = [
+            {'function': leaf, 'samples': count, 'percent': round(count * 100 / total, 1)}
+            for leaf, count in leaves.most_common(TOP_FUNCTIONS)
+        ]
+        self._write_meta(name, data_path.name, 'stack_samples', info, duration, hotspots, samples=total)
+
+    def _write_meta(self, name, data_file, kind, info, duration, hotspots, **extra):
+        meta = {
+            'name': name,
+            'file': data_file,
+            'kind': kind,
+            'captured_at': datetime.now().isoformat(timespec='seconds'),
+            'duration_ms': round(duration * 1000, 1),
+            'pid': os.getpid(),
+            **info,
+            **extra,
+            'hotspots': hotspots
+        }
+        with open(self.directory / f'{name}.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        self._rotate()
+
+    def _rotate(self):
+        metas = sorted(self.directory.glob('*.json'), key=lambda p: p.stat().st_mtime)
+        for meta_path in metas[:max(0, len(metas) - self.max_profiles)]:
+            for path in self.directory.glob(f'{meta_path.stem}.*'):
+                path.unlink(missing_ok=True)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def list_profiles(self, limit: int = 100) -> List[dict]:
+        """按耗时从高到低返回已保存的分析元数据"""
+        profiles = []
+        if not self.directory.exists():
+            return profiles
+        for meta_path in self.directory.glob('*.json'):
+            try:
+                with open(meta_path, encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        profiles.sort(key=lambda meta: meta.get('duration_ms', 0), reverse=True)
+        return profiles[:limit]
+
+    def get_profile(self, name: str) -> Optional[dict]:
+        meta_path = self.directory / f'{Path(name).name}.json'
+        if not meta_path.exists():
+            return None
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
@@ -0,0 +1,116 @@
+"""
+图片回收模块
+
+功能：
+1. 删除接口只给图片打上软删除标记（deleted=True），请求立即返回
+2. 后台回收线程分批删除所有变体文件（原图、缩略图、WebP）和数据库记录
+3. 多个 worker 进程同时运行时，通过认领标记避免重复处理
+"""
+
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from .file_utils import remove_image_files
+
+logger = logging.getLogger(__name__)
+
+
+class ImageReaper:
+    """软删除图片的后台回收器"""
+
+    def __init__(
+        self,
+        collection,
+        upload_folder: str,
+        batch_size: int = 100,
+        interval: float = 60.0,
+        claim_timeout: int = 600
+    ):
+        """
+        初始化回收器
+
+        Args:
+            collection: images 集合
+            upload_folder: 上传文件夹路径
+            batch_size: 每批回收的图片数量
+            interval: 空闲时的轮询间隔（秒）
+            claim_timeout: 认领超时时间（秒），超时后其他进程可重新认领
+        """
+        self.collection = collection
+        self.upload_folder = upload_folder
+        self.batch_size = batch_size
+        self.interval = interval
+        self.claim_timeout = timedelta(seconds=claim_timeout)
+
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动后台回收线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='image-reaper', daemon=True)
+        self._thread.start()
+        logger.info("图片回收线程已启动")
+
+    def wake(self):
+        """唤醒回收线程，立即处理新的软删除图片"""
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                # 一直处理到没有待回收的图片为止
+                while self.reap_once():
+                    pass
+            except Exception as e:
+                logger.error(f"回收图片时发生错误: {str(e)}")
+
+    def reap_once(self) -> int:
+        """
+        认领并回收一批软删除的图片
+
+        Returns:
+            本批回收的图片数量
+        """
+        token = uuid.uuid4().hex
+        now = datetime.now()
+        claimable = {
+            'deleted': True,
+            '$or': [
+                {'reap_claim': {'$exists': False}},
+                {'reap_claimed_at': {'$lt': now - self.claim_timeout}}
+            ]
+        }
+
+        candidate_ids = [
+            doc['_id'] for doc in
+            self.collection.find(claimable, {'_id': 1}).limit(self.batch_size)
+        ]
+        if not candidate_ids:
+            return 0
+
+        self.collection.update_many(
+            {'_id': {'$in': candidate_ids}, **claimable},
+            {'$set': {'reap_claim': token, 'reap_claimed_at': now}}
+        )
+        images = list(self.collection.find({'reap_claim': token}))
+        if not images:
+            return 0
+
+        removed_files = 0
+        for image in images:
+            removed_files += remove_image_files(image, self.upload_folder)
+
+        result = self.collection.delete_many({
+            '_id': {'$in': [image['_id'] for image in images]},
+            'reap_claim': token
+        })
+        logger.info(f"已回收 {result.deleted_count} 张图片，删除文件 {removed_files} 个")
+
+        return len(images)
@@ -0,0 +1,56 @@
+"""
+画廊查询结果缓存模块
+
+功能：
+1. 缓存列表页、年份视图和年份列表的查询结果（已序列化的图片数据）
+2. 首页服务端渲染和 /api 接口共用同一份缓存，首屏数据不会重复查询
+3. LRU + 过期时间，条目数量有上限
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+class ResponseCache:
+    """带过期时间的线程安全 LRU 缓存"""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 10.0):
+        """
+        Args:
+            max_entries: 最多缓存的条目数
+            ttl: 条目有效期（秒），0 表示不缓存
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (过期时间, 值)
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        """
+        返回缓存值，未命中或已过期时调用 compute 计算并写入
+
+        返回的对象在多个请求间共享，调用方不能修改。
+        """
+        if self.ttl <= 0:
+            return compute()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = compute()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
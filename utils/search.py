@@ -0,0 +1,204 @@
+"""
+图片搜索模块
+
+功能：
+1. 基于 MongoDB 文本索引搜索文件名、标签、相机和镜头型号
+2. 支持标签、相机、年份、日期范围和公开状态过滤
+3. 使用 $facet 在一次聚合中同时返回分页结果和分面统计
+4. 使用 (photo_time, _id) 游标分页，翻页代价与页码无关
+   历史记录中字符串或缺失的 photo_time 在管道中归一为日期或 null（排在所有日期之后），分页不会提前结束
+"""
+
+import base64
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+# 文本索引覆盖的字段
+TEXT_INDEX_FIELDS = [
+    ('filename', 'text'),
+    ('tags', 'text'),
+    ('metadata.camera_make', 'text'),
+    ('metadata.camera_model', 'text'),
+    ('metadata.lens_model', 'text'),
+]
+TEXT_INDEX_NAME = 'images_text_search'
+
+# 分面统计返回的最大桶数
+FACET_LIMIT = 20
+
+# 分页排序使用的字段：photo_time 转换为日期，无法转换时为 null
+SORT_TIME_FIELD = '_sort_time'
+# 历史记录中的 photo_time 可能是字符串（例如 EXIF 格式 "2023:01:01 12:00:00"），$toDate 遇到时会使整个聚合失败
+SORT_TIME_EXPR = {'$convert': {'input': '$photo_time', 'to': 'date', 'onError': None, 'onNull': None}}
+
+
+def ensure_search_indexes(collection):
+    """确保搜索所需的文本索引存在（中文标签不做词干处理）"""
+    collection.create_index(
+        TEXT_INDEX_FIELDS,
+        name=TEXT_INDEX_NAME,
+        default_language='none',
+        weights={'tags': 5, 'filename': 3}
+    )
+
+
+def encode_cursor(image: dict) -> str:
+    """将最后一条结果的 (排序时间, _id) 编码为分页游标，排序时间为 null 时只包含 _id"""
+    sort_time = image.get(SORT_TIME_FIELD)
+    time_part = sort_time.isoformat() if isinstance(sort_time, datetime) else ''
+    raw = f"{time_part}|{image['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], ObjectId]:
+    """解析分页游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        photo_time, image_id = raw.rsplit('|', 1)
+        return (datetime.fromisoformat(photo_time) if photo_time else None), ObjectId(image_id)
+    except Exception:
+        raise ValueError('无效的分页游标')
+
+
+def _parse_date(value: str) -> datetime:
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'无效的日期: {value}')
+
+
+def build_search_match(
+    q: str = '',
+    tag: str = '',
+    camera: str = '',
+    year: str = '',
+    date_from: str = '',
+    date_to: str = '',
+    is_public: Optional[bool] = None,
+    base: Optional[dict] = None
+) -> dict:
+    """
+    构建搜索条件
+
+    Args:
+        q: 全文搜索关键词
+        tag: 标签
+        camera: 相机型号
+        year: 年份
+        date_from / date_to: 拍摄日期范围（YYYY-MM-DD，包含两端）
+        is_public: 公开状态，None 表示不限
+        base: 附加的基础条件（例如排除软删除）
+
+    Returns:
+        $match 条件
+    """
+    match = dict(base or {})
+    if q:
+        match['$text'] = {'$search': q}
+    if tag:
+        match['tags'] = tag
+    if camera:
+        match['metadata.camera_model'] = camera
+    if is_public is not None:
+        match['is_public'] = is_public
+
+    time_range = {}
+    if year:
+        year = int(year)
+        time_range['$gte'] = datetime(year, 1, 1)
+        time_range['$lt'] = datetime(year + 1, 1, 1)
+    if date_from:
+        start = _parse_date(date_from)
+        time_range['$gte'] = max(start, time_range.get('$gte', start))
+    if date_to:
+        end = _parse_date(date_to).replace(hour=23, minute=59, second=59, microsecond=999999)
+        time_range['$lte'] = end
+    if time_range:
+        match['photo_time'] = time_range
+
+    return match
+
+
+def build_search_pipeline(match: dict, cursor: Optional[str] = None, size: int = 18) -> list:
+    """
+    构建带分面统计的搜索聚合管道
+
+    分面统计基于完整的搜索结果，游标只作用于结果分页。
+
+    Returns:
+        聚合管道，输出单个文档:
+        {results, total, years, tags, cameras, visibility}
+    """
+    # 字符串 photo_time 转换为日期，缺失或无法解析时为 null；降序时 null 排在所有日期之后
+    page_stages = [{'$addFields': {SORT_TIME_FIELD: SORT_TIME_EXPR}}]
+    if cursor:
+        sort_time, image_id = decode_cursor(cursor)
+        if sort_time is None:
+            page_stages.append({'$match': {SORT_TIME_FIELD: None, '_id': {'$lt': image_id}}})
+        else:
+            page_stages.append({'$match': {'$or': [
+                {SORT_TIME_FIELD: {'$lt': sort_time}},
+                {SORT_TIME_FIELD: sort_time, '_id': {'$lt': image_id}},
+                {SORT_TIME_FIELD: None}
+            ]}})
+    page_stages += [
+        {'$sort': {SORT_TIME_FIELD: -1, '_id': -1}},
+        # 多取一条用于判断是否还有下一页
+        {'$limit': size + 1}
+    ]
+
+    return [
+        {'$match': match},
+        {'$facet': {
+            'results': page_stages,
+            'total': [{'$count': 'count'}],
+            # 无法解析拍摄时间的图片不计入年份分面
+            'years': [
+                {'$addFields': {SORT_TIME_FIELD: SORT_TIME_EXPR}},
+                {'$match': {SORT_TIME_FIELD: {'$ne': None}}},
+                {'$group': {'_id': {'$year': f'${SORT_TIME_FIELD}'}, 'count': {'$sum': 1}}},
+                {'$sort': {'_id': -1}}
+            ],
+            'tags': [
+                {'$unwind': '$tags'},
+                {'$group': {'_id': '$tags', 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1, '_id': 1}},
+                {'$limit': FACET_LIMIT}
+            ],
+            'cameras': [
+                {'$match': {'metadata.camera_model': {'$type': 'string'}}},
+                {'$group': {'_id': '$metadata.camera_model', 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1, '_id': 1}},
+                {'$limit': FACET_LIMIT}
+            ],
+            'visibility': [
+                {'$group': {'_id': {'$eq': ['$is_public', True]}, 'count': {'$sum': 1}}}
+            ]
+        }}
+    ]
+
+
+def format_facets(facet_doc: dict) -> dict:
+    """将 $facet 输出整理为前端友好的分面结构"""
+    def buckets(key):
+        return [
+            {'value': bucket['_id'], 'count': bucket['count']}
+            for bucket in facet_doc.get(key, [])
+            if bucket['_id'] is not None
+        ]
+
+    visibility = {'public': 0, 'private': 0}
+    for bucket in facet_doc.get('visibility', []):
+        visibility['public' if bucket['_id'] else 'private'] = bucket['count']
+
+    return {
+        'years': buckets('years'),
+        'tags': buckets('tags'),
+        'cameras': buckets('cameras'),
+        'visibility': visibility
+    }
@@ -0,0 +1,212 @@
+"""
+标签统计模块
+
+功能：
+1. 维护 tag_stats 集合：标签 -> 公开数量、私密数量、最近使用时间
+2. 在上传、修改、批量打标签、修改公开状态和删除时增量更新
+3. 提供前缀自动补全和标签云查询，避免每次对 images 全表 distinct
+"""
+
+import re
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+def visibility_key(is_public) -> str:
+    """将 is_public 字段映射为统计字段名，缺失时按私密处理（与 /api/images 一致）"""
+    return 'public' if is_public else 'private'
+
+
+def tag_state(image: Optional[dict]) -> Optional[Tuple[List[str], bool]]:
+    """从图片记录中提取 (标签列表, 是否公开)，用于计算统计增量"""
+    if image is None:
+        return None
+    return image.get('tags') or [], bool(image.get('is_public'))
+
+
+def count_tag_membership(images_collection, match: dict, tags: List[str], present: bool) -> Dict[str, Dict[str, int]]:
+    """
+    统计匹配的图片中含有（或不含）指定标签的数量，按公开状态分组
+
+    用于在批量 $addToSet / $pull 之前，一次聚合算出标签统计的增量。
+
+    Args:
+        images_collection: images 集合
+        match: 参与操作的图片条件
+        tags: 标签列表
+        present: True 统计已含有标签的图片（移除时使用），
+                 False 统计尚未含有标签的图片（添加时使用）
+
+    Returns:
+        {标签: {'public': 数量, 'private': 数量}}
+    """
+    current = {'$ifNull': ['$tags', []]}
+    # 用户输入的标签可能以 $ 开头，用 $literal 避免被当作字段路径
+    literal = {'$literal': list(tags)}
+    operator = '$setIntersection' if present else '$setDifference'
+    operands = [current, literal] if present else [literal, current]
+    pipeline = [
+        {'$match': match},
+        {'$project': {'is_public': 1, 'hit': {operator: operands}}},
+        {'$unwind': '$hit'},
+        {'$group': {
+            '_id': {'tag': '$hit', 'public': {'$eq': ['$is_public', True]}},
+            'count': {'$sum': 1}
+        }}
+    ]
+
+    counts = defaultdict(lambda: {'public': 0, 'private': 0})
+    for bucket in images_collection.aggregate(pipeline):
+        key = visibility_key(bucket['_id']['public'])
+        counts[bucket['_id']['tag']][key] += bucket['count']
+    return dict(counts)
+
+
+class TagStats:
+    """标签统计集合的读写封装"""
+
+    def __init__(self, collection):
+        """
+        Args:
+            collection: tag_stats 集合，_id 为标签名
+        """
+        self.collection = collection
+
+    def ensure_indexes(self):
+        """确保查询所需的索引存在（前缀补全直接使用 _id 索引）"""
+        self.collection.create_index([('public', -1)])
+        self.collection.create_index([('private', -1)])
+
+    @staticmethod
+    def diff(changes: Iterable[Tuple[Optional[tuple], Optional[tuple]]]) -> Dict[str, Dict[str, int]]:
+        """
+        根据修改前后的状态计算每个标签的计数增量
+
+        Args:
+            changes: [(修改前状态, 修改后状态), ...]，状态为 tag_state() 的返回值，
+                     新建时修改前为 None，删除时修改后为 None
+
+        Returns:
+            {标签: {'public': 增量, 'private': 增量}}，不包含增量为 0 的标签
+        """
+        deltas = defaultdict(lambda: {'public': 0, 'private': 0})
+        for before, after in changes:
+            if before is not None:
+                tags, is_public = before
+                for tag in set(tags):
+                    deltas[tag][visibility_key(is_public)] -= 1
+            if after is not None:
+                tags, is_public = after
+                for tag in set(tags):
+                    deltas[tag][visibility_key(is_public)] += 1
+
+        return {
+            tag: delta for tag, delta in deltas.items()
+            if tag and (delta['public'] or delta['private'])
+        }
+
+    def apply(self, deltas: Dict[str, Dict[str, int]]):
+        """一次 bulk_write 应用所有标签增量，并清理计数归零的标签"""
+        if not deltas:
+            return
+
+        now = datetime.now()
+        operations = []
+        for tag, delta in deltas.items():
+            update = {'$inc': {'public': delta['public'], 'private': delta['private']}}
+            if delta['public'] > 0 or delta['private'] > 0:
+                update['$set'] = {'last_used': now}
+            operations.append(UpdateOne({'_id': tag}, update, upsert=True))
+
+        self.collection.bulk_write(operations, ordered=False)
+        self.collection.delete_many({
+            '_id': {'$in': list(deltas)},
+            'public': {'$lte': 0},
+            'private': {'$lte': 0}
+        })
+
+    def apply_counts(self, counts: Dict[str, Dict[str, int]], sign: int):
+        """将 count_tag_membership() 的结果按正负号作为增量应用"""
+        deltas = {
+            tag: {'public': sign * c['public'], 'private': sign * c['private']}
+            for tag, c in counts.items()
+        }
+        try:
+            self.apply(deltas)
+        except Exception as e:
+            logger.error(f"更新标签统计失败: {str(e)}")
+
+    def record(self, changes: Iterable[Tuple[Optional[tuple], Optional[tuple]]]):
+        """计算并应用增量，统计失败只记录日志，不影响主流程"""
+        try:
+            self.apply(self.diff(changes))
+        except Exception as e:
+            logger.error(f"更新标签统计失败: {str(e)}")
+
+    def rebuild(self, images_collection, match: Optional[dict] = None):
+        """
+        从 images 集合全量重建标签统计
+
+        Args:
+            images_collection: images 集合
+            match: 参与统计的图片过滤条件（例如排除软删除的图片）
+        """
+        pipeline = [
+            {'$match': match or {}},
+            {'$unwind': '$tags'},
+            {'$group': {
+                '_id': '$tags',
+                'public': {'$sum': {'$cond': [{'$eq': ['$is_public', True]}, 1, 0]}},
+                'private': {'$sum': {'$cond': [{'$eq': ['$is_public', True]}, 0, 1]}},
+                'last_used': {'$max': '$upload_time'}
+            }},
+            {'$out': self.collection.name}
+        ]
+        images_collection.aggregate(pipeline, allowDiskUse=True)
+        logger.info(f"标签统计已重建: {self.collection.count_documents({})} 个标签")
+
+    def _count_field(self, private: bool) -> str:
+        return 'private' if private else 'public'
+
+    def suggest(self, prefix: str, private: bool = False, limit: int = 10) -> List[dict]:
+        """
+        标签前缀自动补全
+
+        锚定的前缀正则可以直接走 _id 索引范围扫描。
+        """
+        field = self._count_field(private)
+        query = {field: {'$gt': 0}}
+        if prefix:
+            query['_id'] = {'$regex': '^' + re.escape(prefix)}
+
+        cursor = self.collection.find(query).sort([(field, -1), ('_id', 1)]).limit(limit)
+        return [{'tag': doc['_id'], 'count': doc[field]} for doc in cursor]
+
+    def cloud(self, private: bool = False, limit: int = 50) -> List[dict]:
+        """按使用次数返回热门标签，用于标签云"""
+        field = self._count_field(private)
+        cursor = (self.collection.find({field: {'$gt': 0}})
+                  .sort([(field, -1), ('_id', 1)])
+                  .limit(limit))
+        return [
+            {
+                'tag': doc['_id'],
+                'count': doc[field],
+                'last_used': doc.get('last_used')
+            }
+            for doc in cursor
+        ]
+
+    def names(self) -> List[str]:
+        """返回所有仍在使用中的标签名"""
+        cursor = self.collection.find(
+            {'$or': [{'public': {'$gt': 0}}, {'private': {'$gt': 0}}]},
+            {'_id': 1}
+        ).sort('_id', 1)
+        return [doc['_id'] for doc in cursor]
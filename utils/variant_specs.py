@@ -0,0 +1,71 @@
+"""
+图片变体规格模块
+
+功能：
+1. VARIANT_SPECS：缩略图和 WebP 的生成参数（尺寸、质量、压缩方法）集中在这里声明
+2. VariantSpec.version：由生成参数计算的版本哈希，生成变体时写入图片记录的 variant_versions
+3. stale_variants / stale_query：找出规格已变化（或缺失）的变体，迁移脚本只重新生成这些变体
+
+变体文件名包含版本哈希（thumbnails/<原文件名>.<版本>.webp），重新生成时写入新文件，
+数据库切换到新路径后再删除旧文件，生成期间旧变体照常提供访问。
+修改生成代码但参数不变时（例如换用其他缩放算法），递增对应规格的 revision。
+"""
+
+import hashlib
+from typing import Dict, List, NamedTuple, Optional
+
+
+class VariantSpec(NamedTuple):
+    name: str                 # 变体名称，同时是 variant_versions 和 file_sizes 中的键
+    field: str                # 图片记录中的路径字段
+    folder: str               # 上传目录下的子目录
+    max_size: Optional[int]   # 最长边的最大尺寸，None 保持原尺寸
+    quality: int              # WebP 质量（1-100）
+    method: int = 6           # WebP 压缩方法（0-6，6 为最佳压缩）
+    revision: int = 1         # 生成代码的修订号
+    features: bool = False    # 基于该变体计算缩略图特征（感知哈希、尺寸、占位符），不影响版本
+
+    @property
+    def version(self) -> str:
+        params = (self.max_size, self.quality, self.method, self.revision)
+        return hashlib.blake2b(repr(params).encode('utf-8'), digest_size=4).hexdigest()
+
+    @property
+    def flag(self) -> str:
+        """图片记录中表示变体已生成的字段（has_thumbnail / has_webp）"""
+        return f'has_{self.name}'
+
+    def filename(self, stem: str) -> str:
+        return f"{stem}.{self.version}.webp"
+
+
+VARIANT_SPECS: Dict[str, VariantSpec] = {
+    'thumbnail': VariantSpec('thumbnail', 'thumbnail_path', 'thumbnails', max_size=600, quality=95, features=True),
+    'webp': VariantSpec('webp', 'webp_path', 'webp', max_size=None, quality=95),
+}
+
+
+def spec_versions() -> Dict[str, str]:
+    """{变体名称: 当前版本}"""
+    return {name: spec.version for name, spec in VARIANT_SPECS.items()}
+
+
+def stale_variants(image: dict) -> List[str]:
+    """图片记录中需要重新生成的变体（未生成、没有版本或版本与当前规格不同）"""
+    versions = image.get('variant_versions') or {}
+    return [
+        name for name, spec in VARIANT_SPECS.items()
+        if not image.get(spec.flag) or not image.get(spec.field) or versions.get(name) != spec.version
+    ]
+
+
+def stale_query() -> dict:
+    """查询存在过期变体的图片，与 stale_variants 的条件一致"""
+    conditions = []
+    for name, spec in VARIANT_SPECS.items():
+        conditions += [
+            {spec.flag: {'$ne': True}},
+            {spec.field: {'$in': [None, '']}},
+            {f'variant_versions.{name}': {'$ne': spec.version}},
+        ]
+    return {'$or': conditions}
@@ -0,0 +1,197 @@
+"""
+后台变体生成模块
+
+功能：
+1. 批量上传只保存原图并写入 processing_status='pending' 的记录，请求立即返回
+2. 后台线程认领待处理的图片，并行生成缩略图、WebP 和缩略图特征
+3. 处理结果用一次 bulk_write 写回数据库，并递增图片变更计数
+4. 多个 worker 进程同时运行时，通过认领标记避免重复处理；进程退出后超时的认领可被重新认领
+5. 写回时校验认领标记和删除状态，处理期间被删除的图片不会被写回，生成的文件随即删除
+"""
+
+import os
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from .change_counter import scopes_for
+from .image_processor import ImageProcessor
+from .phash import from_hex, hash_fields
+from .variant_specs import VARIANT_SPECS
+
+logger = logging.getLogger(__name__)
+
+
+def variant_update(processed: Dict) -> Dict:
+    """根据 process_image 的结果生成写入图片记录的字段"""
+    update = {'processing_status': 'completed' if processed.get('success') else 'failed'}
+    file_sizes = {}
+
+    for name, spec in VARIANT_SPECS.items():
+        if processed.get(name):
+            update[spec.field] = processed[name]
+            update[spec.flag] = True
+            file_sizes[f'file_sizes.{name}'] = Path(processed[name]).stat().st_size
+
+    for name, version in (processed.get('versions') or {}).items():
+        update[f'variant_versions.{name}'] = version
+
+    features = dict(processed.get('features') or {})
+    if features.get('dhash'):
+        features.update(hash_fields(from_hex(features['dhash'])))
+    update.update(features)
+    update.update(file_sizes)
+    return update
+
+
+class VariantWorker:
+    """待处理图片的后台变体生成器"""
+
+    def __init__(
+        self,
+        collection,
+        upload_folder: str,
+        workers: Optional[int] = None,
+        batch_size: int = 50,
+        interval: float = 30.0,
+        claim_timeout: int = 600,
+        change_counter=None
+    ):
+        """
+        初始化变体生成器
+
+        Args:
+            collection: images 集合
+            upload_folder: 上传文件夹路径
+            workers: 并行处理的线程数，默认为 CPU 核数
+            batch_size: 每批认领的图片数量
+            interval: 空闲时的轮询间隔（秒）
+            claim_timeout: 认领超时时间（秒），超时后其他进程可重新认领
+            change_counter: 图片变更计数（ChangeCounter），处理完成后递增
+        """
+        self.collection = collection
+        self.processor = ImageProcessor(upload_folder)
+        self.workers = workers or os.cpu_count() or 2
+        self.batch_size = batch_size
+        self.interval = interval
+        self.claim_timeout = timedelta(seconds=claim_timeout)
+        self.change_counter = change_counter
+
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动后台处理线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='variant-worker', daemon=True)
+        self._thread.start()
+        logger.info(f"变体生成线程已启动（并行 {self.workers}）")
+
+    def run(self):
+        """在当前线程中持续处理（独立的变体生成进程使用，不返回）"""
+        logger.info(f"变体生成进程已启动（并行 {self.workers}）")
+        self._run()
+
+    def wake(self):
+        """唤醒处理线程，立即处理新上传的图片"""
+        self._wakeup.set()
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='variant') as executor:
+            while True:
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+                try:
+                    # 一直处理到没有待处理的图片为止
+                    while self.process_once(executor):
+                        pass
+                except Exception as e:
+                    logger.error(f"生成图片变体时发生错误: {str(e)}")
+
+    def _process(self, image, token: str) -> Tuple[UpdateOne, List[str]]:
+        """生成一张图片的变体，返回写回操作和生成的文件路径"""
+        generated = []
+        try:
+            processed = self.processor.process_image(image['path'])
+            generated = [processed[name] for name in VARIANT_SPECS if processed.get(name)]
+            update = variant_update(processed)
+        except Exception as e:
+            logger.error(f"生成图片变体失败 {image.get('filename')}: {str(e)}")
+            update = {'processing_status': 'failed'}
+        # 只写回仍由本批认领且未被删除的图片
+        operation = UpdateOne(
+            {'_id': image['_id'], 'variant_claim': token, 'deleted': {'$ne': True}},
+            {'$set': update, '$unset': {'variant_claim': '', 'variant_claimed_at': ''}}
+        )
+        return operation, generated
+
+    def _remove_orphans(self, images, generated):
+        """删除处理期间已被删除的图片的变体文件
+
+        认领超时后被其他 worker 重新认领的图片仍然存在，生成的文件路径相同，由新的认领者写回，不删除。
+        """
+        ids = [image['_id'] for image in images]
+        alive = {
+            doc['_id'] for doc in
+            self.collection.find({'_id': {'$in': ids}, 'deleted': {'$ne': True}}, {'_id': 1})
+        }
+        for image, paths in zip(images, generated):
+            if image['_id'] in alive:
+                continue
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.error(f"删除变体文件失败 {path}: {str(e)}")
+
+    def process_once(self, executor: ThreadPoolExecutor) -> int:
+        """
+        认领并处理一批待处理的图片
+
+        Returns:
+            本批处理的图片数量
+        """
+        token = uuid.uuid4().hex
+        now = datetime.now()
+        claimable = {
+            'processing_status': 'pending',
+            'deleted': {'$ne': True},
+            '$or': [
+                {'variant_claim': {'$exists': False}},
+                {'variant_claimed_at': {'$lt': now - self.claim_timeout}}
+            ]
+        }
+
+        candidate_ids = [
+            doc['_id'] for doc in
+            self.collection.find(claimable, {'_id': 1}).limit(self.batch_size)
+        ]
+        if not candidate_ids:
+            return 0
+
+        self.collection.update_many(
+            {'_id': {'$in': candidate_ids}, **claimable},
+            {'$set': {'variant_claim': token, 'variant_claimed_at': now}}
+        )
+        images = list(self.collection.find({'variant_claim': token}, {'_id': 1, 'path': 1, 'filename': 1, 'is_public': 1}))
+        if not images:
+            return 0
+
+        results = list(executor.map(lambda image: self._process(image, token), images))
+        operations = [operation for operation, _ in results]
+        result = self.collection.bulk_write(operations, ordered=False)
+        if result.matched_count < len(operations):
+            self._remove_orphans(images, [paths for _, paths in results])
+        if self.change_counter is not None:
+            self.change_counter.bump(scopes_for(images))
+        logger.info(f"已生成 {len(operations)} 张图片的缩略图和 WebP")
+        return len(operations)
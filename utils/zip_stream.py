@@ -0,0 +1,184 @@
+"""
+ZIP 流式打包模块
+
+功能：
+1. ZipStream：边读文件边输出 ZIP 数据，不在内存或磁盘中生成完整压缩包
+2. 条目使用存储方式（不压缩），JPEG/WebP 本身已压缩，重新压缩只会消耗 CPU
+3. 文件大小预先已知，可以在响应开始前算出压缩包的准确长度（Content-Length）
+4. 单个文件超过 4GB、偏移量超过 4GB 或条目超过 65535 个时自动使用 ZIP64
+
+CRC32 在输出文件内容时计算，写入每个条目之后的数据描述符和中央目录。
+"""
+
+import struct
+import zlib
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Optional
+
+CHUNK_SIZE = 64 * 1024
+
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP32_COUNT_LIMIT = 0xFFFF
+
+# 通用标志：bit 3 数据描述符，bit 11 文件名为 UTF-8
+FLAGS = 0x0008 | 0x0800
+METHOD_STORED = 0
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+# 创建系统为 Unix，外部属性为普通文件 0644
+VERSION_MADE_BY = (3 << 8) | VERSION_ZIP64
+EXTERNAL_ATTR = (0o100644 << 16)
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+DATA_DESCRIPTOR = struct.Struct('<IIII')
+DATA_DESCRIPTOR64 = struct.Struct('<IIQQ')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+END_RECORD = struct.Struct('<IHHHHIIH')
+END_RECORD64 = struct.Struct('<IQHHIIQQQQ')
+END_LOCATOR64 = struct.Struct('<IIQI')
+
+
+class ZipEntry(NamedTuple):
+    arcname: str
+    path: str
+    size: int
+    mtime: datetime
+
+
+def _dos_time(value: datetime):
+    """datetime -> (DOS 时间, DOS 日期)，ZIP 不支持 1980 年以前的时间"""
+    if value.year < 1980:
+        value = datetime(1980, 1, 1)
+    elif value.year > 2107:
+        value = datetime(2107, 12, 31, 23, 59, 58)
+    time = (value.hour << 11) | (value.minute << 5) | (value.second // 2)
+    date = ((value.year - 1980) << 9) | (value.month << 5) | value.day
+    return time, date
+
+
+class ZipStream:
+    """
+    流式 ZIP 打包
+
+    用法：
+        stream = ZipStream()
+        stream.add('a.jpg', '/path/a.jpg', size, mtime)
+        Response(iter(stream), content_type='application/zip').content_length = stream.size()
+    """
+
+    def __init__(self):
+        self.entries: List[ZipEntry] = []
+        self._names = set()
+
+    def add(self, arcname: str, path: str, size: int, mtime: Optional[datetime] = None) -> str:
+        """添加文件，同名文件自动改为 "name (2).ext"，返回实际使用的文件名"""
+        arcname = arcname.replace('\\', '/').lstrip('/')
+        stem, dot, ext = arcname.rpartition('.')
+        if not dot:
+            stem, ext = arcname, ''
+        candidate, index = arcname, 2
+        while candidate in self._names:
+            candidate = f"{stem} ({index}){dot}{ext}"
+            index += 1
+        self._names.add(candidate)
+        self.entries.append(ZipEntry(candidate, path, size, mtime or datetime.now()))
+        return candidate
+
+    def __len__(self):
+        return len(self.entries)
+
+    # 以下各部分的构造与 size() 共用，保证计算的长度与实际输出一致
+
+    @staticmethod
+    def _local_header(entry: ZipEntry, name: bytes) -> bytes:
+        zip64 = entry.size >= ZIP32_LIMIT
+        # 使用数据描述符时，本地文件头中的 CRC 和大小写 0（ZIP64 时写在扩展字段中）
+        extra = struct.pack('<HHQQ', 0x0001, 16, 0, 0) if zip64 else b''
+        time, date = _dos_time(entry.mtime)
+        return LOCAL_HEADER.pack(
+            0x04034B50, VERSION_ZIP64 if zip64 else VERSION_DEFAULT, FLAGS, METHOD_STORED,
+            time, date, 0,
+            ZIP32_LIMIT if zip64 else 0, ZIP32_LIMIT if zip64 else 0,
+            len(name), len(extra)
+        ) + name + extra
+
+    @staticmethod
+    def _data_descriptor(entry: ZipEntry, crc: int) -> bytes:
+        if entry.size >= ZIP32_LIMIT:
+            return DATA_DESCRIPTOR64.pack(0x08074B50, crc, entry.size, entry.size)
+        return DATA_DESCRIPTOR.pack(0x08074B50, crc, entry.size, entry.size)
+
+    @staticmethod
+    def _central_header(entry: ZipEntry, name: bytes, crc: int, offset: int) -> bytes:
+        # ZIP64 扩展字段按固定顺序只包含超出范围的值：原始大小、压缩后大小、本地文件头偏移
+        fields = []
+        if entry.size >= ZIP32_LIMIT:
+            fields += [entry.size, entry.size]
+        if offset >= ZIP32_LIMIT:
+            fields.append(offset)
+        extra = struct.pack(f'<HH{len(fields)}Q', 0x0001, 8 * len(fields), *fields) if fields else b''
+        zip64 = bool(fields)
+        size32 = min(entry.size, ZIP32_LIMIT)
+        time, date = _dos_time(entry.mtime)
+        return CENTRAL_HEADER.pack(
+            0x02014B50, VERSION_MADE_BY, VERSION_ZIP64 if zip64 else VERSION_DEFAULT, FLAGS, METHOD_STORED,
+            time, date, crc, size32, size32,
+            len(name), len(extra), 0, 0, 0, EXTERNAL_ATTR, min(offset, ZIP32_LIMIT)
+        ) + name + extra
+
+    @staticmethod
+    def _end_records(count: int, directory_offset: int, directory_size: int) -> bytes:
+        records = b''
+        if count >= ZIP32_COUNT_LIMIT or directory_offset >= ZIP32_LIMIT or directory_size >= ZIP32_LIMIT:
+            end64_offset = directory_offset + directory_size
+            records += END_RECORD64.pack(
+                0x06064B50, END_RECORD64.size - 12, VERSION_MADE_BY, VERSION_ZIP64,
+                0, 0, count, count, directory_size, directory_offset
+            )
+            records += END_LOCATOR64.pack(0x07064B50, 0, end64_offset, 1)
+        records += END_RECORD.pack(
+            0x06054B50, 0, 0,
+            min(count, ZIP32_COUNT_LIMIT), min(count, ZIP32_COUNT_LIMIT),
+            min(directory_size, ZIP32_LIMIT), min(directory_offset, ZIP32_LIMIT), 0
+        )
+        return records
+
+    def size(self) -> int:
+        """压缩包的总字节数（文件大小在读取时不能变化）"""
+        offset = 0
+        directory = 0
+        for entry in self.entries:
+            name = entry.arcname.encode('utf-8')
+            directory += len(self._central_header(entry, name, 0, offset))
+            offset += len(self._local_header(entry, name)) + entry.size + len(self._data_descriptor(entry, 0))
+        return offset + directory + len(self._end_records(len(self.entries), offset, directory))
+
+    def __iter__(self) -> Iterator[bytes]:
+        offset = 0
+        directory = []
+        for entry in self.entries:
+            name = entry.arcname.encode('utf-8')
+            header = self._local_header(entry, name)
+            yield header
+
+            crc = 0
+            remaining = entry.size
+            with open(entry.path, 'rb') as f:
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        # 文件在打包过程中被截断，已发送的长度无法更正，只能中止
+                        raise IOError(f"文件大小发生变化: {entry.path}")
+                    crc = zlib.crc32(chunk, crc)
+                    remaining -= len(chunk)
+                    yield chunk
+
+            descriptor = self._data_descriptor(entry, crc)
+            yield descriptor
+            directory.append(self._central_header(entry, name, crc, offset))
+            offset += len(header) + entry.size + len(descriptor)
+
+        directory_size = sum(len(record) for record in directory)
+        yield b''.join(directory)
+        yield self._end_records(len(self.entries), offset, directory_size)
+